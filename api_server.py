@@ -0,0 +1,376 @@
+"""
+本地 HTTP/JSON 接口，其他程序可以通过它提交、查询和取消下载，与图形界面共用同一个下载引擎。
+
+    POST   /jobs            提交任务，JSON: {"url", "kind": "video"|"podcast", "dir", ...}，返回 {"id"}
+                            播客任务可以带 "track"、"artwork"、"loudnorm"（LUFS）、"codec"、"tags": false
+    GET    /jobs            全部任务的状态
+    GET    /jobs/<id>       单个任务的状态
+    DELETE /jobs/<id>       取消任务
+    GET    /events          Server-Sent Events 事件流，?job=<id> 只接收该任务的事件
+    GET    /limits          当前限速设置
+    PUT    /limits          修改限速，JSON: {"global": "2M", "hosts": {"xyzcdn.net": "1M"}, "schedule": "09:00=2M,19:00=0"}
+
+浏览器中的网页也能向 127.0.0.1 发请求，所以修改类请求（POST/PUT/DELETE）必须带
+Content-Type: application/json（跨站请求因此需要 CORS 预检，而这里不响应预检），
+带 Origin 头时必须来自本机；Host 头必须是本机地址，防止 DNS 重绑定。
+提交任务时的 "dir" 必须位于允许的下载目录（默认为用户主目录）之内。
+
+事件由 EventBroadcaster 统一分发：引擎回调写入环形缓冲区并通知条件变量，
+每个 SSE 连接在条件变量上等待新事件，不需要轮询。下载进度不逐个转发引擎事件，
+而是订阅 ProgressAggregator 的快照，每 PROGRESS_INTERVAL 秒把有变化的任务各发一次。
+"""
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cookies import BROWSERS
+from engine import RUNNING, DownloadEngine
+from options import (NATIVE_DOWNLOADER, VIDEO_FORMAT_POLICIES, available_downloaders, podcast_dir,
+                     podcast_postprocess_opts, podcast_ydl_opts, video_ydl_opts)
+from postprocess import CODECS
+from progress import ProgressAggregator
+from ratelimit import parse_rate
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+BUFFER_SIZE = 2000
+PROGRESS_INTERVAL = 0.5
+KEEPALIVE_INTERVAL = 15
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+WILDCARD_HOSTS = ('', '0.0.0.0', '::')
+
+
+class EventBroadcaster:
+    """把引擎事件分发给任意数量的订阅者，每个事件带递增序号"""
+
+    def __init__(self, size=BUFFER_SIZE):
+        self._condition = threading.Condition()
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._closed = False
+
+    def publish(self, event):
+        """作为引擎监听器注册；只保留可以序列化的任务快照，下载进度由 publish_progress() 发布"""
+        if event['status'] == 'downloading':
+            return
+        self._append([(event['status'], event['job'], event.get('error'))])
+
+    def publish_progress(self, jobs):
+        """发布一批任务快照的下载进度"""
+        if jobs:
+            self._append([('downloading', job, None) for job in jobs])
+
+    def _append(self, items):
+        with self._condition:
+            for status, job, error in items:
+                self._seq += 1
+                self._events.append({'seq': self._seq, 'event': status, 'job': job, 'error': error})
+            self._condition.notify_all()
+
+    def wait(self, after_seq, timeout=None):
+        """返回序号大于 after_seq 的事件，没有新事件时最多等待 timeout 秒"""
+        with self._condition:
+            if not self._closed and self._seq <= after_seq:
+                self._condition.wait(timeout)
+            # 落后太多的订阅者从缓冲区中最早的事件继续
+            return [event for event in self._events if event['seq'] > after_seq]
+
+    @property
+    def last_seq(self):
+        with self._condition:
+            return self._seq
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+def resolve_dir(path, roots):
+    """检查下载目录位于 roots 之一之内，返回规范化后的绝对路径"""
+    path = os.path.expanduser(path)
+    if not os.path.isabs(path):
+        raise ValueError(f"下载目录必须是绝对路径: {path}")
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(os.path.expanduser(root))
+        if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+            return path
+    raise ValueError(f"不允许的下载目录: {path}")
+
+
+def build_job(payload, download_roots=None):
+    """把提交的 JSON 转换为 (url, ydl_opts, kind, meta)"""
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是 JSON 对象")
+    roots = download_roots or [os.path.expanduser("~")]
+    url = payload.get('url')
+    if not url or not isinstance(url, str):
+        raise ValueError("缺少 url")
+    kind = payload.get('kind', 'video')
+    meta = {'title': payload.get('title') or url, 'source': 'api'}
+
+    if kind == 'video':
+        policy = payload.get('policy', "最佳质量")
+        if policy not in VIDEO_FORMAT_POLICIES:
+            raise ValueError(f"未知的格式策略: {policy}")
+        downloader = payload.get('downloader', NATIVE_DOWNLOADER)
+        if downloader not in available_downloaders():
+            raise ValueError(f"不可用的下载器: {downloader}")
+        cookies = payload.get('cookies')
+        if cookies and cookies not in BROWSERS:
+            raise ValueError(f"不支持的浏览器: {cookies}")
+        buffersize = payload.get('buffersize')
+        ydl_opts = video_ydl_opts(
+            resolve_dir(payload.get('dir') or "~/Downloads", roots),
+            payload.get('format') or VIDEO_FORMAT_POLICIES[policy],
+            fragments=int(payload.get('fragments', 4)),
+            downloader=downloader,
+            connections=int(payload.get('connections', 8)),
+            buffersize=int(buffersize) if buffersize is not None else None,
+        )
+        if cookies:
+            ydl_opts['cookies_from'] = cookies
+    elif kind == 'podcast':
+        podcast_title = payload.get('podcast_title') or "未知播客"
+        dir_path = podcast_dir(resolve_dir(payload.get('dir') or "~/Downloads/Podcasts", roots), podcast_title)
+        os.makedirs(dir_path, exist_ok=True)
+        ydl_opts = podcast_ydl_opts(dir_path, podcast_title, meta['title'],
+                                    connections=int(payload.get('connections', 1)))
+        if payload.get('codec') and payload['codec'] not in CODECS:
+            raise ValueError(f"未知的目标编码: {payload['codec']}")
+        track = payload.get('track')
+        loudnorm = payload.get('loudnorm')
+        item = {'title': meta['title'], 'upload_date': payload.get('upload_date', ''), 'artwork': payload.get('artwork')}
+        ydl_opts['postprocess'] = podcast_postprocess_opts(
+            podcast_title, item, track=int(track) if track is not None else None, tags=bool(payload.get('tags', True)),
+            loudnorm=float(loudnorm) if loudnorm else None, codec=payload.get('codec'))
+        meta['podcast_title'] = podcast_title
+        meta['guid'] = payload.get('guid')
+    else:
+        raise ValueError(f"未知的任务类型: {kind}")
+    if payload.get('rate_limit'):
+        ydl_opts['rate_limit'] = parse_rate(payload['rate_limit'])
+    return url, ydl_opts, kind, meta
+
+
+def update_limits(limiter, payload):
+    """按 PUT /limits 的 JSON 修改限速器，只修改给出的项"""
+    if 'global' in payload:
+        limiter.set_global_rate(parse_rate(payload['global']))
+    for host, rate in (payload.get('hosts') or {}).items():
+        limiter.set_host_rate(host.lower(), parse_rate(rate))
+    if 'schedule' in payload:
+        limiter.set_schedule(payload['schedule'] or [])
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "StreamHarvester"
+    protocol_version = "HTTP/1.1"
+
+    # --- 工具 ---
+
+    def log_message(self, format, *args):
+        self.server.logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _authorized(self):
+        token = self.server.token
+        if not token or self.headers.get('Authorization') == f"Bearer {token}":
+            return True
+        self._send_json(401, {'error': "未授权"})
+        return False
+
+    def _host_allowed(self, value):
+        """value 为 Host 或 Origin 中的主机部分"""
+        hostname = urllib.parse.urlsplit('//' + value).hostname or ''
+        return hostname in LOOPBACK_HOSTS or hostname == self.server.server_host
+
+    def _trusted(self, modifying=False):
+        """拒绝 DNS 重绑定和跨站请求；修改类请求还要求 JSON 请求体"""
+        if self.server.server_host not in WILDCARD_HOSTS and not self._host_allowed(self.headers.get('Host', '')):
+            self._send_json(403, {'error': "不允许的 Host"})
+            return False
+        if not modifying:
+            return True
+        origin = self.headers.get('Origin')
+        if origin is not None:
+            parsed = urllib.parse.urlsplit(origin)
+            if parsed.scheme not in ('http', 'https') or not self._host_allowed(parsed.netloc):
+                self._send_json(403, {'error': "不允许跨站请求"})
+                return False
+        if self.command in ('POST', 'PUT'):
+            content_type = self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            if content_type != 'application/json':
+                self._send_json(415, {'error': "Content-Type 必须是 application/json"})
+                return False
+        return True
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        return parts, urllib.parse.parse_qs(parsed.query)
+
+    # --- 请求 ---
+
+    def do_GET(self):
+        if not self._trusted() or not self._authorized():
+            return
+        parts, query = self._route()
+        engine = self.server.engine
+        if parts == ['jobs']:
+            self._send_json(200, {'jobs': engine.jobs()})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = engine.status(parts[1])
+            if job is None:
+                self._send_json(404, {'error': "任务不存在"})
+            else:
+                self._send_json(200, job)
+        elif parts == ['events']:
+            self._stream_events(query.get('job', [None])[0])
+        elif parts == ['limits']:
+            self._send_json(200, engine.limiter.limits())
+        else:
+            self._send_json(404, {'error': "接口不存在"})
+
+    def do_POST(self):
+        if not self._trusted(modifying=True) or not self._authorized():
+            return
+        parts, _ = self._route()
+        if parts != ['jobs']:
+            self._send_json(404, {'error': "接口不存在"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            url, ydl_opts, kind, meta = build_job(payload, self.server.download_roots)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        job_id = self.server.engine.submit(url, ydl_opts, kind=kind, meta=meta)
+        self._send_json(201, {'id': job_id})
+
+    def do_PUT(self):
+        if not self._trusted(modifying=True) or not self._authorized():
+            return
+        parts, _ = self._route()
+        if parts != ['limits']:
+            self._send_json(404, {'error': "接口不存在"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            update_limits(self.server.engine.limiter, json.loads(self.rfile.read(length) or b'{}'))
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(200, self.server.engine.limiter.limits())
+
+    def do_DELETE(self):
+        if not self._trusted(modifying=True) or not self._authorized():
+            return
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            self._send_json(404, {'error': "接口不存在"})
+            return
+        if self.server.engine.status(parts[1]) is None:
+            self._send_json(404, {'error': "任务不存在"})
+            return
+        self.server.engine.cancel(parts[1])
+        self._send_json(200, {'id': parts[1], 'cancelled': True})
+
+    def _stream_events(self, job_id):
+        broadcaster = self.server.broadcaster
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        # 支持断线重连：从 Last-Event-ID 之后继续
+        last_id = self.headers.get('Last-Event-ID')
+        seq = int(last_id) if last_id and last_id.isdigit() else broadcaster.last_seq
+        try:
+            while not broadcaster.closed:
+                events = broadcaster.wait(seq, timeout=KEEPALIVE_INTERVAL)
+                if not events:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    seq = events[-1]['seq']
+                    chunks = [
+                        f"id: {event['seq']}\nevent: {event['event']}\n"
+                        f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+                        for event in events if job_id is None or event['job']['id'] == job_id
+                    ]
+                    if chunks:
+                        self.wfile.write("".join(chunks).encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, engine, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, logger=None, download_roots=None):
+        super().__init__((host, port), ApiHandler)
+        self.engine = engine
+        self.token = token
+        self.server_host = host
+        self.download_roots = download_roots or [os.path.expanduser("~")]
+        self.logger = logger or logging.getLogger(__name__)
+        self.broadcaster = EventBroadcaster()
+        engine.add_listener(self.broadcaster.publish)
+        self.progress = ProgressAggregator(engine, interval=PROGRESS_INTERVAL)
+        self.progress.subscribe(self._on_progress)
+
+    def _on_progress(self, snapshot):
+        jobs = []
+        for job_id, progress in snapshot['jobs'].items():
+            if progress['state'] != RUNNING:
+                continue
+            job = self.engine.status(job_id)
+            if job is not None and job['state'] == RUNNING:
+                jobs.append(job)
+        self.broadcaster.publish_progress(jobs)
+
+    def server_close(self):
+        self.engine.remove_listener(self.broadcaster.publish)
+        self.engine.remove_listener(self.progress.on_event)
+        self.progress.close()
+        self.broadcaster.close()
+        super().server_close()
+
+
+def serve(engine=None, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, download_roots=None):
+    """启动接口服务并阻塞，直到 Ctrl+C"""
+    engine = engine or DownloadEngine()
+    server = ApiServer(engine, host, port, token, download_roots=download_roots)
+    server.logger.info(f"接口服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        engine.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    serve(token=os.environ.get("STREAMHARVESTER_API_TOKEN"))
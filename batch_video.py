@@ -0,0 +1,290 @@
+import customtkinter as ctk
+import tkinter as tk
+from tkinter import messagebox, ttk, filedialog
+import os
+import logging
+from threading import Thread
+
+import extractors
+from engine import DownloadEngine
+from feed_batch import run_per_host
+from options import VIDEO_FORMAT_POLICIES, video_ydl_opts
+from progress import ProgressAggregator
+
+# 同一批次同时交给引擎的任务数上限
+BATCH_CONCURRENCY_OPTIONS = ["1", "2", "3", "5", "8"]
+
+
+class BatchVideoDownloader(ctk.CTkFrame):
+    """
+    批量视频下载：一次输入多个链接（可以是播放列表或频道），
+    全部视频使用同一个格式策略，按有限的并发数依次提交给下载引擎。
+    """
+
+    def __init__(self, parent, engine=None, speed_options=None, progress=None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.engine = engine or DownloadEngine(max_workers=5, logger=self.logger)
+        self.progress = progress or ProgressAggregator(self.engine)
+        self.progress.subscribe(self.on_progress_snapshot)
+        # 返回 video_ydl_opts 加速参数的回调，由视频标签页提供
+        self.speed_options = speed_options or dict
+
+        self.pending = []  # 已展开、尚未提交的视频
+        self.running_jobs = set()  # 已提交、尚未结束的任务
+        self.batch_jobs = set()  # 本批次提交过的全部任务
+        self.job_rows = {}  # job_id -> 列表行 ID
+        self.batch_count = 0
+        self.progress_group = None
+        self.total_downloads = 0
+        self.failed_downloads = 0
+        self.expanding = False
+        self.stop_requested = False
+        self.ydl_opts = None
+        self.batch_limit = 1
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        # 链接输入
+        self.main_frame = ctk.CTkFrame(self)
+        self.main_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        self.main_frame.grid_columnconfigure(0, weight=1)
+
+        self.url_label = ctk.CTkLabel(self.main_frame, text="视频链接（每行一个，可以是播放列表或频道）:")
+        self.url_label.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="w")
+
+        self.url_text = ctk.CTkTextbox(self.main_frame, height=120)
+        self.url_text.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        # 下载目录选择
+        self.dir_frame = ctk.CTkFrame(self.main_frame)
+        self.dir_frame.grid(row=2, column=0, padx=10, pady=5, sticky="ew")
+
+        self.dir_label = ctk.CTkLabel(self.dir_frame, text="下载目录:")
+        self.dir_label.grid(row=0, column=0, padx=5, pady=5)
+
+        self.dir_entry = ctk.CTkEntry(self.dir_frame, width=300)
+        self.dir_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.dir_entry.insert(0, os.path.expanduser("~/Downloads"))
+
+        self.dir_button = ctk.CTkButton(self.dir_frame, text="选择目录", command=self.choose_directory)
+        self.dir_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.dir_frame.grid_columnconfigure(1, weight=1)
+
+        # 格式策略和批次并发数
+        self.options_frame = ctk.CTkFrame(self.main_frame)
+        self.options_frame.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
+
+        self.policy_label = ctk.CTkLabel(self.options_frame, text="格式策略:")
+        self.policy_label.grid(row=0, column=0, padx=5, pady=5)
+        self.policy_var = tk.StringVar(value="≤1080p（优先 avc1+m4a）")
+        self.policy_menu = ctk.CTkOptionMenu(self.options_frame, values=list(VIDEO_FORMAT_POLICIES),
+                                             variable=self.policy_var, width=200)
+        self.policy_menu.grid(row=0, column=1, padx=5, pady=5)
+
+        self.limit_label = ctk.CTkLabel(self.options_frame, text="同时下载:")
+        self.limit_label.grid(row=0, column=2, padx=(20, 5), pady=5)
+        self.limit_var = tk.StringVar(value="3")
+        self.limit_menu = ctk.CTkOptionMenu(self.options_frame, values=BATCH_CONCURRENCY_OPTIONS,
+                                            variable=self.limit_var, width=70)
+        self.limit_menu.grid(row=0, column=3, padx=5, pady=5)
+
+        # 任务列表
+        self.list_frame = ctk.CTkFrame(self)
+        self.list_frame.grid(row=1, column=0, padx=20, pady=10, sticky="nsew")
+        self.list_frame.grid_columnconfigure(0, weight=1)
+        self.list_frame.grid_rowconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self.list_frame, columns=("标题", "状态"), show="headings")
+        self.tree.heading("标题", text="标题")
+        self.tree.heading("状态", text="状态")
+        self.tree.column("标题", width=450)
+        self.tree.column("状态", width=100, anchor="center")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        scrollbar = ttk.Scrollbar(self.list_frame, orient="vertical", command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        # 按钮
+        self.button_frame = ctk.CTkFrame(self)
+        self.button_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+
+        self.download_button = ctk.CTkButton(self.button_frame, text="批量下载", command=self.start_batch)
+        self.download_button.grid(row=0, column=0, padx=5, pady=5)
+
+        self.stop_button = ctk.CTkButton(self.button_frame, text="中止下载", command=self.stop_batch, state="disabled")
+        self.stop_button.grid(row=0, column=1, padx=5, pady=5)
+
+        # 总进度
+        self.progress_frame = ctk.CTkFrame(self)
+        self.progress_frame.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+        self.progress_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
+        self.progress_bar.grid(row=0, column=0, padx=(0, 10), pady=5, sticky="ew")
+        self.progress_bar.set(0)
+
+        self.progress_label = ctk.CTkLabel(self.progress_frame, text="0.0%", width=40)
+        self.progress_label.grid(row=0, column=1, padx=(0, 5), pady=5, sticky="e")
+
+        self.status_label = ctk.CTkLabel(self, text="")
+        self.status_label.grid(row=4, column=0, padx=20, pady=10)
+
+    def choose_directory(self):
+        dir_path = filedialog.askdirectory(initialdir=self.dir_entry.get())
+        if dir_path:
+            self.dir_entry.delete(0, tk.END)
+            self.dir_entry.insert(0, dir_path)
+
+    def start_batch(self):
+        urls = []
+        for line in self.url_text.get("1.0", tk.END).splitlines():
+            line = line.strip()
+            if line and line not in urls:
+                urls.append(line)
+        if not urls:
+            messagebox.showerror("错误", "请输入视频链接")
+            return
+
+        dir_path = self.dir_entry.get().strip()
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+        self.ydl_opts = video_ydl_opts(dir_path, VIDEO_FORMAT_POLICIES[self.policy_var.get()],
+                                       logger=self.logger, **self.speed_options())
+        self.batch_limit = int(self.limit_var.get())
+
+        # 重置状态
+        self.tree.delete(*self.tree.get_children())
+        self.pending = []
+        self.running_jobs = set()
+        self.batch_jobs = set()
+        self.job_rows = {}
+        self.batch_count += 1
+        self.progress_group = f"batch-{self.batch_count}"
+        self.total_downloads = 0
+        self.failed_downloads = 0
+        self.stop_requested = False
+        self.expanding = True
+
+        self.download_button.configure(state="disabled")
+        self.stop_button.configure(state="normal")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="0.0%")
+        self.status_label.configure(text=f"正在解析 {len(urls)} 个链接...")
+
+        def expand():
+            # 多个链接并发展开，每展开一个就交给主线程开始下载
+            for url, videos, error in run_per_host(urls, extractors.expand_video_urls):
+                if error is not None:
+                    self.logger.error(f"解析链接失败 {url}: {error}")
+                    videos = []
+                self.after(0, self.add_videos, url, videos, error)
+            self.after(0, self.on_expand_finished)
+
+        Thread(target=expand, daemon=True).start()
+
+    def add_videos(self, url, videos, error):
+        if self.stop_requested:
+            return
+        if error is not None:
+            self.tree.insert("", tk.END, values=(url, "解析失败"))
+            return
+        for video in videos:
+            row_id = self.tree.insert("", tk.END, values=(video['title'], "等待中"))
+            self.pending.append((row_id, video))
+        self.total_downloads += len(videos)
+        self.submit_pending()
+
+    def on_expand_finished(self):
+        self.expanding = False
+        if self.stop_requested:
+            return
+        if self.total_downloads == 0:
+            self.batch_finished("没有可下载的视频。")
+            return
+        # 展开结束前全部任务可能已经完成，此后不会再有新的快照
+        group = self.progress.group(self.progress_group)
+        if group and group['completed'] == self.total_downloads:
+            self.failed_downloads = group['failed']
+            self.batch_finished()
+
+    def submit_pending(self):
+        """在批次并发上限内提交等待中的视频"""
+        submitted = False
+        while self.pending and len(self.running_jobs) < self.batch_limit:
+            row_id, video = self.pending.pop(0)
+            job_id = self.engine.submit(video['url'], self.ydl_opts, kind='video',
+                                        meta={'title': video['title'], 'batch': True})
+            self.running_jobs.add(job_id)
+            self.batch_jobs.add(job_id)
+            self.job_rows[job_id] = row_id
+            self.tree.set(row_id, "状态", "下载中")
+            submitted = True
+        if submitted:
+            # 分组随提交逐步扩大，重新跟踪时已结束的任务会被正确计入
+            self.progress.track(self.progress_group, self.batch_jobs)
+
+    def on_progress_snapshot(self, snapshot):
+        """汇总器发布线程中调用，只在与当前批次有关时转到主线程"""
+        if self.progress_group in snapshot['groups']:
+            self.after(0, self.apply_progress, snapshot)
+
+    def apply_progress(self, snapshot):
+        group = snapshot['groups'].get(self.progress_group)
+        if group is None or self.stop_requested:
+            return  # 已结束或已中止批次的快照
+
+        for job_id, job in snapshot['jobs'].items():
+            if job_id not in self.running_jobs or job['state'] not in ('finished', 'error', 'cancelled'):
+                continue
+            self.running_jobs.discard(job_id)
+            row_text = {'finished': "完成", 'error': "失败", 'cancelled': "已取消"}[job['state']]
+            self.tree.set(self.job_rows[job_id], "状态", row_text)
+            if job['state'] == 'error':
+                self.logger.error(f"下载失败: {job['error']}")
+
+        self.submit_pending()
+
+        if self.total_downloads > 0:
+            # 分组只包含已提交的视频，未提交的视频按 0% 计入总进度
+            overall_progress = group['percent'] * group['total'] / self.total_downloads
+            total_downloaded_mb = group['downloaded_bytes'] / 1024 / 1024
+            total_speed_mbps = group['speed'] / 1024 / 1024
+
+            self.progress_bar.set(overall_progress / 100)
+            self.progress_label.configure(text=f"{overall_progress:.1f}%")
+            speed_text = f"{total_speed_mbps:.2f} MB/s" if total_speed_mbps > 0 else "..."
+            self.status_label.configure(
+                text=f"{group['completed']}/{self.total_downloads} | "
+                     f"已下载: {total_downloaded_mb:.2f} MB | 速度: {speed_text}"
+            )
+
+        self.failed_downloads = group['failed']
+        if not self.expanding and self.total_downloads > 0 and group['completed'] == self.total_downloads:
+            self.batch_finished()
+
+    def batch_finished(self, status_text="所有任务已完成。"):
+        self.download_button.configure(state="normal")
+        self.stop_button.configure(state="disabled")
+        if self.failed_downloads and not self.stop_requested:
+            status_text = f"下载完成，其中 {self.failed_downloads} 个失败。"
+        if status_text:
+            self.status_label.configure(text=status_text)
+        self.running_jobs.clear()
+        self.pending = []
+        if self.progress_group:
+            self.progress.untrack(self.progress_group)
+            self.progress_group = None
+
+    def stop_batch(self):
+        self.stop_requested = True
+        for job_id in self.running_jobs:
+            self.engine.cancel(job_id)
+        for row_id, video in self.pending:
+            self.tree.set(row_id, "状态", "已取消")
+        self.pending = []
+        self.batch_finished("下载已中止。")
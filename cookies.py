@@ -0,0 +1,99 @@
+"""
+浏览器 Cookie 提供者。
+
+读取浏览器 Cookie 需要解密 SQLite 数据库（有时还要访问系统钥匙串），大的配置文件要花好几秒。
+这里每个 (浏览器, 域名) 只读取一次并缓存，超过 TTL 或其中有 Cookie 过期时重新读取；
+同一个键同时只有一个线程在读取，其他线程等待并复用结果。
+
+Cookie 直接在内存中交给 yt-dlp（apply_cookies），不再写入共用的临时文件，
+并发任务之间不会互相覆盖。
+"""
+import threading
+import time
+import urllib.parse
+
+BROWSERS = ("Chrome", "Firefox", "Edge", "Opera", "Brave")
+DEFAULT_TTL = 10 * 60
+
+
+def cookie_domain(url):
+    """把链接的主机名简化为基础域名，确保获取到顶级域的登录 Cookie"""
+    host = urllib.parse.urlparse(url).hostname or ''
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 else host
+
+
+class CookieProvider:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._jars = {}  # (浏览器, 域名) -> (读取时间, CookieJar)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _is_stale(self, entry):
+        loaded_at, jar = entry
+        if time.monotonic() - loaded_at >= self.ttl:
+            return True
+        # 载入后又有 Cookie 过期时重新读取，浏览器可能已经续期
+        now = time.time()
+        return any(cookie.is_expired(now) for cookie in jar)
+
+    def get_jar(self, browser, url):
+        """返回浏览器中该链接域名的 Cookie，调用方不应修改返回的 CookieJar"""
+        if browser not in BROWSERS:
+            raise ValueError(f"不支持的浏览器: {browser}")
+        key = (browser, cookie_domain(url))
+        with self._key_lock(key):
+            entry = self._jars.get(key)
+            if entry is None or self._is_stale(entry):
+                entry = (time.monotonic(), self._load(*key))
+                self._jars[key] = entry
+            return entry[1]
+
+    def _load(self, browser, domain):
+        # 只有真正需要读取 Cookie 时才导入
+        import http.cookiejar
+
+        import browser_cookie3
+
+        try:
+            source = getattr(browser_cookie3, browser.lower())(domain_name=domain)
+        except Exception as e:
+            raise Exception(f"无法从{browser}获取Cookie: {str(e)}")
+        # 浏览器中常留有已过期的 Cookie，载入时丢弃，否则 _is_stale 每次都会判定需要重新读取
+        now = time.time()
+        jar = http.cookiejar.CookieJar()
+        for cookie in source:
+            if not cookie.is_expired(now):
+                jar.set_cookie(cookie)
+        return jar
+
+    def invalidate(self, browser=None):
+        """丢弃缓存（例如用户刚在浏览器中重新登录），browser 为 None 时全部丢弃"""
+        with self._lock:
+            for key in list(self._jars):
+                if browser is None or key[0] == browser:
+                    del self._jars[key]
+
+
+def apply_cookies(ydl, jar):
+    """把 Cookie 加入 YoutubeDL 实例的内存 CookieJar"""
+    for cookie in jar:
+        ydl.cookiejar.set_cookie(cookie)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_cookie_provider():
+    """返回进程内共用的 Cookie 提供者"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = CookieProvider()
+        return _provider
@@ -0,0 +1,254 @@
+"""
+已下载媒体的本地索引，用于跨订阅、跨运行去重。
+
+每个下载完成的文件按三种键登记：规范化的音频链接、单集 guid、文件内容的 SHA-256。
+开始下载前按链接或 guid 查找，本地已有相同媒体时不再传输任何数据：
+目标文件已存在就直接跳过，否则用硬链接放到新的文件名下（跨磁盘无法硬链接时跳过并沿用原文件）。
+下载完成后按内容哈希查找，同一音频以不同链接或 guid 出现时，新文件替换为指向已有文件的硬链接，
+并把新的链接和 guid 也登记到同一内容上，以后遇到它们可以在下载前跳过。
+
+索引只记录路径，文件被删除或大小改变的条目在查找时自动清除。
+
+下载后还要处理（写标签、转码，见 postprocess.py）的文件按处理前的原始内容登记哈希，
+处理完成后用 update_path() 把条目改为处理后的文件；标签因订阅而异，这样同一音频在不同订阅中仍然能识别出来。
+这类文件不做硬链接替换，复用时通过 place(private=True) 得到一个可以单独处理的文件。
+"""
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from paths import state_path
+from segmented import is_direct_media
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 统计/跳转前缀：去掉后得到真实的音频地址
+_TRACKING_PREFIXES = [
+    re.compile(r'^(?:www\.)?dts\.podtrac\.com/redirect\.\w+/(.+)$'),
+    re.compile(r'^(?:www\.)?chtbl\.com/track/[^/]+/(.+)$'),
+    re.compile(r'^(?:www\.)?(?:pdst\.fm|op3\.dev)/e/(.+)$'),
+    re.compile(r'^(?:www\.)?pfx\.vpixl\.com/[^/]+/(.+)$'),
+    re.compile(r'^(?:www\.)?podtrac\.com/pts/redirect\.\w+/(.+)$'),
+]
+
+
+def media_url_key(url):
+    """
+    规范化音频链接：忽略协议、大小写的主机名和 www.，去掉统计跳转前缀；
+    直接指向媒体文件的链接忽略查询参数（通常是统计来源或每次变化的时间戳）。
+    """
+    rest = re.sub(r'^[a-z][a-z0-9+.-]*://', '', urllib.parse.urldefrag(url.strip())[0], flags=re.I)
+    while True:
+        for pattern in _TRACKING_PREFIXES:
+            match = pattern.match(rest)
+            if match:
+                rest = re.sub(r'^[a-z][a-z0-9+.-]*://', '', match.group(1), flags=re.I)
+                break
+        else:
+            break
+
+    parsed = urllib.parse.urlparse('//' + rest)
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if is_direct_media('http://' + host + parsed.path):
+        query = ''
+    else:
+        params = [(k, v) for k, v in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+                  if not k.lower().startswith('utm_')]
+        query = urllib.parse.urlencode(sorted(params))
+    return host + parsed.path + ('?' + query if query else '')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _global_guid(guid):
+    """只有看起来全局唯一的 guid 才跨订阅使用，"1"、"42" 这类按 feed 编号的 guid 会误判"""
+    return len(guid) >= 8 and not guid.isdigit()
+
+
+def _same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class MediaIndex:
+    def __init__(self, path=None):
+        self.path = path or state_path("media_index.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS media (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    added_at REAL NOT NULL
+                )
+                """
+            )
+            # 链接和 guid 指向内容哈希，同一内容可以有多个链接、guid 和文件
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS media_keys (
+                    key TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256)")
+
+    # --- 查询 ---
+
+    def _keys(self, url=None, guid=None):
+        keys = []
+        if url:
+            keys.append('url:' + media_url_key(url))
+        if guid and _global_guid(guid):
+            keys.append('guid:' + guid)
+        return keys
+
+    def _existing_file(self, sha256):
+        """返回该内容仍然存在的一个文件路径，顺便清除已经失效的条目"""
+        rows = self._conn.execute("SELECT path, size FROM media WHERE sha256 = ?", (sha256,)).fetchall()
+        for row in rows:
+            try:
+                if os.path.getsize(row['path']) == row['size']:
+                    return row['path']
+            except OSError:
+                pass
+            with self._conn:
+                self._conn.execute("DELETE FROM media WHERE path = ?", (row['path'],))
+        return None
+
+    def _find(self, url, guid):
+        keys = self._keys(url, guid)
+        if not keys:
+            return None, None
+        with self._lock:
+            placeholders = ", ".join("?" * len(keys))
+            rows = self._conn.execute(f"SELECT sha256 FROM media_keys WHERE key IN ({placeholders})", keys)
+            for sha256 in {row['sha256'] for row in rows}:
+                path = self._existing_file(sha256)
+                if path:
+                    return path, sha256
+        return None, None
+
+    def find(self, url=None, guid=None):
+        """按链接或 guid 查找本地已有的文件，返回路径或 None"""
+        return self._find(url, guid)[0]
+
+    def _register(self, path, size, sha256, url, guid):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media (path, size, sha256, added_at) VALUES (?, ?, ?, ?)",
+                (path, size, sha256, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO media_keys (key, sha256) VALUES (?, ?)",
+                [(key, sha256) for key in self._keys(url, guid)],
+            )
+
+    # --- 去重 ---
+
+    def reuse(self, url, guid, target):
+        """
+        下载前调用：本地已有相同媒体时返回可用的文件路径，否则返回 None。
+
+        target 为计划写入的路径（扩展名可以是 %(ext)s，用已有文件的扩展名代替），无法确定时直接沿用已有文件。
+        """
+        return self.place(url, guid, target)[0]
+
+    def place(self, url, guid, target, private=False):
+        """
+        与 reuse() 相同，返回 (路径, 是否新放置到 target)。
+
+        private 为 True 时调用方还要修改这个文件（写标签等），不会直接沿用已有文件：
+        无法确定 target 时返回 (None, False)，无法硬链接时复制一份。
+        """
+        existing, sha256 = self._find(url, guid)
+        if existing is None:
+            return None, False
+        if not target:
+            return (None, False) if private else (existing, False)
+        ext = os.path.splitext(existing)[1][1:]
+        target = target.replace('%(ext)s', ext).replace('%%', '%')
+        if '%(' in target:
+            return (None, False) if private else (existing, False)
+        if os.path.exists(target):
+            if _same_file(target, existing) or os.path.getsize(target) == os.path.getsize(existing):
+                return target, False
+            return None, False  # 同名文件内容不同，交给下载器处理
+        try:
+            os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+            os.link(existing, target)
+        except OSError:
+            if not private:
+                return existing, False
+            try:
+                shutil.copy2(existing, target)
+            except OSError:
+                return None, False
+        with self._lock:
+            self._register(target, os.path.getsize(target), sha256, url, guid)
+        return target, True
+
+    def add(self, path, url=None, guid=None, link=True):
+        """
+        下载完成后登记文件。内容与已有文件相同时用硬链接替换新文件以节省空间，返回最终路径。
+
+        link 为 False 时只登记不替换（文件随后还要单独处理）。
+        """
+        size = os.path.getsize(path)
+        sha256 = file_sha256(path)
+        with self._lock:
+            existing = self._existing_file(sha256) if link else None
+            if existing and not _same_file(existing, path):
+                tmp_path = path + '.dedup'
+                try:
+                    os.link(existing, tmp_path)
+                    os.replace(tmp_path, path)
+                except OSError:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            self._register(path, size, sha256, url, guid)
+        return path
+
+    def update_path(self, old_path, new_path):
+        """文件处理（写标签、转码）完成后，把条目改为处理后的文件，保留原始内容的哈希"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM media WHERE path = ?", (old_path,)).fetchone()
+            if row is None:
+                return
+            with self._conn:
+                self._conn.execute("DELETE FROM media WHERE path = ?", (old_path,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO media (path, size, sha256, added_at) VALUES (?, ?, ?, ?)",
+                    (new_path, os.path.getsize(new_path), row['sha256'], time.time()),
+                )
+
+    def purge(self):
+        """删除文件已不存在的条目，返回删除的数量"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size FROM media").fetchall()
+            stale = [row['path'] for row in rows
+                     if not os.path.exists(row['path']) or os.path.getsize(row['path']) != row['size']]
+            with self._conn:
+                self._conn.executemany("DELETE FROM media WHERE path = ?", [(path,) for path in stale])
+                self._conn.execute("DELETE FROM media_keys WHERE sha256 NOT IN (SELECT sha256 FROM media)")
+        return len(stale)
@@ -0,0 +1,505 @@
+"""
+无界面下载引擎。
+
+GUI、命令行和服务端都通过同一个任务接口提交下载：
+submit() 返回任务 ID（submit_many() 一次提交多个），cancel() 中止任务，status()/jobs() 查询状态，
+add_listener() 订阅事件。事件是字典，格式与旧的 download_queue 消息一致：
+{'status': ..., 'job_id': ..., 'url': ..., 'data': ..., 'job': 状态快照}
+
+事件回调在工作线程中执行，GUI 需要自行转发到主线程。
+
+传入 JobStore 时任务会持久化，resume_unfinished() 可以在重启后继续未完成的任务。
+shutdown() 中止的任务在任务库中记为 interrupted，下次启动时继续；用户主动取消的任务记为 cancelled，不再继续。
+内存中只保留最近结束的 MAX_FINISHED_JOBS 个任务，更早的任务由 JobStore 保存，status() 会回退到 JobStore 查询。
+
+传入 InfoCache 时，视频任务优先使用缓存中已经提取好的信息开始下载，不再重复提取。
+
+ydl_opts 中的 'cookies_from'（浏览器名称）不会传给 yt-dlp：下载前从 CookieProvider 取出该浏览器的
+Cookie，直接放入 YoutubeDL 的内存 CookieJar。
+
+ydl_opts 中的 'native_connections' 不会传给 yt-dlp：大于 1 且链接是可直接下载的媒体文件时，
+改用多连接分段下载器，服务器不支持时自动回退到 yt-dlp。
+
+ydl_opts 中的 'rate_limit'（字节每秒）是该任务的限速上限，同样不会传给 yt-dlp。
+全局和按主机的上限由 BandwidthLimiter 管理，可在运行时修改；下载线程在每个数据块之后按令牌桶睡眠。
+aria2c 等外部下载器不经过进度回调，不受限速影响。
+
+传入 MediaIndex 时播客任务会去重：开始下载前按音频链接或 meta 中的 guid 查找本地已有的文件，
+找到时跳过或硬链接到目标文件名，不传输任何数据；下载完成后按内容哈希登记。
+视频的输出文件名取决于所选格式和合并结果，不参与去重。
+
+ydl_opts 中的 'postprocess'（见 postprocess.py）不会传给 yt-dlp：传入 PostProcessor 时，
+下载完成后任务进入 postprocessing 状态，文件交给进程池写标签、标准化响度或转码，下载线程立即去下载下一个文件；
+处理完成后任务才变为 finished。去重索引按处理前的原始内容登记；本地已有相同媒体而跳过下载时，
+复用的文件同样按本任务的选项处理。
+"""
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cookies import apply_cookies, get_cookie_provider
+from postprocess import needs_processing
+from ratelimit import get_rate_limiter
+from scheduler import AdaptiveScheduler
+from segmented import SegmentedDownloader, SegmentedUnsupported, is_direct_media, target_path
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+POSTPROCESSING = 'postprocessing'
+FINISHED = 'finished'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+
+FINAL_STATES = (FINISHED, ERROR, CANCELLED)
+# 只写入任务库的状态：因程序退出而中止的任务，内存中的状态和事件仍是 cancelled（事件带 'interrupted': True）
+INTERRUPTED = 'interrupted'
+MAX_FINISHED_JOBS = 1000  # 内存中保留的已结束任务数，更早的任务只能从 JobStore 查询
+
+CANCEL_MESSAGE = "Download cancelled by user."
+
+
+class DownloadJob:
+    """单个下载任务的状态"""
+
+    def __init__(self, job_id, url, ydl_opts, kind, meta):
+        self.id = job_id
+        self.url = url
+        self.ydl_opts = ydl_opts
+        self.kind = kind
+        self.meta = meta
+        self.state = QUEUED
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.speed = 0
+        self.filename = None
+        self.error = None
+        self.interrupted = False  # 是否因 shutdown() 而中止
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    def snapshot(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'kind': self.kind,
+            'meta': self.meta,
+            'state': self.state,
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'speed': self.speed,
+            'filename': self.filename,
+            'error': self.error,
+        }
+
+
+class DownloadEngine:
+    """
+    max_workers 是初始并发数，实际并发由 scheduler 根据吞吐量和限流情况动态调整。
+    """
+
+    def __init__(self, max_workers=5, logger=None, scheduler=None, store=None, info_cache=None,
+                 cookie_provider=None, rate_limiter=None, media_index=None, postprocessor=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.scheduler = scheduler or AdaptiveScheduler(initial=max_workers)
+        self.store = store
+        self.info_cache = info_cache
+        self.cookie_provider = cookie_provider or get_cookie_provider()
+        self.limiter = rate_limiter or get_rate_limiter()
+        self.media_index = media_index
+        self.postprocessor = postprocessor
+        # 线程池按调度器的最大并发创建，实际同时运行的任务数由 _dispatch 控制
+        self._pool = ThreadPoolExecutor(max_workers=self.scheduler.max_workers)
+        self._lock = threading.Lock()
+        self._jobs = {}     # job_id -> DownloadJob
+        self._finished = deque()  # 已结束的任务 ID，按结束顺序
+        self._pending = []  # 等待调度的任务，按提交顺序
+        self._futures = {}  # job_id -> Future（后处理阶段为进程池的 Future）
+        self._listeners = []
+
+    # --- 事件订阅 ---
+
+    def add_listener(self, callback):
+        """注册事件回调，callback(event) 会在工作线程中被调用"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _emit(self, job, status, data=None, **extra):
+        event = {
+            'status': status,
+            'job_id': job.id,
+            'url': job.url,
+            'data': data or {},
+            'job': job.snapshot(),
+        }
+        event.update(extra)
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                self.logger.error(f"事件回调出错: {e}")
+
+    # --- 任务接口 ---
+
+    def submit(self, url, ydl_opts=None, kind='podcast', meta=None, job_id=None):
+        """提交下载任务，返回任务 ID"""
+        return self.submit_many([(url, ydl_opts, kind, meta, job_id)])[0]
+
+    def submit_many(self, requests):
+        """
+        一次提交多个任务，requests 为 (url, ydl_opts, kind, meta[, job_id]) 的列表，返回任务 ID 列表。
+
+        一次选中几千个单集时只写一次任务库（一个事务），界面线程不会被逐个提交卡住。
+        """
+        jobs = []
+        with self._lock:
+            for request in requests:
+                url, ydl_opts, kind, meta = request[:4]
+                job_id = request[4] if len(request) > 4 else None
+                job = DownloadJob(job_id or uuid.uuid4().hex[:12], url, dict(ydl_opts or {}), kind, meta or {})
+                self._jobs[job.id] = job
+                jobs.append(job)
+        if self.store and jobs:
+            self.store.add_many(jobs)
+        for job in jobs:
+            self._emit(job, QUEUED)
+        with self._lock:
+            self._pending.extend(jobs)
+        self._dispatch()
+        return [job.id for job in jobs]
+
+    def resume_unfinished(self, kind=None):
+        """重新提交任务库中未完成的任务，返回任务 ID 列表"""
+        if not self.store:
+            return []
+        requests = []
+        for record in self.store.unfinished(kind):
+            with self._lock:
+                if record['id'] in self._jobs and self._jobs[record['id']].state not in FINAL_STATES:
+                    continue
+            ydl_opts = dict(record['ydl_opts'])
+            # 使用相同的输出模板并保留 .part 文件，yt-dlp 会从断点继续
+            ydl_opts['continuedl'] = True
+            ydl_opts['nopart'] = False
+            ydl_opts.setdefault('logger', self.logger)
+            self.logger.info(f"继续未完成的任务 {record['url']}（已下载 {record['downloaded_bytes']} 字节）")
+            requests.append((record['url'], ydl_opts, record['kind'], record['meta'], record['id']))
+        return self.submit_many(requests)
+
+    def cancel(self, job_id, interrupted=False):
+        """
+        中止任务，未开始的任务直接取消，运行中的任务在下一次进度回调时中止。
+        interrupted 为 True 时任务是因程序退出而中止，下次启动时由 resume_unfinished() 继续。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINAL_STATES:
+                return False
+            job.interrupted = interrupted
+            job.cancel_event.set()
+            pending = job in self._pending
+            if pending:
+                self._pending.remove(job)
+            future = self._futures.get(job_id) if job.state == POSTPROCESSING else None
+
+        if future is not None:
+            # 还在排队的后处理直接取消，已经开始的处理无法中止，完成后按取消处理
+            future.cancel()
+            return True
+
+        if pending:
+            self._finish(job, CANCELLED)
+        return True
+
+    def cancel_all(self, interrupted=False):
+        with self._lock:
+            job_ids = list(self._jobs)
+        for job_id in job_ids:
+            self.cancel(job_id, interrupted)
+
+    def status(self, job_id):
+        """返回任务状态快照，任务不存在时返回 None；已从内存中移除的任务从 JobStore 查询"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        record = self.store.get(job_id) if self.store else None
+        if record is None:
+            return None
+        return {
+            'id': record['id'],
+            'url': record['url'],
+            'kind': record['kind'],
+            'meta': record['meta'],
+            'state': record['state'],
+            'downloaded_bytes': record['downloaded_bytes'],
+            'total_bytes': record['total_bytes'],
+            'speed': 0,
+            'filename': None,
+            'error': record['error'],
+        }
+
+    def jobs(self):
+        with self._lock:
+            return [job.snapshot() for job in self._jobs.values()]
+
+    def wait(self, job_ids=None, timeout=None):
+        """等待指定任务（默认全部）结束，全部结束时返回 True"""
+        with self._lock:
+            if job_ids is None:
+                job_ids = list(self._jobs)
+            jobs = [self._jobs[job_id] for job_id in job_ids if job_id in self._jobs]
+        for job in jobs:
+            if not job.done_event.wait(timeout):
+                return False
+        return True
+
+    def shutdown(self, wait=True):
+        self.cancel_all(interrupted=True)
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if self.postprocessor is not None:
+            self.postprocessor.shutdown(wait=wait)
+
+    # --- 调度 ---
+
+    def _dispatch(self):
+        """在调度器允许的范围内启动等待中的任务，被主机上限挡住的任务不阻塞其他主机"""
+        with self._lock:
+            for job in list(self._pending):
+                if self.scheduler.in_flight >= self.scheduler.limit:
+                    break
+                if not self.scheduler.try_acquire(job.url):
+                    continue
+                self._pending.remove(job)
+                self._futures[job.id] = self._pool.submit(self._run, job)
+
+    # --- 工作线程 ---
+
+    def _finish(self, job, state, error=None):
+        job.state = state
+        job.error = error
+        job.speed = 0
+        with self._lock:
+            self._futures.pop(job.id, None)
+        interrupted = state == CANCELLED and job.interrupted
+        if self.store:
+            # 还没有任何进度时（例如继续的任务在开始前又被中止）保留任务库中的字节数
+            self.store.update_state(job.id, INTERRUPTED if interrupted else state, error,
+                                    job.downloaded_bytes or None, job.total_bytes or None)
+        self._emit(job, state, error=error, interrupted=interrupted)
+        job.done_event.set()
+        self._evict(job)
+
+    def _evict(self, job):
+        """长时间运行时只在内存中保留最近结束的 MAX_FINISHED_JOBS 个任务"""
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                job_id = self._finished.popleft()
+                old = self._jobs.get(job_id)
+                # 同一 ID 可能已被重新提交，只移除已结束的任务
+                if old is not None and old.state in FINAL_STATES:
+                    del self._jobs[job_id]
+
+    def _download_segmented(self, job, ydl_opts, connections, progress_hook):
+        """尝试用分段下载器下载，不适用时返回 False 由 yt-dlp 处理"""
+        if not is_direct_media(job.url) or 'outtmpl' not in ydl_opts:
+            return False
+        try:
+            path = target_path(ydl_opts['outtmpl'], job.url)
+            SegmentedDownloader(
+                job.url, path, connections, progress_hook=progress_hook,
+                throttle=lambda nbytes: self.limiter.throttle(job.id, nbytes, job.cancel_event),
+            ).download()
+        except SegmentedUnsupported as e:
+            self.logger.info(f"分段下载不可用，改用 yt-dlp: {e}")
+            return False
+        return True
+
+    def _download_with_ydl(self, job, ydl_opts, cookies_from=None):
+        # yt-dlp 加载较慢，只在真正需要时导入，命令行启动和直链下载不受影响
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if cookies_from:
+                apply_cookies(ydl, self.cookie_provider.get_jar(cookies_from, job.url))
+            info = self.info_cache.get(job.url) if self.info_cache and job.kind == 'video' else None
+            if info is None:
+                ydl.download([job.url])
+                return
+            try:
+                # 与 --load-info-json 相同：用已提取的信息直接选择格式并下载
+                ydl.process_ie_result(info, download=True)
+            except Exception as e:
+                if job.cancel_event.is_set() or CANCEL_MESSAGE in str(e):
+                    raise
+                # 缓存的直链可能已经失效，丢弃缓存后重新提取
+                self.logger.info(f"缓存的视频信息不可用，重新提取: {e}")
+                self.info_cache.invalidate(job.url)
+                ydl.download([job.url])
+
+    def _make_progress_hook(self, job, throttled=True):
+        """throttled 为 False 时不限速，用于自行限速的分段下载器"""
+        started = False
+
+        def hook(d):
+            nonlocal started
+            if job.cancel_event.is_set():
+                from yt_dlp.utils import DownloadError
+                raise DownloadError(CANCEL_MESSAGE)
+
+            if d['status'] == 'downloading':
+                downloaded = d.get('downloaded_bytes') or 0
+                if not started or downloaded < job.downloaded_bytes:
+                    # 第一次报告或开始下载新文件（视频的音视频分别下载）时以此为起点：
+                    # 从 .part 续传时报告的字节数已经包含磁盘上的部分，不能计入限速和吞吐量
+                    started = True
+                    delta = 0
+                else:
+                    delta = downloaded - job.downloaded_bytes
+                if self.scheduler.record_bytes(delta):
+                    self._dispatch()
+                if throttled:
+                    self.limiter.throttle(job.id, delta, job.cancel_event)
+                job.downloaded_bytes = downloaded
+                job.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                job.speed = d.get('speed') or 0
+                if self.store:
+                    self.store.update_progress(job.id, job.downloaded_bytes, job.total_bytes)
+                self._emit(job, 'downloading', d)
+            elif d['status'] == 'finished':
+                # 视频可能由多个文件合并而成，这里只记录文件名，
+                # 整个任务结束时再发送 finished 事件
+                job.filename = d.get('filename') or job.filename
+        return hook
+
+    def _run(self, job):
+        error = None
+        try:
+            self._execute(job)
+        except Exception as e:
+            error = str(e)
+        finally:
+            if self.scheduler.release(job.url, error):
+                self.logger.info(f"并发上限调整为 {self.scheduler.limit}")
+            self._dispatch()
+
+    def _execute(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+
+        job.state = RUNNING
+        if self.store:
+            self.store.update_state(job.id, RUNNING)
+        self._emit(job, RUNNING)
+
+        ydl_opts = dict(job.ydl_opts)
+        connections = ydl_opts.pop('native_connections', 1) or 1
+        cookies_from = ydl_opts.pop('cookies_from', None)
+        rate_limit = ydl_opts.pop('rate_limit', 0)
+        postprocess = ydl_opts.pop('postprocess', None)
+        if self.postprocessor is None or not needs_processing(postprocess):
+            postprocess = None
+        if self._reuse_existing(job, ydl_opts, postprocess):
+            return
+        ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks', [])) + [self._make_progress_hook(job)]
+        self.limiter.start_job(job.id, job.url, rate_limit)
+        try:
+            if not (connections > 1 and self._download_segmented(
+                    job, ydl_opts, connections, self._make_progress_hook(job, throttled=False))):
+                self._download_with_ydl(job, ydl_opts, cookies_from)
+        except Exception as e:
+            if job.cancel_event.is_set() or CANCEL_MESSAGE in str(e):
+                self._finish(job, CANCELLED)
+                return
+            self.logger.error(f"下载失败 {job.url}: {e}")
+            self._finish(job, ERROR, str(e))
+            raise
+        finally:
+            self.limiter.finish_job(job.id)
+
+        # 按原始内容登记，写标签、转码不影响跨订阅去重；还要处理的文件不做硬链接替换
+        self._index_download(job, link=postprocess is None)
+        if self._start_postprocess(job, postprocess):
+            return
+        self._finish(job, FINISHED)
+
+    def _start_postprocess(self, job, options):
+        """把下载好的文件交给后处理进程池，返回 True 表示任务将在处理完成后结束"""
+        if not options or not job.filename:
+            return False
+        job.state = POSTPROCESSING
+        job.speed = 0
+        if self.store:
+            self.store.update_state(job.id, POSTPROCESSING)
+        self._emit(job, POSTPROCESSING)
+        future = self.postprocessor.submit(job.filename, options)
+        with self._lock:
+            self._futures[job.id] = future
+        future.add_done_callback(lambda f: self._finish_postprocess(job, f))
+        return True
+
+    def _finish_postprocess(self, job, future):
+        if future.cancelled() or job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self.logger.error(f"后处理失败 {job.filename}: {e}")
+            self._finish(job, ERROR, f"后处理失败: {e}")
+            return
+        for warning in result['warnings']:
+            self.logger.warning(warning)
+        raw_path, job.filename = job.filename, result['path']
+        if self.media_index is not None and job.kind == 'podcast':
+            try:
+                self.media_index.update_path(raw_path, job.filename)
+            except Exception as e:
+                self.logger.error(f"登记已下载的媒体失败: {e}")
+        self._finish(job, FINISHED)
+
+    def _reuse_existing(self, job, ydl_opts, postprocess=None):
+        """
+        本地已有相同媒体时不再下载，返回 True。
+
+        需要后处理时复用的文件是单独的一份（硬链接在写标签前断开），按本任务的选项重新处理，
+        不会沿用其他订阅的标签；目标文件就是已有文件本身时（例如重新运行同一订阅）不再重复处理。
+        """
+        if self.media_index is None or job.kind != 'podcast':
+            return False
+        try:
+            path, placed = self.media_index.place(job.url, job.meta.get('guid'), ydl_opts.get('outtmpl'),
+                                                  private=postprocess is not None)
+        except Exception as e:
+            self.logger.error(f"查找已下载的媒体失败: {e}")
+            return False
+        if path is None:
+            return False
+        self.logger.info(f"已有相同的媒体，跳过下载: {job.url} -> {path}")
+        job.filename = path
+        job.meta = dict(job.meta, deduplicated=True)
+        if placed and self._start_postprocess(job, postprocess):
+            return True
+        self._finish(job, FINISHED)
+        return True
+
+    def _index_download(self, job, link=True):
+        if self.media_index is None or job.kind != 'podcast' or not job.filename:
+            return
+        try:
+            if os.path.isfile(job.filename):
+                self.media_index.add(job.filename, job.url, job.meta.get('guid'), link=link)
+        except Exception as e:
+            self.logger.error(f"登记已下载的媒体失败: {e}")
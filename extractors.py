@@ -0,0 +1,402 @@
+"""
+无界面的元数据提取逻辑：播客 RSS / Apple Podcast / 小宇宙解析与视频格式提取。
+
+这里的函数不依赖任何 Tk 组件，可同时被 GUI、命令行和服务端调用。
+yt-dlp 加载较慢，只在用到的函数中导入，命令行启动时不需要加载。
+"""
+import email.utils
+import re
+from datetime import datetime
+
+import http_session
+from cookies import apply_cookies, get_cookie_provider
+from feed_parser import RssStreamParser, iter_rss_items
+from http_cache import HttpCache
+from info_cache import InfoCache
+import xiaoyuzhou
+
+# RSS feed 缓存时间较短；Apple ID -> feedUrl 的映射几乎不变，缓存一周
+FEED_TTL = 15 * 60
+LOOKUP_TTL = 7 * 24 * 3600
+EPISODE_TTL = 24 * 3600  # 单集页面发布后基本不变
+
+_http_cache = None
+_info_cache = None
+_xiaoyuzhou_page_cache = None
+
+
+def get_http_cache():
+    """返回进程内共用的磁盘 HTTP 缓存"""
+    global _http_cache
+    if _http_cache is None:
+        _http_cache = HttpCache()
+    return _http_cache
+
+
+def set_http_cache(cache):
+    """替换共用缓存（例如命令行指定了不同的 TTL 或容量）"""
+    global _http_cache
+    _http_cache = cache
+
+
+def get_xiaoyuzhou_page_cache():
+    """返回进程内共用的小宇宙单集列表页面缓存"""
+    global _xiaoyuzhou_page_cache
+    if _xiaoyuzhou_page_cache is None:
+        _xiaoyuzhou_page_cache = xiaoyuzhou.PageCache()
+    return _xiaoyuzhou_page_cache
+
+
+def get_info_cache():
+    """返回进程内共用的视频信息缓存"""
+    global _info_cache
+    if _info_cache is None:
+        _info_cache = InfoCache()
+    return _info_cache
+
+
+def format_size(size):
+    if size is None:
+        return "未知大小"
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def format_duration(duration):
+    try:
+        if isinstance(duration, str):
+            # 尝试将字符串转换为秒数
+            if ':' in duration:
+                parts = duration.split(':')
+                if len(parts) == 2:
+                    minutes, seconds = parts
+                    duration = int(minutes) * 60 + int(seconds)
+                elif len(parts) == 3:
+                    hours, minutes, seconds = parts
+                    duration = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+            else:
+                duration = float(duration)
+
+        # 确保duration是数字
+        duration = float(duration)
+        minutes = int(duration // 60)
+        seconds = int(duration % 60)
+        return f"{minutes:02d}:{seconds:02d}"
+    except:
+        return "00:00"
+
+
+def format_date(date_str):
+    try:
+        # RSS 的 pubDate 为 RFC 822 格式，时区可能是 GMT 之类的名称
+        try:
+            return email.utils.parsedate_to_datetime(date_str).strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            pass
+        # 尝试解析多种日期格式
+        for fmt in ['%a, %d %b %Y %H:%M:%S %z', '%Y-%m-%d', '%Y%m%d']:
+            try:
+                dt = datetime.strptime(date_str, fmt)
+                return dt.strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return date_str[:10]  # 如果无法解析，返回前10个字符
+    except:
+        return ""
+
+
+def safe_filename(name):
+    """把标题转换为可以安全用作文件或目录名的字符串"""
+    return re.sub(r'[\\/*?:"<>|]', "_", name.strip())
+
+
+def parse_rss_feed(feed_url, ttl=FEED_TTL, on_items=None, known_ids=None):
+    """
+    流式解析 RSS feed，返回 (播客标题, 曲目列表)。
+
+    on_items(播客标题, 本批曲目) 在每批单集解析完成时调用，界面可以边下载边显示；
+    known_ids 为本地已有单集的 guid/音频链接集合，遇到时停止读取剩余内容。
+    """
+    try:
+        cache = get_http_cache()
+        with cache.open(feed_url, ttl=ttl) as stream:
+            parsed = cache.get_parsed(feed_url) if stream.not_modified and not known_ids else None
+            if parsed:
+                # feed 内容未变，直接复用上次的解析结果
+                stream.close()
+                if on_items:
+                    on_items(parsed['title'], parsed['items'])
+                return parsed['title'], parsed['items']
+
+            # 边接收边解析RSS内容
+            items = []
+            parser = RssStreamParser(known_ids)
+            for batch in iter_rss_items(stream.iter_content(), parser):
+                items.extend(batch)
+                if on_items:
+                    on_items(parser.podcast_title or "未知播客", batch)
+
+        # 获取播客标题（唱片集名称）
+        podcast_title = parser.podcast_title or "未知播客"
+        if not parser.stopped:
+            cache.put_parsed(feed_url, {'title': podcast_title, 'items': items})
+        return podcast_title, items
+
+    except Exception as e:
+        raise Exception(f"解析RSS feed失败: {str(e)}")
+
+
+def fetch_new_episodes(feed_url, known_ids, ttl=0):
+    """
+    订阅同步用：条件请求 feed，只解析到第一个已知单集为止。
+
+    返回 (播客标题, 新单集列表)，feed 未变化且没有缓存内容时标题为 None。
+    """
+    try:
+        with get_http_cache().open(feed_url, ttl=ttl, partial_ok=True) as stream:
+            parser = RssStreamParser(known_ids)
+            items = []
+            for batch in iter_rss_items(stream.iter_content(), parser):
+                items.extend(batch)
+        return parser.podcast_title, items
+    except Exception as e:
+        raise Exception(f"解析RSS feed失败: {str(e)}")
+
+
+def resolve_feed_url(url):
+    """把 Apple Podcast 链接转换为 RSS 地址，其他链接原样返回"""
+    if "podcasts.apple.com" in url:
+        return get_rss_feed(url)
+    return url
+
+
+def get_rss_feed(apple_url):
+    """通过 iTunes lookup 接口把 Apple Podcast 链接转换为 RSS feed 地址"""
+    try:
+        # 从 Apple Podcast URL 中提取播客 ID
+        match = re.search(r'/id(\d+)', apple_url)
+        if not match:
+            raise Exception("无法从链接中提取播客ID")
+        podcast_id = match.group(1)
+
+        # 构建 RSS feed URL
+        lookup_url = f"https://itunes.apple.com/lookup?id={podcast_id}&entity=podcast"
+
+        # 获取播客信息
+        response = get_http_cache().get(lookup_url, ttl=LOOKUP_TTL)
+        data = response.json()
+
+        if not data.get('results'):
+            raise Exception("未找到播客信息")
+
+        # 获取播客 RSS feed URL
+        feed_url = data['results'][0].get('feedUrl')
+        if not feed_url:
+            raise Exception("未找到 RSS feed URL")
+
+        return feed_url
+
+    except Exception as e:
+        raise Exception(f"获取 RSS feed 失败: {str(e)}")
+
+
+def _fetch_next_data(url):
+    resp = http_session.get(url, timeout=(10, 15))
+    resp.raise_for_status()
+    data = xiaoyuzhou.extract_next_data(xiaoyuzhou.page_text(resp))
+    if data is None:
+        raise Exception("未找到页面数据")
+    return data
+
+
+def parse_xiaoyuzhou_episode(episode_url, ttl=EPISODE_TTL):
+    """
+    解析小宇宙单集页面，返回 (播客标题, 曲目列表)。
+
+    页面和解析结果都写入 HTTP 缓存，TTL 内再次解析同一单集不发请求，内容未变时也不重新解析。
+    """
+    try:
+        episode_url = xiaoyuzhou.canonical_url(episode_url)
+        cache = get_http_cache()
+        resp = cache.get(episode_url, ttl=ttl)
+        if resp.not_modified:
+            parsed = cache.get_parsed(episode_url)
+            if parsed:
+                return parsed['title'], parsed['items']
+
+        data = xiaoyuzhou.extract_next_data(resp.text)
+        if data is None:
+            raise Exception("未找到页面数据")
+        podcast_title, items = xiaoyuzhou.parse_episode_data(data)
+        cache.put_parsed(episode_url, {'title': podcast_title, 'items': items})
+        return podcast_title, items
+    except Exception as e:
+        raise Exception(f"解析小宇宙页面失败: {str(e)}")
+
+
+def parse_xiaoyuzhou_podcast(podcast_url, on_items=None, known_ids=None, logger=None):
+    """
+    解析小宇宙播客主页，返回 (播客标题, 曲目列表)。
+
+    主页只内嵌最近的一批单集；设置了 access token 时再通过接口分页取回其余单集，
+    每取回一页调用一次 on_items(播客标题, 本批曲目)。known_ids 中的单集出现时停止（订阅同步用）。
+    """
+    try:
+        data = _fetch_next_data(podcast_url)
+        podcast_title, items = xiaoyuzhou.parse_podcast_data(data)
+        if items is None:
+            # 如果未找到列表，则尝试将整个页面作为单集解析
+            return xiaoyuzhou.parse_episode_data(data)
+    except Exception as e:
+        raise Exception(f"解析小宇宙播客失败: {str(e)}")
+
+    reached_known = False
+    if known_ids:
+        for i, item in enumerate(items):
+            if (item.get('guid') or item['url']) in known_ids or item['url'] in known_ids:
+                items, reached_known = items[:i], True
+                break
+    if on_items and items:
+        on_items(podcast_title, items)
+
+    pid = xiaoyuzhou.podcast_id(podcast_url)
+    token = xiaoyuzhou.access_token()
+    if reached_known or not pid or not token:
+        if logger and not token and not reached_known:
+            logger.info(f"未设置 {xiaoyuzhou.ACCESS_TOKEN_ENV}，只获取主页中的最近单集")
+        return podcast_title, items
+
+    items = list(items)
+    try:
+        seen = [item.get('guid') or item['url'] for item in items]
+        for batch in xiaoyuzhou.iter_podcast_items(pid, token, get_xiaoyuzhou_page_cache(), seen, known_ids):
+            items.extend(batch)
+            if on_items:
+                on_items(podcast_title, batch)
+    except Exception as e:
+        # 接口失败（例如 token 过期）时保留已经取到的单集
+        if logger:
+            logger.error(f"小宇宙单集列表接口请求失败，只返回已获取的 {len(items)} 个单集: {e}")
+    return podcast_title, items
+
+
+def fetch_podcast(url, logger=None, on_items=None):
+    """
+    根据链接类型选择解析方式，返回 (播客标题, 曲目列表)。
+
+    on_items(播客标题, 本批曲目) 对 RSS feed 和小宇宙播客主页生效，用于边解析边显示。
+    """
+    if "podcasts.apple.com" in url:
+        feed_url = get_rss_feed(url)
+        if logger:
+            logger.info(f"获取到 RSS feed URL: {feed_url}")
+        return parse_rss_feed(feed_url, on_items=on_items)
+    elif "xiaoyuzhoufm.com/podcast/" in url:
+        return parse_xiaoyuzhou_podcast(url, on_items=on_items, logger=logger)
+    elif "xiaoyuzhoufm.com/episode/" in url:
+        return parse_xiaoyuzhou_episode(url)
+    else:
+        try:
+            if logger:
+                logger.info(f"尝试将链接作为通用 RSS feed 解析: {url}")
+            return parse_rss_feed(url, on_items=on_items)
+        except Exception as rss_error:
+            if logger:
+                logger.error(f"无法将链接作为通用 RSS feed 解析: {rss_error}")
+            raise Exception("不支持的播客链接，目前支持 Apple Podcast、小宇宙或有效的 RSS feed")
+
+
+def extract_video_info(url, ydl_opts=None, use_cache=True):
+    """
+    提取视频信息（不下载），返回 yt-dlp 的 info 字典。
+
+    结果写入信息缓存，随后的下载和再次获取格式可以直接复用。
+    ydl_opts 中的 'cookies_from' 为浏览器名称时，使用该浏览器的 Cookie。
+    """
+    cache = get_info_cache() if use_cache else None
+    if cache is not None:
+        info = cache.get(url)
+        if info is not None:
+            return info
+
+    import yt_dlp
+
+    ydl_opts = dict(ydl_opts or {})
+    cookies_from = ydl_opts.pop('cookies_from', None)
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        if cookies_from:
+            apply_cookies(ydl, get_cookie_provider().get_jar(cookies_from, url))
+        info = ydl.extract_info(url, download=False)
+        if info:
+            info = ydl.sanitize_info(info)
+    if not info:
+        raise Exception("无法获取视频信息")
+    if not info.get('formats'):
+        raise Exception("无法获取视频格式")
+    if cache is not None:
+        cache.put(url, info)
+    return info
+
+
+def expand_video_urls(url, ydl_opts=None):
+    """
+    把播放列表、频道展开为单个视频，返回 [{'url', 'title'}]；普通视频链接原样返回。
+
+    只做扁平提取，不解析每个视频的格式，数百个视频的频道也能很快展开。
+    """
+    import yt_dlp
+
+    opts = dict(ydl_opts or {})
+    opts.update({'extract_flat': 'in_playlist', 'quiet': True, 'no_warnings': True})
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    if not info:
+        raise Exception("无法获取视频信息")
+
+    videos = []
+
+    def collect(entry):
+        if not entry:
+            return
+        if entry.get('_type') == 'playlist':
+            for child in entry.get('entries') or []:
+                collect(child)
+            return
+        video_url = entry.get('webpage_url') or entry.get('url')
+        if video_url:
+            videos.append({'url': video_url, 'title': entry.get('title') or video_url})
+
+    if info.get('_type') == 'playlist':
+        collect(info)
+    else:
+        videos.append({'url': info.get('webpage_url') or url, 'title': info.get('title') or url})
+    return videos
+
+
+def split_formats(formats):
+    """把格式列表拆分为视频/音频两组下拉框选项文本"""
+    video_formats = []
+    audio_formats = []
+
+    for f in formats:
+        if f.get('vcodec') != 'none':
+            has_audio = f.get('acodec') != 'none'
+            format_str = (
+                f"{f['format_id']} - "
+                f"{f.get('height', 'N/A')}p "
+                f"[{format_size(f.get('filesize'))}] "
+                f"{'[带音频]' if has_audio else '[无音频]'}"
+            )
+            video_formats.append(format_str)
+        elif f.get('acodec') != 'none':
+            format_str = (
+                f"{f['format_id']} - "
+                f"{f.get('acodec', 'N/A')} "
+                f"[{format_size(f.get('filesize'))}]"
+            )
+            audio_formats.append(format_str)
+
+    return video_formats, audio_formats
@@ -0,0 +1,153 @@
+"""
+批量并发获取和解析多个 feed。
+
+fetch_feeds() 接受 URL 列表（或 load_opml() 的结果），用线程池并发抓取，
+同一主机的并发数由 HostLimiter 限制（每个主机单独排队，等待的任务不占用线程），
+每个 feed 完成后立即产出结果，不必等待整批结束。
+
+fetch_merged() 用于一次粘贴很多单集链接（例如几百个小宇宙单集页面）：并发解析后合并为一个列表。
+"""
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import extractors
+import xiaoyuzhou
+from scheduler import HostLimiter, host_of
+
+DEFAULT_WORKERS = 16
+RETRY_INTERVAL = 0.1
+MIXED_PODCAST_TITLE = "多个播客"
+
+
+def load_opml(path):
+    """读取 OPML 文件中的全部 feed 地址（xmlUrl），保持原顺序并去重"""
+    tree = ET.parse(path)
+    urls = []
+    for outline in tree.iter('outline'):
+        url = outline.get('xmlUrl') or outline.get('xmlurl')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def run_per_host(items, func, url_of=lambda item: item, max_workers=DEFAULT_WORKERS, limiter=None):
+    """
+    并发执行 func(item)，按完成顺序产出 (item, 结果, 错误)。
+
+    limiter 为 HostLimiter，用于限制同一主机同时进行的请求数。每个主机有自己的队列，
+    只有主机还有空位（try_acquire 成功）时才把它的下一个任务交给线程池，
+    所以慢主机排队的任务不会占住线程、拖慢其他主机。
+    """
+    limiter = limiter or HostLimiter()
+    queues = OrderedDict()
+    for item in items:
+        queues.setdefault(host_of(url_of(item)), deque()).append(item)
+    running = {}  # Future -> 任务
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def fill():
+        # 轮流从各主机取任务，达到上限的主机跳过，直到线程池满或没有可以开始的任务
+        started = True
+        while started and len(running) < max_workers:
+            started = False
+            for host in list(queues):
+                if len(running) >= max_workers:
+                    break
+                item = queues[host][0]
+                if not limiter.try_acquire(url_of(item)):
+                    continue
+                queues[host].popleft()
+                if not queues[host]:
+                    del queues[host]
+                running[pool.submit(func, item)] = item
+                started = True
+
+    try:
+        fill()
+        while running or queues:
+            if not running:
+                # 剩下的主机都被其他调用方占满，稍后再试
+                time.sleep(RETRY_INTERVAL)
+                fill()
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                limiter.release(url_of(item))
+                fill()
+                error = future.exception()
+                yield (item, None, error) if error is not None else (item, future.result(), None)
+    finally:
+        # 调用方提前结束迭代时，等待已开始的任务结束并归还名额
+        pool.shutdown(wait=True)
+        for item in running.values():
+            limiter.release(url_of(item))
+
+
+def fetch_feeds(urls, max_workers=DEFAULT_WORKERS, limiter=None, logger=None):
+    """
+    并发获取多个播客链接，按完成顺序产出字典：
+    {'url': 链接, 'title': 播客标题, 'items': 曲目列表, 'error': 错误信息或 None}
+    """
+    def fetch(url):
+        return extractors.fetch_podcast(url, logger=logger)
+
+    for url, result, error in run_per_host(urls, fetch, max_workers=max_workers, limiter=limiter):
+        if error is not None:
+            if logger:
+                logger.error(f"获取 {url} 失败: {error}")
+            yield {'url': url, 'title': None, 'items': [], 'error': str(error)}
+        else:
+            title, items = result
+            yield {'url': url, 'title': title, 'items': items, 'error': None}
+
+
+def split_urls(text):
+    """把粘贴的多个链接（空白、逗号或换行分隔）拆开，规范化后去重，保持原顺序"""
+    urls = []
+    for part in re.split(r'[\s,，]+', text or ''):
+        if part:
+            url = xiaoyuzhou.canonical_url(part)
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+def fetch_merged(urls, max_workers=8, limiter=None, logger=None, on_result=None):
+    """
+    并发获取多个播客或单集链接并按输入顺序合并，返回 (播客标题, 曲目列表, 失败列表)。
+
+    每个曲目带上所属的 'podcast_title'；全部来自同一播客时返回该播客的标题。
+    on_result(fetch_feeds 的结果字典) 在每个链接完成时调用，界面可以先显示已完成的部分。
+    失败列表为 [(链接, 错误信息)]，全部失败时抛出异常。
+    """
+    results = {}
+    for result in fetch_feeds(urls, max_workers=max_workers, limiter=limiter, logger=logger):
+        for item in result['items']:
+            item.setdefault('podcast_title', result['title'])
+        results[result['url']] = result
+        if on_result:
+            on_result(result)
+
+    items, titles, errors = [], [], []
+    seen = set()
+    for url in urls:
+        result = results[url]
+        if result['error'] is not None:
+            errors.append((url, result['error']))
+            continue
+        if result['title'] not in titles:
+            titles.append(result['title'])
+        for item in result['items']:
+            key = item.get('guid') or item['url']
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+
+    if errors and not items:
+        raise Exception(f"全部 {len(errors)} 个链接获取失败: {errors[0][1]}")
+    title = titles[0] if len(titles) == 1 else MIXED_PODCAST_TITLE
+    return title, items, errors
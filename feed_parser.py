@@ -0,0 +1,204 @@
+"""
+增量 RSS 解析器。
+
+基于 xml.etree.ElementTree.XMLPullParser，边接收数据边产出单集字典，
+不需要先把整个 feed 读入内存再构建 DOM。每个 <item> 处理完立即从树中移除，
+内存占用与 feed 长度无关。遇到本地已知的单集（按 guid 或音频链接）时可以提前停止。
+
+实际的 feed 经常不是合法的 XML（未定义的 &nbsp;、没有转义的 &），
+所以优先使用 lxml 的 XMLPullParser 并开启 recover，容错程度与原来的 BeautifulSoup 解析相同；
+没有安装 lxml 时退回标准库的严格解析器。recover 会丢掉无法识别的实体之后的文字（"Q&A" 变成 "Q"），
+因此数据在送入解析器前先经过 EntityFixer：HTML 命名实体转换为数字引用，多余的 & 转义为 &amp;，
+CDATA 中的内容保持不变。
+"""
+import html.entities
+import re
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+def _local(tag):
+    """去掉命名空间，例如 {http://www.itunes.com/dtds/podcast-1.0.dtd}duration -> duration"""
+    if not isinstance(tag, str):
+        return ''  # lxml 中注释和处理指令的 tag 不是字符串
+    return tag.rsplit('}', 1)[-1]
+
+
+_AMP_PATTERN = re.compile(rb'&(#[0-9]{1,7};|#[xX][0-9a-fA-F]{1,6};|([A-Za-z][A-Za-z0-9]{0,31});)?')
+_XML_ENTITIES = (b'amp', b'lt', b'gt', b'quot', b'apos')
+_CDATA_START = b'<![CDATA['
+_CDATA_END = b']]>'
+_MAX_ENTITY = 40
+
+
+def _fix_amp(match):
+    if match.group(1) is None:
+        return b'&amp;'
+    name = match.group(2)
+    if name is None or name in _XML_ENTITIES:
+        return match.group(0)
+    codepoint = html.entities.name2codepoint.get(name.decode('ascii'))
+    if codepoint is None:
+        return b'&amp;' + match.group(1)
+    return b'&#%d;' % codepoint
+
+
+class EntityFixer:
+    """逐块修正 feed 中的实体，块边界上可能被截断的实体或 CDATA 标记留到下一块处理"""
+
+    def __init__(self):
+        self._pending = b''
+        self._in_cdata = False
+
+    def feed(self, data, final=False):
+        data = self._pending + data
+        out = []
+        pos = 0
+        while pos < len(data):
+            if self._in_cdata:
+                end = data.find(_CDATA_END, pos)
+                if end < 0:
+                    stop = len(data) if final else max(pos, len(data) - len(_CDATA_END) + 1)
+                    out.append(data[pos:stop])
+                    pos = stop
+                    break
+                out.append(data[pos:end + len(_CDATA_END)])
+                pos = end + len(_CDATA_END)
+                self._in_cdata = False
+                continue
+
+            start = data.find(_CDATA_START, pos)
+            if start >= 0:
+                stop = start
+            elif final:
+                stop = len(data)
+            else:
+                stop = max(pos, len(data) - len(_CDATA_START) + 1)
+                amp = data.rfind(b'&', pos, stop)
+                if amp >= 0 and b';' not in data[amp:stop] and stop - amp < _MAX_ENTITY:
+                    stop = amp
+            out.append(_AMP_PATTERN.sub(_fix_amp, data[pos:stop]))
+            pos = stop
+            if start < 0:
+                break
+            out.append(_CDATA_START)
+            pos = start + len(_CDATA_START)
+            self._in_cdata = True
+        self._pending = data[pos:]
+        return b''.join(out)
+
+
+def make_pull_parser():
+    if lxml_etree is not None:
+        return lxml_etree.XMLPullParser(events=('start', 'end'), recover=True, resolve_entities=False,
+                                        no_network=True, huge_tree=True)
+    return ET.XMLPullParser(events=('start', 'end'))
+
+
+class RssStreamParser:
+    def __init__(self, known_ids=None):
+        self.known_ids = known_ids or set()
+        self.podcast_title = None
+        self.podcast_artwork = None  # 频道封面，单集没有自己的封面时使用
+        self.stopped = False  # 是否因为遇到已知单集而提前停止
+        self._parser = make_pull_parser()
+        self._fixer = EntityFixer()
+        self._path = []
+        self._channel = None
+        self._fed = False
+
+    def feed(self, chunk):
+        """输入一段数据，返回这段数据中解析完成的新单集列表"""
+        if self.stopped:
+            return []
+        self._fed = True
+        self._parser.feed(self._fixer.feed(chunk))
+        return self._read_events()
+
+    def close(self):
+        # 没有收到任何数据（例如 304 且只缓存了校验信息）时视为没有新单集
+        if self.stopped or not self._fed:
+            return []
+        self._parser.feed(self._fixer.feed(b'', final=True))
+        self._parser.close()
+        return self._read_events()
+
+    def _read_events(self):
+        items = []
+        for event, elem in self._parser.read_events():
+            tag = _local(elem.tag)
+            if event == 'start':
+                self._path.append(tag)
+                if tag == 'channel' and self._channel is None:
+                    self._channel = elem
+                continue
+
+            self._path.pop()
+            if tag == 'title' and self._path and self._path[-1] == 'channel' and self.podcast_title is None:
+                self.podcast_title = (elem.text or '').strip() or "未知播客"
+            elif tag == 'image' and self._path and self._path[-1] == 'channel' and self.podcast_artwork is None:
+                # <itunes:image href="..."/> 或 <image><url>...</url></image>
+                self.podcast_artwork = elem.get('href') or self._child_text(elem, 'url') or None
+            elif tag == 'item':
+                item = self._parse_item(elem)
+                # 处理完的 item 从树中移除以释放内存；recover 模式下标签没闭合时 item 不一定直接位于 channel 下
+                parent = elem.getparent() if hasattr(elem, 'getparent') else self._channel
+                if parent is not None:
+                    parent.remove(elem)
+                if item is None:
+                    continue
+                if item['guid'] in self.known_ids or item['url'] in self.known_ids:
+                    self.stopped = True
+                    break
+                items.append(item)
+        return items
+
+    def _parse_item(self, elem):
+        fields = {}
+        enclosure_url = None
+        artwork = None
+        for child in elem:
+            tag = _local(child.tag)
+            if tag == 'enclosure':
+                enclosure_url = enclosure_url or child.get('url')
+            elif tag == 'image':
+                artwork = artwork or child.get('href')
+            elif tag not in fields:
+                fields[tag] = (child.text or '').strip()
+
+        if not enclosure_url:
+            return None
+        item = {
+            'title': fields.get('title') or "未知标题",
+            'url': enclosure_url,
+            'duration': fields.get('duration') or "0",
+            'upload_date': fields.get('pubDate', ''),
+            'guid': fields.get('guid') or enclosure_url,
+        }
+        if artwork or self.podcast_artwork:
+            item['artwork'] = artwork or self.podcast_artwork
+        return item
+
+    @staticmethod
+    def _child_text(elem, name):
+        for child in elem:
+            if _local(child.tag) == name:
+                return (child.text or '').strip()
+        return None
+
+
+def iter_rss_items(chunks, parser):
+    """把数据块迭代器转换为单集批次迭代器，每个批次是一个列表"""
+    for chunk in chunks:
+        items = parser.feed(chunk)
+        if items:
+            yield items
+        if parser.stopped:
+            return
+    items = parser.close()
+    if items:
+        yield items
@@ -0,0 +1,259 @@
+"""
+磁盘 HTTP 缓存，用于 RSS feed 和 iTunes lookup 等元数据请求。
+
+- 在 TTL 内直接返回缓存内容，不发请求；
+- 过期后带 If-None-Match / If-Modified-Since 发送条件请求，304 时沿用缓存；
+- 解析结果可以和响应体一起缓存（put_parsed/get_parsed），内容未变时无需重新解析；
+- open() 以数据块流式返回内容，边下载边写入缓存，调用方可以边收边解析；
+- partial_ok=True 时（例如订阅同步只读取 feed 开头的新单集），提前停止读取也会保存校验信息，
+  下次条件请求仍然可以得到 304，此时返回空内容；
+- 缓存总大小超过上限时按最近访问时间淘汰。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import http_session
+from paths import state_path
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class CachedResponse:
+    def __init__(self, url, content, from_cache, not_modified):
+        self.url = url
+        self.content = content
+        self.from_cache = from_cache      # 内容来自磁盘（未重新传输）
+        self.not_modified = not_modified  # 内容与上一次相同（TTL 内命中或服务器返回 304）
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class CachedStream:
+    """
+    open() 的返回值，iter_content() 只能迭代一次。
+    用完必须 close()（或用 with）：还没开始迭代就放弃时，生成器中的清理代码不会执行，要在这里关闭网络响应。
+    """
+
+    def __init__(self, url, chunks, from_cache, not_modified, response=None):
+        self.url = url
+        self._chunks = chunks
+        self._response = response
+        self.from_cache = from_cache
+        self.not_modified = not_modified
+
+    def iter_content(self):
+        return self._chunks
+
+    def close(self):
+        close = getattr(self._chunks, 'close', None)
+        if close:
+            close()
+        if self._response is not None:
+            self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HttpCache:
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or state_path("http_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, f"{key}.{suffix}")
+
+    def _load_meta(self, key):
+        try:
+            with open(self._path(key, 'json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, data, binary=False):
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        if binary:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get(self, url, ttl=None, headers=None, timeout=http_session.DEFAULT_TIMEOUT):
+        """获取 URL 完整内容，返回 CachedResponse；请求失败但有旧缓存时返回旧内容"""
+        with self.open(url, ttl=ttl, headers=headers, timeout=timeout) as stream:
+            content = b''.join(stream.iter_content())
+        return CachedResponse(url, content, stream.from_cache, stream.not_modified)
+
+    def _iter_file(self, path):
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def open(self, url, ttl=None, headers=None, timeout=http_session.DEFAULT_TIMEOUT, partial_ok=False):
+        """
+        流式获取 URL 内容，返回 CachedStream。
+
+        从网络读取时数据块同时写入临时文件，完整读完后才写入缓存；
+        调用方提前停止读取时不会留下不完整的缓存（partial_ok 时只保留校验信息）。
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = self._key(url)
+        meta = self._load_meta(key)
+        body_path = self._path(key, 'body')
+        now = time.time()
+
+        def cached_chunks():
+            # 只有校验信息、没有响应体的条目返回空内容
+            return self._iter_file(body_path) if os.path.exists(body_path) else iter(())
+
+        if not meta:
+            pass
+        elif not os.path.exists(body_path) and not (partial_ok and meta.get('partial')):
+            meta = None
+        elif now - meta['fetched_at'] < ttl:
+            meta['accessed_at'] = now
+            self._write(self._path(key, 'json'), meta)
+            return CachedStream(url, cached_chunks(), True, True)
+
+        request_headers = dict(headers or {})
+        if meta:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = http_session.get(url, headers=request_headers, timeout=timeout, stream=True)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except http_session.RequestError:
+            if meta:
+                return CachedStream(url, cached_chunks(), True, True)
+            raise
+
+        if response.status_code == 304 and meta:
+            response.close()
+            meta['fetched_at'] = now
+            meta['accessed_at'] = now
+            self._write(self._path(key, 'json'), meta)
+            return CachedStream(url, cached_chunks(), True, True)
+
+        def tee():
+            tmp_path = f"{body_path}.tmp{threading.get_ident()}"
+            size = 0
+            complete = False
+            stopped_early = False
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                        yield chunk
+                complete = True
+            except GeneratorExit:
+                # 调用方主动停止读取（而不是网络出错）
+                stopped_early = True
+                raise
+            finally:
+                response.close()
+                new_meta = {
+                    'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'headers': {'Content-Type': response.headers.get('Content-Type', '')},
+                    'fetched_at': now,
+                    'accessed_at': now,
+                    'size': size,
+                    'version': (meta or {}).get('version', 0) + 1,
+                }
+                if complete:
+                    with self._lock:
+                        os.replace(tmp_path, body_path)
+                        self._write(self._path(key, 'json'), new_meta)
+                        self._evict()
+                else:
+                    os.remove(tmp_path)
+                    if partial_ok and stopped_early:
+                        # 旧响应体已过期，只保留新的校验信息
+                        new_meta.update(partial=True, size=0)
+                        with self._lock:
+                            if os.path.exists(body_path):
+                                os.remove(body_path)
+                            self._write(self._path(key, 'json'), new_meta)
+
+        return CachedStream(url, tee(), False, False, response)
+
+    def get_parsed(self, url):
+        """返回与当前缓存内容对应的解析结果，内容已更新或不存在时返回 None"""
+        key = self._key(url)
+        meta = self._load_meta(key)
+        if not meta:
+            return None
+        try:
+            with open(self._path(key, 'parsed'), 'r', encoding='utf-8') as f:
+                parsed = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if parsed.get('version') != meta.get('version'):
+            return None
+        return parsed['value']
+
+    def put_parsed(self, url, value):
+        key = self._key(url)
+        meta = self._load_meta(key)
+        if not meta:
+            return
+        self._write(self._path(key, 'parsed'), {'version': meta.get('version'), 'value': value})
+
+    def _evict(self):
+        """总大小超过上限时按最近访问时间淘汰条目（调用方持有锁）"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            meta = self._load_meta(key)
+            if not meta:
+                continue
+            size = meta.get('size', 0)
+            parsed_path = self._path(key, 'parsed')
+            if os.path.exists(parsed_path):
+                size += os.path.getsize(parsed_path)
+            entries.append((meta.get('accessed_at', 0), key, size))
+            total += size
+
+        entries.sort()
+        for _, key, size in entries:
+            if total <= self.max_bytes:
+                break
+            for suffix in ('body', 'json', 'parsed'):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
@@ -0,0 +1,141 @@
+"""
+进程内共用的 HTTP 会话，供 feed 解析、Apple lookup、小宇宙页面等元数据请求使用。
+
+- 连接池 + keep-alive，重复访问同一主机时复用 TCP/TLS 连接；
+- 默认超时（连接 10 秒，读取 30 秒），不会再出现无超时的请求；
+- 对 429/5xx 和连接错误自动重试，按指数退避并遵守 Retry-After；
+- 安装了 httpx[http2] 并调用 configure(http2=True)（或设置环境变量
+  STREAMHARVESTER_HTTP2=1）时改用 HTTP/2，接口保持与 requests 一致。
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10, 30)
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+POOL_SIZE = 32
+
+RequestError = requests.RequestException
+
+_lock = threading.Lock()
+_client = None
+_http2 = os.environ.get("STREAMHARVESTER_HTTP2") == "1"
+
+
+def _build_requests_session():
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+class _Http2Response:
+    """把 httpx 响应包装成 requests 风格的接口"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+
+    @property
+    def content(self):
+        return self._response.read()
+
+    @property
+    def text(self):
+        self._response.read()
+        return self._response.text
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except Exception as e:
+            raise requests.ConnectionError(str(e))
+
+    def close(self):
+        self._response.close()
+
+
+class _Http2Client:
+    def __init__(self):
+        import httpx
+
+        self._httpx = httpx
+        self._client = httpx.Client(
+            http2=True,
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            transport=httpx.HTTPTransport(http2=True, retries=3),
+        )
+
+    def request(self, method, url, headers=None, timeout=DEFAULT_TIMEOUT, stream=False, **kwargs):
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        request = self._client.build_request(
+            method, url, headers=headers,
+            timeout=self._httpx.Timeout(read, connect=connect), **kwargs
+        )
+        try:
+            response = self._client.send(request, stream=True)
+        except self._httpx.HTTPError as e:
+            raise requests.ConnectionError(str(e))
+        wrapped = _Http2Response(response)
+        if not stream:
+            response.read()
+            response.close()
+        return wrapped
+
+
+def configure(http2=None):
+    """切换 HTTP/2（需要安装 httpx[http2]），下一次请求时生效"""
+    global _client, _http2
+    with _lock:
+        if http2 is not None and http2 != _http2:
+            _http2 = http2
+            _client = None
+
+
+def get_client():
+    """返回共用的 HTTP 客户端（requests.Session 或 HTTP/2 客户端）"""
+    global _client
+    with _lock:
+        if _client is None:
+            if _http2:
+                try:
+                    _client = _Http2Client()
+                except ImportError:
+                    _client = _build_requests_session()
+            else:
+                _client = _build_requests_session()
+        return _client
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return get_client().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
@@ -0,0 +1,143 @@
+"""
+yt-dlp 信息字典缓存，按视频链接索引。
+
+获取格式时提取的信息会写入内存和磁盘，随后开始下载时直接复用，不再重复提取
+（签名解密、多次 API 请求往往是最慢的一步）。重新查看最近打开过的链接也会立即返回。
+
+- 条目在 TTL 后失效；
+- 格式链接中带有过期时间（例如 YouTube 的 expire=、B 站的 deadline=）时，
+  在链接过期前提前失效，避免拿着已经过期的直链去下载；
+- 内存中只保留最近使用的若干条，磁盘上的过期文件在读取或 purge() 时删除。
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from paths import state_path
+
+DEFAULT_TTL = 30 * 60
+EXPIRE_MARGIN = 5 * 60  # 直链过期前多久视为失效
+MEMORY_ENTRIES = 64
+
+_EXPIRE_PATTERN = re.compile(r'[?&/](?:expire|expires|deadline)[=/](\d{10})')
+
+
+def normalize_url(url):
+    """去掉首尾空白和 #片段，作为缓存键"""
+    return urllib.parse.urldefrag(url.strip())[0]
+
+
+def url_expiry(info):
+    """返回信息中格式直链最早的过期时间戳，没有过期参数时返回 None"""
+    expiries = []
+    formats = list(info.get('formats') or []) + list(info.get('requested_formats') or [])
+    for f in formats + [info]:
+        url = f.get('url')
+        if not url:
+            continue
+        match = _EXPIRE_PATTERN.search(url)
+        if match:
+            expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+class InfoCache:
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, memory_entries=MEMORY_ENTRIES):
+        self.cache_dir = cache_dir or state_path("info_cache")
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, info)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _remember(self, key, expires_at, info):
+        self._memory[key] = (expires_at, info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, url):
+        """返回未过期的信息字典副本，没有或已过期时返回 None"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return copy.deepcopy(entry[1])
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('url') != key or record.get('expires_at', 0) <= now:
+            self._remove_file(path)
+            return None
+
+        with self._lock:
+            self._remember(key, record['expires_at'], record['info'])
+        return copy.deepcopy(record['info'])
+
+    def put(self, url, info):
+        """缓存信息字典，info 必须可以序列化为 JSON（先用 YoutubeDL.sanitize_info 处理）"""
+        key = normalize_url(url)
+        expires_at = time.time() + self.ttl
+        expiry = url_expiry(info)
+        if expiry is not None:
+            expires_at = min(expires_at, expiry - EXPIRE_MARGIN)
+        if expires_at <= time.time():
+            return
+
+        info = copy.deepcopy(info)
+        with self._lock:
+            self._remember(key, expires_at, info)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': key, 'expires_at': expires_at, 'info': info}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            # 无法写入磁盘时只保留内存缓存
+            self._remove_file(tmp_path)
+
+    def invalidate(self, url):
+        key = normalize_url(url)
+        with self._lock:
+            self._memory.pop(key, None)
+        self._remove_file(self._path(key))
+
+    def purge(self):
+        """删除磁盘上全部已过期的条目"""
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    expires_at = json.load(f).get('expires_at', 0)
+            except (OSError, ValueError):
+                expires_at = 0
+            if expires_at <= now:
+                self._remove_file(path)
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,137 @@
+"""
+持久化下载任务队列。
+
+每个任务的链接、输出模板、状态和已下载字节数都写入 SQLite，
+进程崩溃或退出后，可以用相同的输出模板重新提交，yt-dlp 会从 .part 文件继续下载。
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from paths import state_path
+
+# 这些状态的任务在重启后需要继续（后处理中断的任务重新下载时 yt-dlp 会直接使用已有文件）；
+# interrupted 是程序退出时中止的任务，用户主动取消的任务（cancelled）不再继续
+UNFINISHED_STATES = ('queued', 'running', 'postprocessing', 'interrupted')
+
+# 下载进度最多每隔多少秒写一次数据库
+PROGRESS_INTERVAL = 1.0
+
+
+def _json_safe_opts(ydl_opts):
+    """只保留可以序列化的 yt-dlp 选项（去掉 logger、回调等对象）"""
+    safe = {}
+    for key, value in ydl_opts.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        safe[key] = value
+    return safe
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or state_path("jobs.db")
+        self._lock = threading.Lock()
+        self._last_progress = {}  # job_id -> 上次写入进度的时间
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    outtmpl TEXT,
+                    ydl_opts TEXT NOT NULL,
+                    meta TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+                    total_bytes INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+
+    def add(self, job):
+        self.add_many([job])
+
+    def add_many(self, jobs):
+        """在一个事务中写入多个任务"""
+        now = time.time()
+        rows = [
+            (
+                job.id, job.kind, job.url, job.ydl_opts.get('outtmpl'),
+                json.dumps(_json_safe_opts(job.ydl_opts), ensure_ascii=False),
+                json.dumps(job.meta, ensure_ascii=False),
+                job.state, job.downloaded_bytes, job.total_bytes, now, now,
+            )
+            for job in jobs
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO jobs (id, kind, url, outtmpl, ydl_opts, meta, state, "
+                "downloaded_bytes, total_bytes, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?)",
+                rows,
+            )
+
+    def update_state(self, job_id, state, error=None, downloaded_bytes=None, total_bytes=None):
+        """传入字节数时一并写入（进度写入有节流，任务结束时用它补上最后的进度）"""
+        self._last_progress.pop(job_id, None)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, downloaded_bytes = COALESCE(?, downloaded_bytes), "
+                "total_bytes = COALESCE(?, total_bytes), updated_at = ? WHERE id = ?",
+                (state, error, downloaded_bytes, total_bytes, time.time(), job_id),
+            )
+
+    def update_progress(self, job_id, downloaded_bytes, total_bytes):
+        """记录已下载字节数，按 PROGRESS_INTERVAL 节流"""
+        now = time.time()
+        if now - self._last_progress.get(job_id, 0) < PROGRESS_INTERVAL:
+            return
+        self._last_progress[job_id] = now
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET downloaded_bytes = ?, total_bytes = ?, updated_at = ? WHERE id = ?",
+                (downloaded_bytes, total_bytes, now, job_id),
+            )
+
+    def get(self, job_id):
+        """返回单个任务记录，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def unfinished(self, kind=None):
+        """返回需要继续的任务记录（字典列表），按创建时间排序"""
+        query = f"SELECT * FROM jobs WHERE state IN ({','.join('?' * len(UNFINISHED_STATES))})"
+        params = list(UNFINISHED_STATES)
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY created_at"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def discard(self, job_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _row_to_dict(self, row):
+        record = dict(row)
+        record['ydl_opts'] = json.loads(record['ydl_opts'])
+        record['meta'] = json.loads(record['meta'])
+        return record
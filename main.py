@@ -1,19 +1,27 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-import yt_dlp
 import json
+import multiprocessing
 import os
+import queue
 import shutil
 from threading import Thread
 from PIL import Image
-import browser_cookie3
 import time
-import urllib.parse
-import http.cookiejar
 import logging
 import traceback
+import extractors
+from engine import ERROR, FINAL_STATES, FINISHED, DownloadEngine
+from batch_video import BatchVideoDownloader
+from cookies import BROWSERS, cookie_domain, get_cookie_provider
+from dedup import MediaIndex
+from jobstore import JobStore
+from options import NATIVE_DOWNLOADER, available_downloaders, video_ydl_opts
 from podcast_downloader import PodcastDownloader
+from postprocess import PostProcessor
+from progress import ProgressAggregator
+from ratelimit import format_rate, parse_rate
 
 # 配置日志
 logging.basicConfig(
@@ -21,11 +29,30 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# 视频标签页在进度汇总器中的分组名
+VIDEO_PROGRESS_GROUP = "video"
+# 主线程处理视频任务事件的间隔（毫秒）
+EVENT_POLL_INTERVAL = 100
+
+
 class VideoDownloader(ctk.CTk):
     def __init__(self):
         super().__init__()
         self.logger = logging.getLogger(__name__)
 
+        # 两个标签页共用同一个无界面下载引擎，任务持久化到本地任务库
+        self.engine = DownloadEngine(max_workers=5, logger=self.logger, store=JobStore(),
+                                     info_cache=extractors.get_info_cache(), media_index=MediaIndex(),
+                                     postprocessor=PostProcessor())
+        self.engine.add_listener(self.on_engine_event)
+        # 各标签页共用一个进度汇总器，按固定频率接收合并后的进度快照
+        self.progress = ProgressAggregator(self.engine)
+        self.progress.subscribe(self.on_progress_snapshot)
+        # 引擎线程只把视频任务的事件和进度放入队列，由主线程定时取出处理
+        self.video_events = queue.Queue()
+        self.seen_video_jobs = set()  # 已经开始跟踪的任务，只在主线程中修改
+        self.video_jobs = set()  # 视频标签页正在跟踪的任务，只在主线程中修改
+
         # 配置窗口
         self.title("StreamHarvester - 视频下载工具")
         self.geometry("800x700")
@@ -45,6 +72,11 @@ class VideoDownloader(ctk.CTk):
         self.video_tab = self.tabview.add("视频下载")
         self.video_tab.grid_columnconfigure(0, weight=1)
         
+        # 添加批量视频标签页
+        self.batch_tab = self.tabview.add("批量视频")
+        self.batch_tab.grid_columnconfigure(0, weight=1)
+        self.batch_tab.grid_rowconfigure(0, weight=1)
+
         # 添加播客下载标签页
         self.podcast_tab = self.tabview.add("播客下载")
         self.podcast_tab.grid_columnconfigure(0, weight=1)
@@ -52,9 +84,18 @@ class VideoDownloader(ctk.CTk):
         # 创建视频下载界面
         self.create_video_tab()
         
+        # 创建批量视频界面（与视频标签页共用加速设置）
+        self.batch_downloader = BatchVideoDownloader(self.batch_tab, engine=self.engine,
+                                                     speed_options=self.speed_options, progress=self.progress)
+        self.batch_downloader.grid(row=0, column=0, sticky="nsew")
+
         # 创建播客下载界面
         self.create_podcast_tab()
 
+        # 检查上次未完成的下载
+        self.after(500, self.check_unfinished_jobs)
+        self.process_video_events()
+
     def create_video_tab(self):
         # 创建主框架
         self.main_frame = ctk.CTkFrame(self.video_tab)
@@ -78,7 +119,7 @@ class VideoDownloader(ctk.CTk):
         
         # Cookie选项
         self.cookie_var = tk.StringVar(value="不使用Cookie")
-        self.cookie_options = ["不使用Cookie", "Chrome", "Firefox", "Edge", "Opera", "Brave"]
+        self.cookie_options = ["不使用Cookie"] + list(BROWSERS)
         
         # 创建Cookie选择下拉菜单
         self.browser_menu = ttk.Combobox(
@@ -93,8 +134,6 @@ class VideoDownloader(ctk.CTk):
         self.cookie_status = ctk.CTkLabel(self.cookie_frame, text="")
         self.cookie_status.grid(row=1, column=0, columnspan=2, padx=5, pady=5)
 
-        self.cookie_file_path = None
-
         # 下载目录选择
         self.dir_frame = ctk.CTkFrame(self.main_frame)
         self.dir_frame.grid(row=3, column=0, padx=10, pady=5, sticky="ew")
@@ -136,13 +175,55 @@ class VideoDownloader(ctk.CTk):
             )
             radio.grid(row=0, column=i+1, padx=5, pady=5)
 
+        # 下载加速设置：分片并发数、下载器、连接数、缓冲区、全局限速
+        self.speed_frame = ctk.CTkFrame(self.main_frame)
+        self.speed_frame.grid(row=5, column=0, padx=10, pady=5, sticky="ew")
+
+        self.fragments_label = ctk.CTkLabel(self.speed_frame, text="并发分片:")
+        self.fragments_label.grid(row=0, column=0, padx=5, pady=5)
+        self.fragments_var = tk.StringVar(value="4")
+        self.fragments_menu = ctk.CTkOptionMenu(self.speed_frame, values=["1", "2", "4", "8", "16"],
+                                                variable=self.fragments_var, width=70)
+        self.fragments_menu.grid(row=0, column=1, padx=5, pady=5)
+
+        self.downloader_label = ctk.CTkLabel(self.speed_frame, text="下载器:")
+        self.downloader_label.grid(row=0, column=2, padx=5, pady=5)
+        self.downloader_var = tk.StringVar(value=NATIVE_DOWNLOADER)
+        self.downloader_menu = ctk.CTkOptionMenu(self.speed_frame, values=available_downloaders(),
+                                                 variable=self.downloader_var, width=90)
+        self.downloader_menu.grid(row=0, column=3, padx=5, pady=5)
+
+        self.connections_label = ctk.CTkLabel(self.speed_frame, text="连接数:")
+        self.connections_label.grid(row=0, column=4, padx=5, pady=5)
+        self.connections_var = tk.StringVar(value="8")
+        self.connections_menu = ctk.CTkOptionMenu(self.speed_frame, values=["1", "4", "8", "16"],
+                                                  variable=self.connections_var, width=70)
+        self.connections_menu.grid(row=0, column=5, padx=5, pady=5)
+
+        self.buffer_label = ctk.CTkLabel(self.speed_frame, text="缓冲区:")
+        self.buffer_label.grid(row=0, column=6, padx=5, pady=5)
+        self.buffer_var = tk.StringVar(value="默认")
+        self.buffer_options = {"默认": None, "64K": 64 * 1024, "1M": 1024 * 1024, "4M": 4 * 1024 * 1024}
+        self.buffer_menu = ctk.CTkOptionMenu(self.speed_frame, values=list(self.buffer_options),
+                                             variable=self.buffer_var, width=80)
+        self.buffer_menu.grid(row=0, column=7, padx=5, pady=5)
+
+        # 全局限速对所有标签页的下载立即生效，带宽在进行中的下载之间平均分配
+        self.limit_label = ctk.CTkLabel(self.speed_frame, text="限速:")
+        self.limit_label.grid(row=0, column=8, padx=5, pady=5)
+        self.limit_var = tk.StringVar(value=format_rate(self.engine.limiter.global_rate))
+        self.limit_menu = ctk.CTkOptionMenu(self.speed_frame, values=["不限", "512K", "1M", "2M", "5M", "10M"],
+                                            variable=self.limit_var, width=80,
+                                            command=lambda value: self.engine.limiter.set_global_rate(parse_rate(value)))
+        self.limit_menu.grid(row=0, column=9, padx=5, pady=5)
+
         # 获取格式按钮
         self.fetch_button = ctk.CTkButton(self.main_frame, text="获取可用格式", command=self.fetch_formats)
-        self.fetch_button.grid(row=5, column=0, padx=10, pady=10)
+        self.fetch_button.grid(row=6, column=0, padx=10, pady=10)
 
         # 格式选择框
         self.format_frame = ctk.CTkFrame(self.main_frame)
-        self.format_frame.grid(row=6, column=0, padx=10, pady=10, sticky="ew")
+        self.format_frame.grid(row=7, column=0, padx=10, pady=10, sticky="ew")
         self.format_frame.grid_columnconfigure(0, weight=1)
 
         # 视频格式选择
@@ -167,16 +248,16 @@ class VideoDownloader(ctk.CTk):
 
         # 下载按钮
         self.download_button = ctk.CTkButton(self.main_frame, text="开始下载", command=self.start_download)
-        self.download_button.grid(row=7, column=0, padx=10, pady=10)
+        self.download_button.grid(row=8, column=0, padx=10, pady=10)
 
         # 进度条
         self.progress_bar = ctk.CTkProgressBar(self.main_frame)
-        self.progress_bar.grid(row=8, column=0, padx=10, pady=10, sticky="ew")
+        self.progress_bar.grid(row=9, column=0, padx=10, pady=10, sticky="ew")
         self.progress_bar.set(0)
 
         # 状态标签
         self.status_label = ctk.CTkLabel(self.main_frame, text="")
-        self.status_label.grid(row=9, column=0, padx=10, pady=10)
+        self.status_label.grid(row=10, column=0, padx=10, pady=10)
 
         self.formats_info = None
 
@@ -194,13 +275,7 @@ class VideoDownloader(ctk.CTk):
             self.format_frame.grid_remove()
 
     def format_size(self, size):
-        if size is None:
-            return "未知大小"
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024:
-                return f"{size:.1f}{unit}"
-            size /= 1024
-        return f"{size:.1f}TB"
+        return extractors.format_size(size)
 
     def on_video_format_change(self, event=None):
         selected = self.video_var.get()
@@ -214,7 +289,17 @@ class VideoDownloader(ctk.CTk):
                     self.audio_frame.grid()
                 break
 
-    def get_cookie_options(self):
+    def set_cookie_status(self, text):
+        """可在任意线程调用，状态文本在主线程中更新"""
+        self.after(0, lambda: self.cookie_status.configure(text=text))
+
+    def get_cookie_options(self, url):
+        """
+        返回 Cookie 相关的下载选项。
+
+        浏览器 Cookie 由共用的 CookieProvider 读取并缓存，这里先读取一次以便及早报告错误，
+        下载时引擎直接从缓存取出交给 yt-dlp，不再写临时 Cookie 文件。
+        """
         cookie_mode = self.cookie_var.get()
         self.logger.info(f"Cookie模式: {cookie_mode}")
         
@@ -222,61 +307,29 @@ class VideoDownloader(ctk.CTk):
             return {}
             
         try:
-            if cookie_mode in ["Chrome", "Firefox", "Edge", "Opera", "Brave"]:
-                url = self.url_entry.get()
-                if not url:
-                    raise Exception("请先输入视频链接")
-                
-                self.cookie_status.configure(text="正在获取Cookie...")
-                
-                # 从URL中提取域名，并简化为基础域名以确保获取到顶级域的登录Cookie
-                parsed = urllib.parse.urlparse(url)
-                host = parsed.hostname or ''
-                domain_parts = host.split('.')
-                domain = '.'.join(domain_parts[-2:]) if len(domain_parts) > 2 else host
-                self.logger.info(f"正在从{cookie_mode}获取 {domain} 的cookies")
-                
-                # 创建临时cookie文件
-                cookie_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_cookies.txt')
-                self.cookie_file_path = cookie_file
-                
-                # 根据不同浏览器获取cookies
-                try:
-                    if cookie_mode == "Chrome":
-                        cj = browser_cookie3.chrome(domain_name=domain)
-                    elif cookie_mode == "Firefox":
-                        cj = browser_cookie3.firefox(domain_name=domain)
-                    elif cookie_mode == "Edge":
-                        cj = browser_cookie3.edge(domain_name=domain)
-                    elif cookie_mode == "Opera":
-                        cj = browser_cookie3.opera(domain_name=domain)
-                    elif cookie_mode == "Brave":
-                        cj = browser_cookie3.brave(domain_name=domain)
-                except Exception as e:
-                    raise Exception(f"无法从{cookie_mode}获取Cookie: {str(e)}")
-                
-                # 使用 MozillaCookieJar 保存为 Netscape 格式，确保字段正确
-                moz_cj = http.cookiejar.MozillaCookieJar(cookie_file)
-                for cookie in cj:
-                    moz_cj.set_cookie(cookie)
-                moz_cj.save(ignore_discard=True, ignore_expires=True)
-                
-                self.cookie_status.configure(text="Cookie获取成功")
-                return {'cookiefile': cookie_file}
+            if not url:
+                raise Exception("请先输入视频链接")
+
+            self.set_cookie_status("正在获取Cookie...")
+            self.logger.info(f"正在从{cookie_mode}获取 {cookie_domain(url)} 的cookies")
+            get_cookie_provider().get_jar(cookie_mode, url)
+
+            self.set_cookie_status("Cookie获取成功")
+            return {'cookies_from': cookie_mode}
                 
         except Exception as e:
             error_msg = f"Cookie处理失败: {str(e)}"
             self.logger.error(f"{error_msg}\n{traceback.format_exc()}")
-            self.cookie_status.configure(text=error_msg)
+            self.set_cookie_status(error_msg)
             raise Exception(error_msg)
 
     def fetch_formats(self):
-        def fetch():
-            url = self.url_entry.get()
-            if not url:
-                messagebox.showerror("错误", "请输入视频链接")
-                return
+        url = self.url_entry.get()
+        if not url:
+            messagebox.showerror("错误", "请输入视频链接")
+            return
 
+        def fetch():
             try:
                 self.logger.info(f"开始获取视频信息: {url}")
                 ydl_opts = {
@@ -285,152 +338,192 @@ class VideoDownloader(ctk.CTk):
                     'verbose': True,  # 添加详细日志
                 }
 
-                # 添加cookie选项
-                try:
-                    cookie_opts = self.get_cookie_options()
-                    ydl_opts.update(cookie_opts)
-                    self.logger.debug(f"Cookie选项: {cookie_opts}")
-                except Exception as e:
-                    self.logger.error(f"Cookie错误: {str(e)}\n{traceback.format_exc()}")
-                    messagebox.showerror("Cookie错误", str(e))
-                    return
-
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    self.logger.debug("开始提取视频信息")
+                # 最近获取过的链接直接使用缓存，无需读取 Cookie
+                if extractors.get_info_cache().get(url) is None:
+                    # 添加cookie选项
                     try:
-                        info = ydl.extract_info(url, download=False)
-                        if not info:
-                            raise Exception("无法获取视频信息")
-                        self.formats_info = info.get('formats', [])
-                        if not self.formats_info:
-                            raise Exception("无法获取视频格式")
-                        self.logger.debug(f"获取到{len(self.formats_info)}个格式")
-
-                        # 分离视频和音频格式
-                        video_formats = []
-                        audio_formats = []
-
-                        for f in self.formats_info:
-                            if f.get('vcodec') != 'none':
-                                has_audio = f.get('acodec') != 'none'
-                                format_str = (
-                                    f"{f['format_id']} - "
-                                    f"{f.get('height', 'N/A')}p "
-                                    f"[{self.format_size(f.get('filesize'))}] "
-                                    f"{'[带音频]' if has_audio else '[无音频]'}"
-                                )
-                                video_formats.append(format_str)
-                            elif f.get('acodec') != 'none':
-                                format_str = (
-                                    f"{f['format_id']} - "
-                                    f"{f.get('acodec', 'N/A')} "
-                                    f"[{self.format_size(f.get('filesize'))}]"
-                                )
-                                audio_formats.append(format_str)
-
-                        self.video_menu['values'] = video_formats
-                        self.audio_menu['values'] = audio_formats
-
-                        if video_formats:
-                            self.video_menu.set(video_formats[0])
-                            self.on_video_format_change()
-                        if audio_formats:
-                            self.audio_menu.set(audio_formats[0])
-
-                        self.status_label.configure(text="格式获取成功！")
+                        cookie_opts = self.get_cookie_options(url)
+                        ydl_opts.update(cookie_opts)
+                        self.logger.debug(f"Cookie选项: {cookie_opts}")
                     except Exception as e:
-                        self.logger.error(f"提取视频信息失败: {str(e)}\n{traceback.format_exc()}")
-                        raise Exception(f"提取视频信息失败: {str(e)}")
+                        self.logger.error(f"Cookie错误: {str(e)}\n{traceback.format_exc()}")
+                        self.after(0, messagebox.showerror, "Cookie错误", str(e))
+                        return
+
+                self.logger.debug("开始提取视频信息")
+                try:
+                    info = extractors.extract_video_info(url, ydl_opts)
+                    formats = info.get('formats', [])
+                    self.logger.debug(f"获取到{len(formats)}个格式")
+                    self.after(0, self.show_formats, formats)
+                except Exception as e:
+                    self.logger.error(f"提取视频信息失败: {str(e)}\n{traceback.format_exc()}")
+                    raise Exception(f"提取视频信息失败: {str(e)}")
 
             except Exception as e:
                 error_msg = f"获取视频信息失败: {str(e)}"
                 self.logger.error(f"{error_msg}\n{traceback.format_exc()}")
-                messagebox.showerror("错误", error_msg)
-                self.status_label.configure(text="获取格式失败")
+                self.after(0, messagebox.showerror, "错误", error_msg)
+                self.after(0, lambda: self.status_label.configure(text="获取格式失败"))
 
         Thread(target=fetch, daemon=True).start()
 
-    def start_download(self):
-        def download():
-            url = self.url_entry.get()
-            quality = self.quality_var.get()
+    def show_formats(self, formats):
+        """在主线程中填充格式下拉框"""
+        self.formats_info = formats
 
-            if not url:
-                messagebox.showerror("错误", "请输入视频链接")
-                return
+        # 分离视频和音频格式
+        video_formats, audio_formats = extractors.split_formats(self.formats_info)
 
-            try:
-                ydl_opts = {
-                    'progress_hooks': [self.progress_hook],
-                    # 在文件名中加入视频分辨率，例如 "title-1080p.mp4"
-                    'outtmpl': os.path.join(self.dir_entry.get(), '%(title)s-%(height)sp.%(ext)s'),
-                    # 添加重试和超时设置
-                    'retries': 10,  # 重试次数
-                    'fragment_retries': 10,  # 片段下载重试次数
-                    'retry_sleep': 5,  # 重试等待时间
-                    'socket_timeout': 30,  # Socket超时时间
-                    'extractor_retries': 5,  # 提取器重试次数
-                    'file_access_retries': 5,  # 文件访问重试次数
-                }
+        self.video_menu['values'] = video_formats
+        self.audio_menu['values'] = audio_formats
 
-                # 添加cookie选项
-                try:
-                    cookie_opts = self.get_cookie_options()
-                    ydl_opts.update(cookie_opts)
-                except Exception as e:
-                    messagebox.showerror("Cookie错误", str(e))
-                    return
-
-                if quality == "custom":
-                    video_format = self.video_var.get().split(' - ')[0]
-                    has_audio = '[带音频]' in self.video_var.get()
-                    if not has_audio:
-                        audio_format = self.audio_var.get().split(' - ')[0]
-                        ydl_opts['format'] = f'{video_format}+{audio_format}'
-                    else:
-                        ydl_opts['format'] = video_format
-                else:
-                    ydl_opts['format'] = quality
+        if video_formats:
+            self.video_menu.set(video_formats[0])
+            self.on_video_format_change()
+        if audio_formats:
+            self.audio_menu.set(audio_formats[0])
 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
+        self.status_label.configure(text="格式获取成功！")
 
-                self.status_label.configure(text="下载完成！")
-                self.progress_bar.set(1.0)
-                messagebox.showinfo("成功", "视频下载完成！")
+    def start_download(self):
+        url = self.url_entry.get()
+        quality = self.quality_var.get()
 
-            except Exception as e:
-                error_msg = f"下载失败: {str(e)}"
-                self.logger.error(f"{error_msg}\n{traceback.format_exc()}")
-                messagebox.showerror("错误", error_msg)
-                self.status_label.configure(text="下载失败")
-
-        Thread(target=download, daemon=True).start()
-
-    def progress_hook(self, d):
-        if d['status'] == 'downloading':
-            if 'total_bytes' in d and 'downloaded_bytes' in d and d['total_bytes'] is not None:
-                progress = d['downloaded_bytes'] / d['total_bytes']
-                self.progress_bar.set(progress)
-            if 'speed' in d and d['speed'] is not None:
-                speed = d['speed'] / 1024 / 1024
-                self.status_label.configure(text=f"下载中... {speed:.1f} MB/s")
+        if not url:
+            messagebox.showerror("错误", "请输入视频链接")
+            return
+
+        if quality == "custom":
+            video_format = self.video_var.get().split(' - ')[0]
+            has_audio = '[带音频]' in self.video_var.get()
+            if not has_audio:
+                audio_format = self.audio_var.get().split(' - ')[0]
+                format_spec = f'{video_format}+{audio_format}'
             else:
-                self.status_label.configure(text="下载中...")
+                format_spec = video_format
+        else:
+            format_spec = quality
+
+        ydl_opts = video_ydl_opts(self.dir_entry.get(), format_spec, **self.speed_options())
 
-    def __del__(self):
-        # 清理临时cookie文件
-        if self.cookie_file_path and os.path.exists(self.cookie_file_path):
+        def submit():
+            # 读取浏览器 Cookie 可能耗时数秒，放在后台线程执行
             try:
-                os.remove(self.cookie_file_path)
-            except:
-                pass
+                cookie_opts = self.get_cookie_options(url)
+                ydl_opts.update(cookie_opts)
+            except Exception as e:
+                self.after(0, messagebox.showerror, "Cookie错误", str(e))
+                return
+
+            self.engine.submit(url, ydl_opts, kind='video')
+
+        Thread(target=submit, daemon=True).start()
+
+    def speed_options(self):
+        """加速设置对应的 video_ydl_opts 参数"""
+        return {
+            'fragments': int(self.fragments_var.get()),
+            'downloader': self.downloader_var.get(),
+            'connections': int(self.connections_var.get()),
+            'buffersize': self.buffer_options[self.buffer_var.get()],
+        }
+
+    def on_engine_event(self, event):
+        """
+        引擎事件回调（在下载线程中执行），只处理单个视频任务，批量任务由批量标签页处理。
+
+        这里不做任何界面操作，也不调用 Tk：下载进度由汇总器合并后按固定频率发布，
+        状态变化放入 video_events 队列，由主线程在 process_video_events 中处理。
+        """
+        job = event['job']
+        if job['kind'] != 'video' or (job.get('meta') or {}).get('batch'):
+            return
+        if event['status'] == 'downloading':
+            return  # 每个任务提交时都有 queued 事件，进度由汇总器发布
+        self.video_events.put(('event', event['job_id'], event['status'], event.get('error')))
+
+    def process_video_events(self):
+        """在主线程中取出队列中的任务事件和进度快照"""
+        try:
+            while True:
+                message = self.video_events.get_nowait()
+                if message[0] == 'progress':
+                    self.show_video_progress(message[1])
+                    continue
+                _, job_id, status, error = message
+                if status in FINAL_STATES:
+                    self.on_video_job_done(job_id, status, error)
+                elif job_id not in self.seen_video_jobs:
+                    # 包括恢复的任务，第一次出现时开始跟踪
+                    self.seen_video_jobs.add(job_id)
+                    self.track_video_job(job_id)
+        except queue.Empty:
+            pass
+        finally:
+            self.after(EVENT_POLL_INTERVAL, self.process_video_events)
+
+    def track_video_job(self, job_id):
+        if job_id in self.video_jobs:
+            return
+        self.video_jobs.add(job_id)
+        self.progress.track(VIDEO_PROGRESS_GROUP, self.video_jobs)
+        self.progress_bar.set(0)
+        self.status_label.configure(text="下载中...")
+
+    def on_video_job_done(self, job_id, status, error):
+        self.seen_video_jobs.discard(job_id)
+        self.video_jobs.discard(job_id)
+        if self.video_jobs:
+            self.progress.track(VIDEO_PROGRESS_GROUP, self.video_jobs)
+        else:
+            self.progress.untrack(VIDEO_PROGRESS_GROUP)
+
+        if status == FINISHED:
+            self.status_label.configure(text="下载完成！")
+            self.progress_bar.set(1.0)
+            messagebox.showinfo("成功", "视频下载完成！")
+        elif status == ERROR:
+            error_msg = f"下载失败: {error}"
+            messagebox.showerror("错误", error_msg)
+            self.status_label.configure(text="下载失败")
+        elif not self.video_jobs:
+            self.status_label.configure(text="下载已取消")
+
+    def on_progress_snapshot(self, snapshot):
+        """汇总器发布线程中调用，视频任务有变化时放入队列，由主线程重绘"""
+        group = snapshot['groups'].get(VIDEO_PROGRESS_GROUP)
+        if group is not None and not group['done']:
+            self.video_events.put(('progress', group))
+
+    def show_video_progress(self, group):
+        if not self.video_jobs:
+            return  # 任务已结束后才到达的快照
+        self.progress_bar.set(group['percent'] / 100)
+        if group['speed']:
+            speed = group['speed'] / 1024 / 1024
+            self.status_label.configure(text=f"下载中... {speed:.1f} MB/s")
+        else:
+            self.status_label.configure(text="下载中...")
+
+    def check_unfinished_jobs(self):
+        unfinished = self.engine.store.unfinished()
+        if not unfinished:
+            return
+        if messagebox.askyesno("继续下载", f"发现 {len(unfinished)} 个未完成的下载任务，是否继续？"):
+            self.engine.resume_unfinished(kind='video')
+            self.podcast_downloader.resume_unfinished()
+        else:
+            self.engine.store.discard([record['id'] for record in unfinished])
 
     def create_podcast_tab(self):
         # 创建播客下载器实例
-        self.podcast_downloader = PodcastDownloader(self.podcast_tab)
+        self.podcast_downloader = PodcastDownloader(self.podcast_tab, engine=self.engine,
+                                                    progress=self.progress)
         self.podcast_downloader.grid(row=0, column=0, sticky="nsew")
 
 if __name__ == "__main__":
+    # 打包后的程序中，后处理进程池的子进程需要由这里接管
+    multiprocessing.freeze_support()
     app = VideoDownloader()
     app.mainloop() 
\ No newline at end of file
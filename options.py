@@ -0,0 +1,129 @@
+"""
+构建 yt-dlp 下载选项，GUI、订阅同步和命令行共用。
+"""
+import os
+import shutil
+
+from extractors import format_date, safe_filename
+from postprocess import can_tag
+
+# 视频下载器：内置下载器或外部 aria2c
+NATIVE_DOWNLOADER = 'native'
+ARIA2C_DOWNLOADER = 'aria2c'
+
+
+# 批量下载时所有视频共用的格式策略，优先选择兼容性好的 avc1 视频和 m4a 音频
+VIDEO_FORMAT_POLICIES = {
+    "最佳质量": "bestvideo+bestaudio/best",
+    "≤2160p": "bestvideo[height<=2160]+bestaudio/best[height<=2160]",
+    "≤1080p（优先 avc1+m4a）": (
+        "bestvideo[height<=1080][vcodec^=avc1]+bestaudio[ext=m4a]"
+        "/bestvideo[height<=1080]+bestaudio/best[height<=1080]"
+    ),
+    "≤720p（优先 avc1+m4a）": (
+        "bestvideo[height<=720][vcodec^=avc1]+bestaudio[ext=m4a]"
+        "/bestvideo[height<=720]+bestaudio/best[height<=720]"
+    ),
+    "仅音频": "bestaudio[ext=m4a]/bestaudio",
+}
+
+
+def available_downloaders():
+    """可用的下载器列表，只有在 PATH 中找到 aria2c 时才包含它"""
+    downloaders = [NATIVE_DOWNLOADER]
+    if shutil.which('aria2c'):
+        downloaders.append(ARIA2C_DOWNLOADER)
+    return downloaders
+
+
+def podcast_file_stem(podcast_title, item_title):
+    """播客单集下载后的文件名（不含扩展名）"""
+    return f'{safe_filename(podcast_title)} - {safe_filename(item_title)}'
+
+
+def podcast_ydl_opts(dir_path, podcast_title, item_title, logger=None, connections=1):
+    """
+    播客单集的下载选项，文件名为 "播客标题 - 单集标题.扩展名"。
+
+    connections 大于 1 时，直链音频使用多连接分段下载。
+    """
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        # 标题是输出模板的字面部分，需要转义 %
+        'outtmpl': os.path.join(dir_path, podcast_file_stem(podcast_title, item_title).replace('%', '%%') + '.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+    }
+    if connections > 1:
+        ydl_opts['native_connections'] = connections
+    if logger:
+        ydl_opts['logger'] = logger
+    return ydl_opts
+
+
+def podcast_postprocess_opts(podcast_title, item, track=None, tags=True, loudnorm=None, codec=None):
+    """
+    单集下载后的处理选项（放入 ydl_opts['postprocess']），没有需要做的处理时返回 None。
+
+    track 为列表中显示的曲目号；loudnorm 为目标响度（LUFS），codec 为 postprocess.CODECS 中的目标编码。
+    """
+    options = {}
+    if tags and can_tag():
+        options['tags'] = {
+            'title': item.get('title'),
+            'album': podcast_title,
+            'artist': podcast_title,
+            'date': format_date(item.get('upload_date', '')),
+            'tracknumber': track,
+            'artwork': item.get('artwork'),
+        }
+    if loudnorm:
+        options['loudnorm'] = loudnorm
+    if codec:
+        options['codec'] = codec
+    return options or None
+
+
+def video_ydl_opts(dir_path, format_spec, fragments=4, downloader=NATIVE_DOWNLOADER, connections=8,
+                   buffersize=None, logger=None):
+    """
+    视频的下载选项，文件名为 "标题-分辨率p.扩展名"。
+
+    fragments 为 HLS/DASH 同时下载的分片数；downloader 为 'aria2c' 时交给 aria2c，
+    每个文件使用 connections 个连接；buffersize 为下载缓冲区字节数，None 表示使用 yt-dlp 默认值。
+    """
+    ydl_opts = {
+        # 在文件名中加入视频分辨率，例如 "title-1080p.mp4"
+        'outtmpl': os.path.join(dir_path, '%(title)s-%(height)sp.%(ext)s'),
+        'format': format_spec,
+        # 添加重试和超时设置
+        'retries': 10,  # 重试次数
+        'fragment_retries': 10,  # 片段下载重试次数
+        'retry_sleep': 5,  # 重试等待时间
+        'socket_timeout': 30,  # Socket超时时间
+        'extractor_retries': 5,  # 提取器重试次数
+        'file_access_retries': 5,  # 文件访问重试次数
+        'concurrent_fragment_downloads': max(1, fragments),
+    }
+    if downloader == ARIA2C_DOWNLOADER:
+        ydl_opts['external_downloader'] = {'default': ARIA2C_DOWNLOADER}
+        ydl_opts['external_downloader_args'] = {
+            ARIA2C_DOWNLOADER: [
+                f'--max-connection-per-server={connections}',
+                f'--split={connections}',
+                '--min-split-size=1M',
+                '--file-allocation=none',
+            ],
+        }
+    if buffersize:
+        ydl_opts['buffersize'] = buffersize
+        # 固定缓冲区大小，不让 yt-dlp 自动调整
+        ydl_opts['noresizebuffer'] = True
+    if logger:
+        ydl_opts['logger'] = logger
+    return ydl_opts
+
+
+def podcast_dir(base_dir, podcast_title):
+    """每个播客单独一个子目录"""
+    return os.path.join(base_dir, safe_filename(podcast_title)) if podcast_title else base_dir
@@ -0,0 +1,18 @@
+"""
+本地状态文件的存放位置（任务库、缓存等）。
+
+默认放在下载目录下的 .streamharvester 中，可通过环境变量 STREAMHARVESTER_HOME 覆盖。
+"""
+import os
+
+STATE_DIR = os.environ.get(
+    "STREAMHARVESTER_HOME",
+    os.path.join(os.path.expanduser("~/Downloads"), ".streamharvester"),
+)
+
+
+def state_path(*parts):
+    """返回状态目录下的路径，并确保父目录存在"""
+    path = os.path.join(STATE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -1,36 +1,42 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-import yt_dlp
 import os
-import json
-import requests
-from bs4 import BeautifulSoup
 import logging
 from threading import Thread
 import re
-import xml.etree.ElementTree as ET
-from datetime import datetime
-import time
 import traceback
-import queue
-from concurrent.futures import ThreadPoolExecutor
+
+import extractors
+import feed_batch
+from engine import DownloadEngine
+from options import podcast_file_stem, podcast_postprocess_opts, podcast_ydl_opts
+from postprocess import CODECS, DEFAULT_LOUDNESS
+from progress import ProgressAggregator
+from selection import SelectionModel
+from subscriptions import SubscriptionStore, sync_all
+from virtual_tree import VirtualTree
+
+NO_TRANSCODE = "不转码"
+
 
 class PodcastDownloader(ctk.CTkFrame):
-    def __init__(self, parent):
+    def __init__(self, parent, engine=None, progress=None):
         super().__init__(parent)
         self.logger = logging.getLogger(__name__)
         self.stop_requested = False  # 中止下载标志
+        self.fetching = False  # 正在获取播客列表，完成前不能再次获取
         self.all_selected_var = ctk.BooleanVar(value=False) # 追踪全选状态
-        self.current_file_progress = 0 # 追踪当前文件的下载进度
-        self.download_thread = None
-        self.download_queue = queue.Queue()
-        self.download_pool = ThreadPoolExecutor(max_workers=5) # 限制5个并发
-        self.active_downloads = {} # 追踪活跃的下载任务
+        # 下载由无界面引擎执行；进度由汇总器合并后按固定频率发布，不再逐条转入队列
+        self.engine = engine or DownloadEngine(max_workers=5, logger=self.logger)
+        self.progress = progress or ProgressAggregator(self.engine)
+        self.progress.subscribe(self.on_progress_snapshot)
+        self.subscriptions = SubscriptionStore()
+        self.subscriptions.attach(self.engine)
         self.total_downloads = 0
-        self.completed_downloads = 0
-        self.file_progress = {} # url -> {percent: float, downloaded_bytes: int, speed: float}
         self.errors_occurred = False
+        self.batch_count = 0 # 每个批次使用不同的进度分组名，避免旧批次的快照影响新批次
+        self.progress_group = None
         
         # 配置网格
         self.grid_columnconfigure(0, weight=1)
@@ -77,6 +83,40 @@ class PodcastDownloader(ctk.CTkFrame):
                                                      variable=self.reverse_order_var,
                                                      command=self.refresh_track_numbers)
         self.reverse_order_checkbox.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        # 分段下载连接数（仅对直链音频生效，1 表示交给 yt-dlp 单连接下载）
+        self.connections_label = ctk.CTkLabel(self.options_frame, text="分段连接数:")
+        self.connections_label.grid(row=0, column=1, padx=(20, 5), pady=5, sticky="w")
+        self.connections_var = tk.StringVar(value="1")
+        self.connections_menu = ctk.CTkOptionMenu(self.options_frame, values=["1", "2", "4", "8", "16"],
+                                                  variable=self.connections_var, width=70)
+        self.connections_menu.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+        # 批量选择：按发布日期范围或只选未下载的单集（列表中按住 Shift 点击可选择一段范围）
+        self.date_from_entry = ctk.CTkEntry(self.options_frame, width=110, placeholder_text="起始 YYYY-MM-DD")
+        self.date_from_entry.grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.date_to_entry = ctk.CTkEntry(self.options_frame, width=110, placeholder_text="结束 YYYY-MM-DD")
+        self.date_to_entry.grid(row=1, column=1, padx=(20, 5), pady=5, sticky="w")
+        self.select_date_button = ctk.CTkButton(self.options_frame, text="按日期选择", width=90,
+                                                command=self.select_by_date)
+        self.select_date_button.grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.select_undownloaded_button = ctk.CTkButton(self.options_frame, text="选择未下载", width=90,
+                                                        command=self.select_undownloaded)
+        self.select_undownloaded_button.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+
+        # 下载后处理：在独立进程中写入标签、标准化响度、转码，与后续下载同时进行
+        self.tags_var = ctk.BooleanVar(value=True)
+        self.tags_checkbox = ctk.CTkCheckBox(self.options_frame, text="写入标签和封面", variable=self.tags_var)
+        self.tags_checkbox.grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.loudnorm_var = ctk.BooleanVar(value=False)
+        self.loudnorm_checkbox = ctk.CTkCheckBox(self.options_frame, text="响度标准化", variable=self.loudnorm_var)
+        self.loudnorm_checkbox.grid(row=2, column=1, padx=(20, 5), pady=5, sticky="w")
+        self.codec_label = ctk.CTkLabel(self.options_frame, text="转码:")
+        self.codec_label.grid(row=2, column=2, padx=5, pady=5, sticky="w")
+        self.codec_var = tk.StringVar(value=NO_TRANSCODE)
+        self.codec_menu = ctk.CTkOptionMenu(self.options_frame, values=[NO_TRANSCODE] + list(CODECS),
+                                            variable=self.codec_var, width=90)
+        self.codec_menu.grid(row=2, column=3, padx=5, pady=5, sticky="w")
         
         # 播客列表框架
         self.list_frame = ctk.CTkFrame(self)
@@ -111,10 +151,10 @@ class PodcastDownloader(ctk.CTkFrame):
         # 绑定点击事件，用于切换复选框状态
         self.tree.bind("<Button-1>", self.on_tree_click)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(self.list_frame, orient="vertical", command=self.tree.yview)
+        # 添加滚动条；列表是虚拟化的，Treeview 中只有可见的行，滚动由 VirtualTree 处理
+        scrollbar = ttk.Scrollbar(self.list_frame, orient="vertical")
         scrollbar.grid(row=0, column=1, sticky="ns")
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.virtual_tree = VirtualTree(self.tree, scrollbar, self.row_values)
         
         # 按钮框架
         self.button_frame = ctk.CTkFrame(self)
@@ -131,6 +171,17 @@ class PodcastDownloader(ctk.CTkFrame):
         # 中止下载按钮
         self.stop_button = ctk.CTkButton(self.button_frame, text="中止下载", command=self.stop_download, state="disabled")
         self.stop_button.grid(row=0, column=2, padx=5, pady=5)
+
+        # 继续未完成按钮（从任务库恢复中止或中断的下载）
+        self.resume_button = ctk.CTkButton(self.button_frame, text="继续未完成", command=self.resume_unfinished)
+        self.resume_button.grid(row=0, column=3, padx=5, pady=5)
+
+        # 订阅按钮：订阅当前链接，以后同步时只下载新单集
+        self.subscribe_button = ctk.CTkButton(self.button_frame, text="添加订阅", command=self.subscribe_current)
+        self.subscribe_button.grid(row=0, column=4, padx=5, pady=5)
+
+        self.sync_button = ctk.CTkButton(self.button_frame, text="同步订阅", command=self.sync_subscriptions)
+        self.sync_button.grid(row=0, column=5, padx=5, pady=5)
         
         # --- 进度条和百分比标签框架 ---
         self.progress_frame = ctk.CTkFrame(self)
@@ -150,9 +201,11 @@ class PodcastDownloader(ctk.CTkFrame):
         
         self.podcast_items = []
         self.original_podcast_items = []  # 存储原始顺序的播客项目
+        self.row_cache = {} # 项目 ID -> 格式化后的 (标题, 时长, 日期)，只为显示过的行计算
         self.podcast_title = ""
-        self.item_states = {} # 存储每个项目的选中状态
-        self.download_futures = [] # 存储 future 对象以便中止
+        self.selection = SelectionModel() # 项目 ID 索引和选中状态
+        self.selection_anchor = None # Shift 点击范围选择的起点
+        self.download_jobs = set() # 本次批量下载提交给引擎的任务 ID
         
     def on_tree_click(self, event):
         """处理 Treeview 上的点击事件以切换复选框状态"""
@@ -162,16 +215,21 @@ class PodcastDownloader(ctk.CTkFrame):
             item_id = self.tree.identify_row(event.y)
             
             if item_id and column_id == "#1": # "#1" 是第一列 "选择"
-                # 切换状态
-                self.item_states[item_id] = not self.item_states.get(item_id, False)
-                self.update_row_checkbox(item_id)
+                if event.state & 0x0001 and self.selection_anchor: # 按住 Shift：选择一段范围
+                    order = [item['id'] for item in self.podcast_items]
+                    selected = self.selection.is_selected(self.selection_anchor)
+                    self.selection.select_range(order, self.selection_anchor, item_id, selected)
+                    self.virtual_tree.refresh()
+                else:
+                    # 切换状态
+                    self.selection.toggle(item_id)
+                    self.update_row_checkbox(item_id)
+                self.selection_anchor = item_id
                 self.update_header_checkbox_state()
 
     def update_row_checkbox(self, item_id):
-        """更新指定行的复选框外观"""
-        is_checked = self.item_states.get(item_id, False)
-        checkbox_char = "☑" if is_checked else "☐"
-        self.tree.set(item_id, "选择", checkbox_char)
+        """更新指定行的复选框外观，行不在可见区域时无需处理"""
+        self.virtual_tree.refresh_key(item_id)
 
     def toggle_all_selection(self):
         """响应表头点击事件，切换选择状态"""
@@ -183,16 +241,8 @@ class PodcastDownloader(ctk.CTkFrame):
             
     def update_header_checkbox_state(self):
         """根据行选中状态更新表头复选框"""
-        all_items_selected = True
-        has_items = False
-        for item_id in self.tree.get_children():
-            has_items = True
-            if not self.item_states.get(item_id, False):
-                all_items_selected = False
-                break
-        
         # 如果逻辑状态与UI不符，则更新UI
-        if has_items and all_items_selected:
+        if self.selection.all_selected():
             if not self.all_selected_var.get():
                 self.all_selected_var.set(True)
                 self.tree.heading("选择", text="☑")
@@ -210,486 +260,325 @@ class PodcastDownloader(ctk.CTkFrame):
             self.dir_entry.insert(0, dir_path)
             
     def format_duration(self, duration):
-        try:
-            if isinstance(duration, str):
-                # 尝试将字符串转换为秒数
-                if ':' in duration:
-                    parts = duration.split(':')
-                    if len(parts) == 2:
-                        minutes, seconds = parts
-                        duration = int(minutes) * 60 + int(seconds)
-                    elif len(parts) == 3:
-                        hours, minutes, seconds = parts
-                        duration = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
-                else:
-                    duration = float(duration)
-            
-            # 确保duration是数字
-            duration = float(duration)
-            minutes = int(duration // 60)
-            seconds = int(duration % 60)
-            return f"{minutes:02d}:{seconds:02d}"
-        except:
-            return "00:00"
-
-    def parse_rss_feed(self, feed_url):
-        try:
-            response = requests.get(feed_url)
-            response.raise_for_status()
-            
-            # 解析RSS内容
-            items = []
-            soup = BeautifulSoup(response.content, 'xml')
-            
-            # 获取播客标题（唱片集名称）
-            channel = soup.find('channel')
-            self.podcast_title = channel.title.text if channel and channel.title else "未知播客"
-            
-            for item in soup.find_all('item'):
-                title = item.title.text if item.title else "未知标题"
-                pub_date = item.pubDate.text if item.pubDate else ""
-                duration = item.duration.text if item.duration else "0"
-                enclosure = item.enclosure
-                
-                if enclosure and enclosure.get('url'):
-                    url = enclosure['url']
-                    items.append({
-                        'title': title,
-                        'url': url,
-                        'duration': duration,
-                        'upload_date': pub_date
-                    })
-            
-            return items
-            
-        except Exception as e:
-            raise Exception(f"解析RSS feed失败: {str(e)}")
-            
-    def get_rss_feed(self, apple_url):
-        try:
-            # 从 Apple Podcast URL 中提取播客 ID
-            match = re.search(r'/id(\d+)', apple_url)
-            if not match:
-                raise Exception("无法从链接中提取播客ID")
-            podcast_id = match.group(1)
-            
-            # 构建 RSS feed URL
-            lookup_url = f"https://itunes.apple.com/lookup?id={podcast_id}&entity=podcast"
-            
-            # 获取播客信息
-            response = requests.get(lookup_url)
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('results'):
-                raise Exception("未找到播客信息")
-                
-            # 获取播客 RSS feed URL
-            feed_url = data['results'][0].get('feedUrl')
-            if not feed_url:
-                raise Exception("未找到 RSS feed URL")
-                
-            return feed_url
-            
-        except Exception as e:
-            raise Exception(f"获取 RSS feed 失败: {str(e)}")
-            
+        return extractors.format_duration(duration)
+
     def format_date(self, date_str):
-        try:
-            # 尝试解析多种日期格式
-            for fmt in ['%a, %d %b %Y %H:%M:%S %z', '%Y-%m-%d', '%Y%m%d']:
-                try:
-                    dt = datetime.strptime(date_str, fmt)
-                    return dt.strftime('%Y-%m-%d')
-                except ValueError:
-                    continue
-            return date_str[:10]  # 如果无法解析，返回前10个字符
-        except:
-            return ""
-
-    def _find_key(self, obj, key):
-        """递归搜索字典或列表中的指定键"""
-        if isinstance(obj, dict):
-            if key in obj:
-                yield obj[key]
-            for v in obj.values():
-                yield from self._find_key(v, key)
-        elif isinstance(obj, list):
-            for item in obj:
-                yield from self._find_key(item, key)
-
-    def parse_xiaoyuzhou_episode(self, episode_url):
-        """解析小宇宙单集页面"""
-        try:
-            resp = requests.get(
-                episode_url,
-                headers={"User-Agent": "Mozilla/5.0"},
-                timeout=15,
-            )
-            resp.raise_for_status()
-
-            soup = BeautifulSoup(resp.text, "html.parser")
-            script = soup.find("script", id="__NEXT_DATA__")
-            if not script or not script.string:
-                raise Exception("未找到页面数据")
-
-            data = json.loads(script.string)
-
-            # 从 __NEXT_DATA__ 中递归查找所需字段
-            audio_url = next(self._find_key(data, "audioUrl"), None)
-            if not audio_url:
-                audio_url = next(self._find_key(data, "url"), None)
-            title = next(self._find_key(data, "title"), "未知标题")
-            duration = next(self._find_key(data, "duration"), 0)
-            publish_date = next(
-                self._find_key(data, "publishedAt"),
-                next(self._find_key(data, "publishDate"), ""),
-            )
+        return extractors.format_date(date_str)
 
-            podcast_title = next(self._find_key(data, "podcastTitle"), None)
-            if not podcast_title:
-                podcast_title = next(self._find_key(data, "podcast"), {}).get(
-                    "title", "小宇宙播客"
-                )
-            self.podcast_title = podcast_title or "小宇宙播客"
-
-            if not audio_url:
-                raise Exception("未找到音频链接")
-
-            return [
-                {
-                    "title": title,
-                    "url": audio_url,
-                    "duration": duration,
-                    "upload_date": publish_date,
-                }
-            ]
-        except Exception as e:
-            raise Exception(f"解析小宇宙页面失败: {str(e)}")
-
-    def parse_xiaoyuzhou_podcast(self, podcast_url):
-        """解析小宇宙播客主页，尝试获取所有单集"""
-        try:
-            resp = requests.get(
-                podcast_url,
-                headers={"User-Agent": "Mozilla/5.0"},
-                timeout=15,
-            )
-            resp.raise_for_status()
-
-            soup = BeautifulSoup(resp.text, "html.parser")
-            script = soup.find("script", id="__NEXT_DATA__")
-            if not script or not script.string:
-                raise Exception("未找到页面数据")
-
-            data = json.loads(script.string)
-            episodes = None
-            for item in self._find_key(data, "episodes"):
-                if isinstance(item, list):
-                    episodes = item
-                    break
-
-            if episodes is None:
-                # 如果未找到列表，则尝试将整个页面作为单集解析
-                return self.parse_xiaoyuzhou_episode(podcast_url)
-
-            podcast_title = next(self._find_key(data, "title"), "小宇宙播客")
-            self.podcast_title = podcast_title
-
-            items = []
-            for ep in episodes:
-                audio_url = None
-                if isinstance(ep, dict):
-                    audio_url = ep.get("audioUrl") or (
-                        ep.get("audio", {}).get("url") if isinstance(ep.get("audio"), dict) else None
-                    )
-                    title = ep.get("title", "未知标题")
-                    duration = ep.get("duration", 0)
-                    upload_date = (
-                        ep.get("publishedAt")
-                        or ep.get("publishDate")
-                        or ep.get("date")
-                        or ""
-                    )
-                else:
-                    continue
-
-                if audio_url:
-                    items.append(
-                        {
-                            "title": title,
-                            "url": audio_url,
-                            "duration": duration,
-                            "upload_date": upload_date,
-                        }
-                    )
-
-            if not items:
-                raise Exception("未找到播客列表")
-
-            return items
-        except Exception as e:
-            raise Exception(f"解析小宇宙播客失败: {str(e)}")
-            
     def fetch_podcast_list(self):
+        urls = feed_batch.split_urls(self.url_entry.get())
+        if not urls:
+            messagebox.showerror("错误", "请输入播客链接")
+            return
+        if self.fetching:
+            return
+
+        # 两次获取同时进行时，结果会交错写入同一个列表
+        self.fetching = True
+        self.fetch_button.configure(state="disabled")
+        self.status_label.configure(text="正在获取播客列表...")
+
+        # 清空旧数据
+        self.clear_podcast_items()
+
+        if len(urls) > 1:
+            self.fetch_many(urls)
+            return
+        url = urls[0]
+
+        def on_items(podcast_title, batch):
+            self.after(0, self.append_podcast_items, podcast_title, batch)
+
         def fetch():
-            url = self.url_entry.get()
-            if not url:
-                messagebox.showerror("错误", "请输入播客链接")
+            # 网络请求在后台线程执行，界面更新通过 after 转回主线程
+            try:
+                podcast_title, items = extractors.fetch_podcast(url, logger=self.logger, on_items=on_items)
+            except Exception as e:
+                self.logger.error(f"获取播客列表失败: {str(e)}\n{traceback.format_exc()}")
+                self.after(0, self.on_fetch_failed, str(e))
                 return
+            self.after(0, self.on_podcast_list_fetched, podcast_title, items)
 
-            try:
-                self.status_label.configure(text="正在获取播客列表...")
-                
-                # 清空旧数据
-                for i in self.tree.get_children():
-                    self.tree.delete(i)
-                self.podcast_items = []
-                self.original_podcast_items = []
-                self.item_states = {}
-
-                items = []
-                # ... (处理不同播客源的逻辑) ...
-                if "podcasts.apple.com" in url:
-                    feed_url = self.get_rss_feed(url)
-                    self.logger.info(f"获取到 RSS feed URL: {feed_url}")
-                    items = self.parse_rss_feed(feed_url)
-                elif "xiaoyuzhoufm.com/podcast/" in url:
-                    items = self.parse_xiaoyuzhou_podcast(url)
-                elif "xiaoyuzhoufm.com/episode/" in url:
-                    items = self.parse_xiaoyuzhou_episode(url)
-                else:
-                    try:
-                        self.logger.info(f"尝试将链接作为通用 RSS feed 解析: {url}")
-                        items = self.parse_rss_feed(url)
-                    except Exception as rss_error:
-                        self.logger.error(f"无法将链接作为通用 RSS feed 解析: {rss_error}")
-                        raise Exception("不支持的播客链接，目前支持 Apple Podcast、小宇宙或有效的 RSS feed")
-
-                # 根据播客标题设置下载子目录
-                if self.podcast_title:
-                    safe_title = re.sub(r'[\\/*?:"<>|]', "_", self.podcast_title.strip())
-                    new_dir = os.path.join(self.default_download_dir, safe_title)
-                    self.dir_entry.delete(0, tk.END)
-                    self.dir_entry.insert(0, new_dir)
-                
-                self.original_podcast_items = items
-                self.refresh_podcast_list()
-                
-                self.status_label.configure(text=f"成功获取 {len(items)} 个曲目")
+        Thread(target=fetch, daemon=True).start()
 
+    def fetch_many(self, urls):
+        """一次粘贴多个链接（例如很多小宇宙单集）：并发解析，完成一个显示一个，最后按输入顺序合并"""
+        total = len(urls)
+        done = [0]
+
+        def on_result(result):
+            done[0] += 1
+            self.after(0, self.on_link_resolved, result, done[0], total)
+
+        def fetch():
+            try:
+                podcast_title, items, errors = feed_batch.fetch_merged(urls, logger=self.logger, on_result=on_result)
             except Exception as e:
-                self.logger.error(f"获取播客列表失败: {str(e)}\n{traceback.format_exc()}")
-                messagebox.showerror("错误", f"获取播客列表失败: {str(e)}")
-                self.status_label.configure(text="获取失败")
-        
+                self.logger.error(f"获取播客列表失败: {str(e)}")
+                self.after(0, self.on_fetch_failed, str(e))
+                return
+            self.after(0, self.on_many_fetched, podcast_title, items, errors)
+
         Thread(target=fetch, daemon=True).start()
-        
+
+    def on_link_resolved(self, result, done, total):
+        if result['items']:
+            self.add_podcast_items(list(result['items']))
+            if self.reverse_order_var.get():
+                self.refresh_podcast_list()
+            else:
+                self.podcast_items.extend(result['items'])
+                self.virtual_tree.append_keys([item['id'] for item in result['items']])
+        self.status_label.configure(text=f"正在解析链接... {done}/{total}，已获取 {len(self.original_podcast_items)} 个曲目")
+
+    def on_many_fetched(self, podcast_title, items, errors):
+        self.fetch_finished()
+        # 按输入顺序重建（逐个显示时是完成顺序）
+        self.set_podcast_title(podcast_title)
+        self.clear_podcast_items()
+        self.add_podcast_items(items)
+        self.refresh_podcast_list()
+        text = f"成功获取 {len(items)} 个曲目"
+        if errors:
+            text += f"，{len(errors)} 个链接失败（详见日志）"
+        self.status_label.configure(text=text)
+
+    def set_podcast_title(self, podcast_title):
+        if podcast_title == self.podcast_title:
+            return
+        self.podcast_title = podcast_title
+
+        # 根据播客标题设置下载子目录
+        if self.podcast_title:
+            safe_title = extractors.safe_filename(self.podcast_title)
+            new_dir = os.path.join(self.default_download_dir, safe_title)
+            self.dir_entry.delete(0, tk.END)
+            self.dir_entry.insert(0, new_dir)
+
+    def clear_podcast_items(self):
+        self.podcast_items = []
+        self.original_podcast_items = []
+        self.row_cache = {}
+        self.selection.reset()
+        self.selection_anchor = None
+        self.virtual_tree.clear()
+
+    def add_podcast_items(self, items):
+        """加入模型并分配稳定的项目 ID（按原始顺序编号，与显示顺序无关）"""
+        for item in items:
+            item['id'] = f"ep{len(self.original_podcast_items)}"
+            self.original_podcast_items.append(item)
+        self.selection.add(items)
+
+    def append_podcast_items(self, podcast_title, batch):
+        """RSS 边下载边解析、小宇宙分页获取时，把已解析的单集先显示出来"""
+        self.set_podcast_title(podcast_title)
+        self.add_podcast_items(batch)
+        self.status_label.configure(text=f"正在获取播客列表... 已解析 {len(self.original_podcast_items)} 个曲目")
+
+        if self.reverse_order_var.get():
+            # 倒序时曲目号取决于总数，只需重新排列，可见行之外不会渲染
+            self.refresh_podcast_list()
+            return
+        self.podcast_items.extend(batch)
+        self.virtual_tree.append_keys([item['id'] for item in batch])
+
+    def on_podcast_list_fetched(self, podcast_title, items):
+        self.fetch_finished()
+        self.set_podcast_title(podcast_title)
+
+        # 已经逐批显示过的列表无需重建
+        if len(self.original_podcast_items) != len(items):
+            self.clear_podcast_items()
+            self.add_podcast_items(items)
+            self.refresh_podcast_list()
+
+        self.status_label.configure(text=f"成功获取 {len(items)} 个曲目")
+
+    def on_fetch_failed(self, error):
+        self.fetch_finished()
+        messagebox.showerror("错误", f"获取播客列表失败: {error}")
+        self.status_label.configure(text="获取失败")
+
+    def fetch_finished(self):
+        self.fetching = False
+        # 下载进行中时按钮由 download_finished() 恢复
+        if not self.download_jobs:
+            self.fetch_button.configure(state="normal")
+
     def refresh_podcast_list(self):
-        # 清空 treeview
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
+        """重新排列显示顺序；只渲染可见的行，选中状态按项目 ID 保留"""
         # 根据倒序选项决定使用哪个列表
         podcast_items_to_display = list(self.original_podcast_items)
         if self.reverse_order_var.get():
             podcast_items_to_display.reverse()
 
         self.podcast_items = podcast_items_to_display # 更新当前显示的列表
-        
-        for i, item in enumerate(self.podcast_items):
-            track_num = i + 1
-            
-            # 确保每个item都有唯一的ID
-            item_id = self.tree.insert("", "end", values=(
-                "☐",
-                track_num, 
-                item.get('title', 'N/A'), 
-                self.format_duration(item.get('duration', 0)), 
-                self.format_date(item.get('pubDate', ''))
-            ))
-            item['id'] = item_id # 将 treeview 的 item id 存入字典
-            
-            # 初始化或恢复该项目的选中状态
-            self.item_states[item_id] = self.item_states.get(item_id, False)
-            self.update_row_checkbox(item_id)
-            
+        self.virtual_tree.set_keys([item['id'] for item in self.podcast_items])
         self.update_header_checkbox_state()
 
-        # 如果之前是全选状态，则取消它，因为列表已刷新
-        self.tree.heading("选择", text="☐")
-        self.all_selected_var.set(False)
-        
+    def row_values(self, item_id, position):
+        """VirtualTree 渲染一行时调用，时长和日期只在第一次显示时格式化"""
+        cached = self.row_cache.get(item_id)
+        if cached is None:
+            item = self.selection.get(item_id)
+            cached = (
+                item.get('title', 'N/A'),
+                self.format_duration(item.get('duration', 0)),
+                self.format_date(item.get('upload_date', '')),
+            )
+            self.row_cache[item_id] = cached
+        checkbox_char = "☑" if self.selection.is_selected(item_id) else "☐"
+        return (checkbox_char, position + 1) + cached
+
+    def item_date(self, item):
+        """项目的发布日期（YYYY-MM-DD），优先使用已格式化的缓存"""
+        cached = self.row_cache.get(item['id'])
+        return cached[2] if cached else self.format_date(item.get('upload_date', ''))
+
     def download_selected(self):
-        selected_ids = [item_id for item_id, selected in self.item_states.items() if selected]
-        if not selected_ids:
+        # 按当前显示顺序取出已选项目
+        items_to_download = self.selection.selected_items([item['id'] for item in self.podcast_items])
+        if not items_to_download:
             messagebox.showinfo("提示", "请选择要下载的播客。")
             return
 
-        self.stop_requested = False
-        self.download_button.configure(state="disabled")
-        self.stop_button.configure(state="normal")
-        self.fetch_button.configure(state="disabled")
-        self.progress_bar.set(0)
-        self.progress_label.configure(text="0.0%")
-        
-        # 重置状态
-        self.total_downloads = len(selected_ids)
-        self.completed_downloads = 0
-        self.active_downloads.clear()
-        self.download_futures.clear()
-        self.file_progress.clear()
-        self.errors_occurred = False
-        
-        # 下载立即开始，进度条直接进入确定模式
-        self.progress_bar.configure(mode="determinate")
-
         dir_path = self.dir_entry.get().strip()
         if not os.path.exists(dir_path):
             os.makedirs(dir_path)
 
-        items_to_download = []
-        for item_id in selected_ids:
-            item = next((p for p in self.podcast_items if p.get('id') == item_id), None)
-            if item:
-                items_to_download.append(item)
-        
-        if len(items_to_download) != self.total_downloads:
-            self.logger.warning("部分选中的项目无法找到，可能已被刷新。")
-            self.total_downloads = len(items_to_download)
-
+        # 标签中的曲目号与列表中显示的曲目号一致
+        positions = {item['id']: i + 1 for i, item in enumerate(self.podcast_items)}
+        codec = self.codec_var.get()
+        requests = []
         for item in items_to_download:
             item_title = item.get('title', 'Unknown Title')
             url = item.get('url')
 
             if not url:
                 self.logger.error(f"播客 '{item_title}' 的 URL 无效。")
-                self.total_downloads -= 1
                 continue
 
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(dir_path, f'{self.podcast_title} - {item_title}.%(ext)s'),
-                'quiet': True,
-                'no_warnings': True,
-                'logger': self.logger,
-                'progress_hooks': [self.progress_hook],
-            }
-
-            future = self.download_pool.submit(self._download_task_worker, ydl_opts, url)
-            self.download_futures.append(future)
-
-        self.status_label.configure(text=f"已将 {self.total_downloads} 个任务加入下载队列...")
-        self.process_queue()
-
-    def _download_task_worker(self, ydl_opts, url):
-        """
-        这个方法由线程池的单个工作线程执行，负责一个文件的完整下载过程。
-        """
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-        except Exception as e:
-            # 捕获 yt_dlp 本身的异常，包括用户中止的异常
-            # progress_hook 会处理具体的状态，这里只捕获意外错误
-            if "Download cancelled by user" not in str(e):
-                 self.download_queue.put({'status': 'error', 'error': str(e), 'url': url})
-
-    def progress_hook(self, d):
-        if self.stop_requested:
-            raise yt_dlp.utils.DownloadError("Download cancelled by user.")
-
-        # 从回调信息中获取最可靠的原始URL
-        url = d.get('info_dict', {}).get('original_url') or d.get('info_dict', {}).get('webpage_url')
-        if not url: # 如果在某些情况下无法获取，则不发送消息
-            self.logger.warning(f"无法从progress_hook确定URL。状态: {d['status']}")
+            # 多个播客合并的列表按各自的播客标题命名文件
+            ydl_opts = podcast_ydl_opts(dir_path, item.get('podcast_title', self.podcast_title), item_title,
+                                        logger=self.logger,
+                                        connections=int(self.connections_var.get()))
+            ydl_opts['postprocess'] = podcast_postprocess_opts(
+                item.get('podcast_title', self.podcast_title), item, track=positions.get(item['id']),
+                tags=self.tags_var.get(), loudnorm=DEFAULT_LOUDNESS if self.loudnorm_var.get() else None,
+                codec=None if codec == NO_TRANSCODE else codec)
+            meta = {'title': item_title, 'guid': item.get('guid')}
+            requests.append((url, ydl_opts, 'podcast', meta))
+
+        # 一次提交，任务库只写一次
+        job_ids = self.engine.submit_many(requests)
+        self.track_jobs(job_ids, f"已将 {len(job_ids)} 个任务加入下载队列...")
+
+    def resume_unfinished(self):
+        """重新提交任务库中未完成的播客下载，已下载的部分从 .part 文件继续"""
+        job_ids = self.engine.resume_unfinished(kind='podcast')
+        if not job_ids:
+            self.status_label.configure(text="没有未完成的下载任务。")
             return
+        self.track_jobs(job_ids, f"正在继续 {len(job_ids)} 个未完成的任务...")
 
-        message = {
-            'status': d['status'],
-            'data': d,
-            'url': url
-        }
-        self.download_queue.put(message)
-
-    def process_queue(self):
-        try:
-            while not self.download_queue.empty():
-                msg = self.download_queue.get_nowait()
-                status = msg.get('status')
-                url = msg.get('url')
-                data = msg.get('data', {})
-
-                if url not in self.file_progress:
-                    self.file_progress[url] = {'percent': 0, 'downloaded_bytes': 0, 'speed': 0}
-
-                if status == 'downloading':
-                    downloaded_bytes = data.get('downloaded_bytes', 0)
-                    total_bytes = data.get('total_bytes') or data.get('total_bytes_estimate', 0)
-                    speed = data.get('speed') or 0
-
-                    self.file_progress[url]['downloaded_bytes'] = downloaded_bytes
-                    self.file_progress[url]['speed'] = speed
-                    if total_bytes > 0:
-                        percent = (downloaded_bytes / total_bytes) * 100
-                        self.file_progress[url]['percent'] = percent
-
-                elif status == 'finished':
-                    self.completed_downloads += 1
-                    self.file_progress[url]['percent'] = 100
-                    self.file_progress[url]['speed'] = 0
-                
-                elif status == 'error':
-                    self.errors_occurred = True
-                    self.completed_downloads += 1
-                    self.file_progress[url]['percent'] = 100 # 将失败的任务视为"完成"以推进总进度
-                    self.logger.error(f"下载失败: {msg.get('error')}")
-
-            # --- 虚拟总进度计算 ---
-            if self.total_downloads > 0:
-                # 如果有任何详细的进度数据，则使用虚拟百分比方法
-                if self.file_progress:
-                    total_percent = sum(item['percent'] for item in self.file_progress.values())
-                    overall_progress = total_percent / self.total_downloads
-                    
-                    total_downloaded_mb = sum(item['downloaded_bytes'] for item in self.file_progress.values()) / 1024 / 1024
-                    total_speed_mbps = sum(item['speed'] for item in self.file_progress.values()) / 1024 / 1024
-
-                    self.progress_bar.set(overall_progress / 100)
-                    self.progress_label.configure(text=f"{overall_progress:.1f}%")
-                    
-                    speed_text = f"{total_speed_mbps:.2f} MB/s" if total_speed_mbps > 0 else "..."
-                    status_text = f"已下载: {total_downloaded_mb:.2f} MB | 速度: {speed_text}"
-                    self.status_label.configure(text=status_text)
-                # 否则，回退到按完成数量显示进度
-                else:
-                    self.update_progress_by_count()
+    def subscribe_current(self):
+        """订阅当前链接，当前列表中的单集视为已处理"""
+        urls = feed_batch.split_urls(self.url_entry.get())
+        if not urls:
+            messagebox.showerror("错误", "请输入播客链接")
+            return
+        if len(urls) > 1:
+            messagebox.showinfo("提示", "一次只能订阅一个播客链接。")
+            return
+        url = urls[0]
+        if not self.original_podcast_items:
+            messagebox.showinfo("提示", "请先获取播客列表。")
+            return
+        self.subscriptions.subscribe(url, self.default_download_dir, self.podcast_title,
+                                     known_items=self.original_podcast_items)
+        self.status_label.configure(text=f"已订阅 {self.podcast_title}，以后同步时只下载新单集。")
+
+    def sync_subscriptions(self):
+        """同步全部订阅，新单集提交到下载引擎"""
+        self.sync_button.configure(state="disabled")
+        self.status_label.configure(text="正在同步订阅...")
+
+        connections = int(self.connections_var.get())
+
+        def sync():
+            results = sync_all(self.subscriptions, self.engine, logger=self.logger, connections=connections)
+            self.after(0, self.on_subscriptions_synced, results)
+
+        Thread(target=sync, daemon=True).start()
+
+    def on_subscriptions_synced(self, results):
+        self.sync_button.configure(state="normal")
+        job_ids = [job_id for result in results.values() for job_id in result['jobs']]
+        failed = [url for url, result in results.items() if result['error']]
+        if failed:
+            self.logger.warning(f"{len(failed)} 个订阅同步失败")
+        if not job_ids:
+            self.status_label.configure(text=f"已同步 {len(results)} 个订阅，没有新单集。")
+            return
+        self.track_jobs(job_ids, f"已同步 {len(results)} 个订阅，新增 {len(job_ids)} 个下载任务...")
 
+    def track_jobs(self, job_ids, status_text):
+        """跟踪已提交到引擎的一批任务的总进度"""
+        self.stop_requested = False
+        self.download_button.configure(state="disabled")
+        self.resume_button.configure(state="disabled")
+        self.stop_button.configure(state="normal")
+        self.fetch_button.configure(state="disabled")
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0)
+        self.progress_label.configure(text="0.0%")
 
-            if self.completed_downloads == self.total_downloads and self.total_downloads > 0:
-                 self.download_finished()
-                 return
+        self.total_downloads = len(job_ids)
+        self.download_jobs = set(job_ids)
+        self.errors_occurred = False
+        self.batch_count += 1
+        self.progress_group = f"podcast-{self.batch_count}"
+        self.progress.track(self.progress_group, job_ids)
+
+        self.status_label.configure(text=status_text)
+        if not job_ids:
+            self.download_finished()
+
+    def on_progress_snapshot(self, snapshot):
+        """汇总器发布线程中调用，只在与当前批次有关时转到主线程"""
+        if self.progress_group in snapshot['groups']:
+            self.after(0, self.apply_progress, snapshot)
+
+    def apply_progress(self, snapshot):
+        group = snapshot['groups'].get(self.progress_group)
+        if group is None or self.stop_requested:
+            return # 已结束或已中止批次的快照
+
+        for job in snapshot['jobs'].values():
+            if job['state'] == 'error' and job['job_id'] in self.download_jobs:
+                self.errors_occurred = True
+                self.logger.error(f"下载失败: {job['error']}")
+
+        # --- 总进度（失败或取消的任务视为完成以推进总进度） ---
+        self.progress_bar.set(group['percent'] / 100)
+        self.progress_label.configure(text=f"{group['percent']:.1f}%")
+        total_downloaded_mb = group['downloaded_bytes'] / 1024 / 1024
+        total_speed_mbps = group['speed'] / 1024 / 1024
+        speed_text = f"{total_speed_mbps:.2f} MB/s" if total_speed_mbps > 0 else "..."
+        self.status_label.configure(text=f"已下载: {total_downloaded_mb:.2f} MB | 速度: {speed_text}")
+
+        if group['done']:
+            self.download_finished()
 
-        except queue.Empty:
-            pass
-        
-        if not self.stop_requested:
-            self.after(100, self.process_queue)
-
-    def update_progress_by_count(self):
-        """按文件完成数量更新进度（作为备用）"""
-        if self.total_downloads > 0:
-            progress = (self.completed_downloads / self.total_downloads) * 100
-            self.progress_bar.set(progress / 100)
-            self.progress_label.configure(text=f"{progress:.1f}%")
-            self.status_label.configure(text="下载中...")
-            
     def download_finished(self, status_text="所有任务已完成。"):
         self.progress_bar.stop()
         self.progress_bar.configure(mode="determinate")
         self.download_button.configure(state="normal")
+        self.resume_button.configure(state="normal")
         self.stop_button.configure(state="disabled")
-        self.fetch_button.configure(state="normal")
+        if not self.fetching:
+            self.fetch_button.configure(state="normal")
         
         # 优先显示错误信息
         if self.errors_occurred:
@@ -699,46 +588,63 @@ class PodcastDownloader(ctk.CTkFrame):
             self.status_label.configure(text=status_text)
         
         self.total_downloads = 0
-        self.completed_downloads = 0
-        self.active_downloads.clear()
-        self.download_futures.clear()
+        self.download_jobs.clear()
+        if self.progress_group:
+            self.progress.untrack(self.progress_group)
+            self.progress_group = None
 
     def stop_download(self):
         self.stop_requested = True
         
-        # 尝试取消线程池中未开始的任务
-        for future in self.download_futures:
-            future.cancel()
-
-        # 停止正在运行的线程
-        for thread in self.active_downloads.values():
-            thread.stop()
-            
-        # 清空队列
-        while not self.download_queue.empty():
-            try:
-                self.download_queue.get_nowait()
-            except queue.Empty:
-                break
-                
-        self.download_pool.shutdown(wait=False, cancel_futures=True) # 立即关闭
-        self.download_pool = ThreadPoolExecutor(max_workers=5) # 重建线程池
+        # 未开始的任务直接取消，运行中的任务在下一次进度回调时中止
+        for job_id in self.download_jobs:
+            self.engine.cancel(job_id)
 
         self.download_finished("下载已中止。")
 
     def select_all(self):
+        """选中所有曲目并更新UI"""
+        self.selection.select_all()
+        self.virtual_tree.refresh()
         self.all_selected_var.set(True)
         self.tree.heading("选择", text="☑")
 
     def deselect_all(self):
         """取消选中所有曲目并更新UI"""
-        for item_id in self.tree.get_children():
-            if self.item_states.get(item_id, False):
-                self.item_states[item_id] = False
-                self.update_row_checkbox(item_id)
+        self.selection.clear()
+        self.virtual_tree.refresh()
         self.all_selected_var.set(False)
         self.tree.heading("选择", text="☐")
 
+    def select_by_date(self):
+        """选中发布日期在输入范围内的曲目"""
+        start = self.date_from_entry.get().strip()
+        end = self.date_to_entry.get().strip()
+        if not start and not end:
+            messagebox.showinfo("提示", "请输入起始或结束日期（YYYY-MM-DD）。")
+            return
+        count = self.selection.select_by_date(start, end, self.item_date)
+        self.virtual_tree.refresh()
+        self.update_header_checkbox_state()
+        self.status_label.configure(text=f"已选择 {count} 个曲目")
+
+    def select_undownloaded(self):
+        """选中下载目录中还没有对应文件的曲目"""
+        dir_path = self.dir_entry.get().strip()
+        existing = set()
+        if os.path.isdir(dir_path):
+            for name in os.listdir(dir_path):
+                stem, ext = os.path.splitext(name)
+                if ext not in ('.part', '.segpart', '.json', '.ytdl'):
+                    existing.add(stem)
+        count = self.selection.select_where(
+            lambda item: podcast_file_stem(item.get('podcast_title', self.podcast_title),
+                                           item.get('title', 'Unknown Title')) not in existing
+        )
+        self.virtual_tree.refresh()
+        self.update_header_checkbox_state()
+        self.status_label.configure(text=f"已选择 {count} 个未下载的曲目")
+
     def refresh_track_numbers(self):
         """当"倒序"复选框状态改变时，刷新列表"""
         self.refresh_podcast_list()
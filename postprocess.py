@@ -0,0 +1,195 @@
+"""
+下载后处理：转码、响度标准化、写入标签（标题、曲目号、发布日期、封面）。
+
+这些步骤都是 CPU 密集的，在独立的进程池中执行，不占用下载线程：
+下载线程把文件交给 PostProcessor 后立即释放，继续下载下一个文件，处理与下载同时进行。
+
+处理选项是可以序列化的字典（随任务保存在 ydl_opts['postprocess'] 中）：
+{'tags': {'title', 'album', 'artist', 'date', 'tracknumber', 'artwork'（封面链接）},
+ 'loudnorm': 目标响度（LUFS）或 None, 'codec': 'mp3' / 'aac' / 'opus' 或 None}
+
+转码和响度标准化调用 ffmpeg；写入标签使用 mutagen（可选依赖，未安装时跳过并给出警告）。
+先转码再写标签，ffmpeg 重新封装文件时不会丢掉新写入的标签。
+"""
+import functools
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_LOUDNESS = -16  # 播客常用的目标响度（LUFS）
+
+# 目标编码 -> (ffmpeg 编码器, 扩展名, 码率)
+CODECS = {
+    'mp3': ('libmp3lame', 'mp3', '128k'),
+    'aac': ('aac', 'm4a', '128k'),
+    'opus': ('libopus', 'opus', '64k'),
+}
+# 只做响度标准化时按原扩展名选择编码器
+ENCODERS_BY_EXT = {'mp3': 'libmp3lame', 'm4a': 'aac', 'mp4': 'aac', 'aac': 'aac', 'opus': 'libopus',
+                   'ogg': 'libvorbis', 'webm': 'libopus', 'flac': 'flac', 'wav': 'pcm_s16le'}
+AUDIO_EXTS = ('mp3', 'm4a', 'aac', 'opus', 'ogg', 'flac', 'wav')
+MP4_EXTS = ('m4a', 'mp4', 'm4b', 'm4v')
+
+
+def needs_processing(options):
+    return bool(options) and bool(options.get('tags') or options.get('loudnorm') or options.get('codec'))
+
+
+def can_tag():
+    """是否安装了 mutagen；在主进程中检查，未安装时不必为写标签启动子进程"""
+    return importlib.util.find_spec('mutagen') is not None
+
+
+# --- 在子进程中执行的步骤（必须是模块级函数，才能传给进程池） ---
+
+def run_ffmpeg(path, loudnorm=None, codec=None):
+    """转码和/或响度标准化，返回新文件路径（扩展名可能改变）"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise Exception("未找到 ffmpeg，无法转码或标准化响度")
+
+    base, ext = os.path.splitext(path)
+    ext = ext[1:].lower()
+    if codec:
+        encoder, out_ext, bitrate = CODECS[codec]
+        if out_ext == ext and not loudnorm:
+            return path  # 已经是目标格式（例如去重时复用的已转码文件）
+    else:
+        encoder, out_ext, bitrate = ENCODERS_BY_EXT.get(ext, 'aac'), ext, None
+
+    out_path = base + '.' + out_ext
+    tmp_path = base + '.pp.' + out_ext
+    cmd = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-i', path, '-map_metadata', '0']
+    if out_ext in AUDIO_EXTS:
+        cmd += ['-vn']
+    else:
+        cmd += ['-c:v', 'copy']
+    if loudnorm:
+        cmd += ['-af', f'loudnorm=I={loudnorm}:TP=-1.5:LRA=11']
+    cmd += ['-c:a', encoder]
+    if bitrate:
+        cmd += ['-b:a', bitrate]
+    cmd.append(tmp_path)
+
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise Exception(f"ffmpeg 处理失败: {result.stderr.decode('utf-8', errors='replace').strip()[-500:]}")
+    os.replace(tmp_path, out_path)
+    if out_path != path:
+        os.remove(path)
+    return out_path
+
+
+@functools.lru_cache(maxsize=32)
+def fetch_artwork(url):
+    """下载封面，返回 (数据, MIME 类型)；同一进程中同一播客的封面只下载一次"""
+    import http_session
+
+    resp = http_session.get(url)
+    resp.raise_for_status()
+    mime = resp.headers.get('Content-Type', '').split(';')[0].strip()
+    if mime not in ('image/jpeg', 'image/png'):
+        mime = 'image/png' if resp.content[:8] == b'\x89PNG\r\n\x1a\n' else 'image/jpeg'
+    return resp.content, mime
+
+
+def write_artwork(path, data, mime):
+    ext = os.path.splitext(path)[1][1:].lower()
+    if ext == 'mp3':
+        from mutagen.id3 import APIC, ID3
+
+        tags = ID3(path)
+        tags.delall('APIC')
+        tags.add(APIC(encoding=3, mime=mime, type=3, desc='Cover', data=data))
+        tags.save(path)
+    elif ext in MP4_EXTS:
+        from mutagen.mp4 import MP4, MP4Cover
+
+        audio = MP4(path)
+        image_format = MP4Cover.FORMAT_PNG if mime == 'image/png' else MP4Cover.FORMAT_JPEG
+        audio['covr'] = [MP4Cover(data, imageformat=image_format)]
+        audio.save()
+    else:
+        return False
+    return True
+
+
+def write_tags(path, tags):
+    """写入 ID3 / MP4 / Vorbis 标签，返回警告列表"""
+    try:
+        import mutagen
+    except ImportError:
+        return ["未安装 mutagen，跳过写入标签"]
+
+    warnings = []
+    audio = mutagen.File(path, easy=True)
+    if audio is None:
+        return [f"无法识别的音频格式，跳过写入标签: {os.path.basename(path)}"]
+    if audio.tags is None:
+        audio.add_tags()
+    for key in ('title', 'album', 'artist', 'date', 'tracknumber'):
+        if tags.get(key):
+            audio[key] = str(tags[key])
+    audio.save()
+
+    if tags.get('artwork'):
+        try:
+            if not write_artwork(path, *fetch_artwork(tags['artwork'])):
+                warnings.append(f"该格式不支持写入封面: {os.path.basename(path)}")
+        except Exception as e:
+            warnings.append(f"写入封面失败: {e}")
+    return warnings
+
+
+def break_hardlink(path):
+    """文件有多个硬链接（去重时复用的文件）时先复制一份，就地写标签不会改动其他文件"""
+    if os.stat(path).st_nlink <= 1:
+        return
+    tmp_path = path + '.pp'
+    shutil.copy2(path, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def process_file(path, options):
+    """依次执行各步骤，返回 {'path': 最终路径, 'warnings': [警告]}"""
+    warnings = []
+    break_hardlink(path)
+    if options.get('loudnorm') or options.get('codec'):
+        path = run_ffmpeg(path, options.get('loudnorm'), options.get('codec'))
+    if options.get('tags'):
+        warnings += write_tags(path, options['tags'])
+    return {'path': path, 'warnings': warnings}
+
+
+# --- 进程池 ---
+
+class PostProcessor:
+    """
+    max_workers 默认比 CPU 核数少一个，给下载线程和界面留出余量。
+    进程池在第一次提交时才创建；使用 spawn 启动子进程，不复制界面和下载线程的状态。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, options):
+        """返回 Future，结果为 process_file() 的返回值"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool.submit(process_file, path, options)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
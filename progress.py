@@ -0,0 +1,240 @@
+"""
+进度汇总：合并引擎的进度事件，按固定频率向任意数量的订阅者发布快照。
+
+yt-dlp 每秒可能回调数百次进度，如果每次都放进界面队列、每个周期再把所有文件的进度重新加总，
+界面线程会把大量时间花在记账上。ProgressAggregator 作为引擎监听器：
+
+- 每个任务只保留最新的进度，重复的进度事件直接覆盖（合并）；
+- 每个分组（例如一次批量下载）的总进度、总字节数、总速度增量维护，更新是 O(1)；
+- 后台线程每 interval 秒检查一次，有变化时向订阅者发布一个快照，与事件频率无关。
+
+快照格式：
+{'groups': {分组名: 分组汇总}, 'jobs': {任务 ID: 任务进度}（只包含本周期有变化的任务）}
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from engine import CANCELLED, ERROR, FINAL_STATES, FINISHED
+
+PUBLISH_INTERVAL = 0.25
+MAX_FINISHED_JOBS = 10000
+
+
+class JobProgress:
+    __slots__ = ('job_id', 'state', 'downloaded_bytes', 'total_bytes', 'speed', 'percent', 'error', 'meta')
+
+    def __init__(self, job_id, meta=None):
+        self.job_id = job_id
+        self.state = 'queued'
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.speed = 0
+        self.percent = 0.0
+        self.error = None
+        self.meta = meta or {}
+
+    def as_dict(self):
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'speed': self.speed,
+            'percent': self.percent,
+            'error': self.error,
+            'meta': self.meta,
+        }
+
+
+class GroupTotals:
+    """一组任务的汇总值，随任务进度增量更新"""
+
+    def __init__(self, job_ids):
+        self.job_ids = set(job_ids)
+        self.percent_sum = 0.0
+        self.downloaded_bytes = 0
+        self.speed = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def apply(self, old, new):
+        """加上 new 的贡献并减去 old 的贡献（old/new 为 _contribution 的结果，可为 None）"""
+        for contribution, factor in ((old, -1), (new, 1)):
+            if contribution is None:
+                continue
+            percent, downloaded, speed, state = contribution
+            self.percent_sum += factor * percent
+            self.downloaded_bytes += factor * downloaded
+            self.speed += factor * speed
+            if state in FINAL_STATES:
+                self.completed += factor
+            if state == ERROR:
+                self.failed += factor
+            elif state == CANCELLED:
+                self.cancelled += factor
+
+    def as_dict(self):
+        total = len(self.job_ids)
+        return {
+            'total': total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'percent': self.percent_sum / total if total else 0.0,
+            'downloaded_bytes': self.downloaded_bytes,
+            'speed': max(self.speed, 0),
+            'done': total > 0 and self.completed >= total,
+        }
+
+
+def _contribution(job):
+    if job is None:
+        return None
+    if job.state in FINAL_STATES:
+        # 失败或取消的任务同样视为完成，推进总进度
+        return (100.0, job.downloaded_bytes, 0, job.state)
+    return (job.percent, job.downloaded_bytes, job.speed, job.state)
+
+
+class ProgressAggregator:
+    def __init__(self, engine=None, interval=PUBLISH_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # 任务 ID -> JobProgress，已结束的任务只保留最近的一部分
+        self._groups = {}           # 分组名 -> GroupTotals
+        self._job_groups = {}       # 任务 ID -> 所属分组名集合
+        self._dirty_jobs = set()
+        self._dirty_groups = set()
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+        if engine is not None:
+            engine.add_listener(self.on_event)
+
+    # --- 输入 ---
+
+    def on_event(self, event):
+        """引擎监听器，只更新内存中的数值，不做任何 I/O"""
+        snapshot = event['job']
+        job_id = event['job_id']
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                job = self._jobs[job_id] = JobProgress(job_id, snapshot.get('meta'))
+            old = _contribution(job)
+
+            status = event['status']
+            job.state = snapshot['state'] if status == 'downloading' else status
+            job.downloaded_bytes = snapshot['downloaded_bytes']
+            job.total_bytes = snapshot['total_bytes']
+            job.speed = snapshot['speed'] if status == 'downloading' else 0
+            if job.total_bytes > 0:
+                job.percent = job.downloaded_bytes / job.total_bytes * 100
+            if status == FINISHED:
+                job.percent = 100.0
+            job.error = event.get('error')
+
+            self._apply(job_id, old, _contribution(job))
+            self._dirty_jobs.add(job_id)
+            if job.state in FINAL_STATES and not self._job_groups.get(job_id):
+                # 按结束顺序排列，删除时从最早结束的开始
+                self._jobs.move_to_end(job_id)
+                self._prune()
+
+    def _apply(self, job_id, old, new):
+        for name in self._job_groups.get(job_id, ()):
+            self._groups[name].apply(old, new)
+            self._dirty_groups.add(name)
+
+    def _prune(self):
+        """只保留最近结束的 MAX_FINISHED_JOBS 个任务，未结束或仍在分组中的任务不计入也不会被删除"""
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.state in FINAL_STATES and not self._job_groups.get(job_id)]
+        for job_id in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self._jobs[job_id]
+
+    # --- 分组 ---
+
+    def track(self, name, job_ids):
+        """开始（或重新）跟踪一组任务，提交后立即结束的任务也会被正确计入"""
+        with self._lock:
+            self._untrack(name)
+            group = self._groups[name] = GroupTotals(job_ids)
+            for job_id in group.job_ids:
+                self._job_groups.setdefault(job_id, set()).add(name)
+                job = self._jobs.get(job_id)
+                if job is None:
+                    job = self._jobs[job_id] = JobProgress(job_id)
+                group.apply(None, _contribution(job))
+            self._dirty_groups.add(name)
+        self._ensure_thread()
+
+    def untrack(self, name):
+        with self._lock:
+            self._untrack(name)
+
+    def _untrack(self, name):
+        group = self._groups.pop(name, None)
+        if group is None:
+            return
+        for job_id in group.job_ids:
+            names = self._job_groups.get(job_id)
+            if names:
+                names.discard(name)
+                if not names:
+                    del self._job_groups[job_id]
+
+    def group(self, name):
+        with self._lock:
+            group = self._groups.get(name)
+            return group.as_dict() if group else None
+
+    def job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.as_dict() if job else None
+
+    # --- 发布 ---
+
+    def subscribe(self, callback):
+        """callback(快照) 在发布线程中调用，GUI 需要自行转到主线程"""
+        with self._lock:
+            self._subscribers.append(callback)
+        self._ensure_thread()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _take_snapshot(self):
+        with self._lock:
+            if not self._dirty_jobs and not self._dirty_groups:
+                return None, []
+            snapshot = {
+                'groups': {name: self._groups[name].as_dict() for name in self._dirty_groups if name in self._groups},
+                'jobs': {job_id: self._jobs[job_id].as_dict() for job_id in self._dirty_jobs if job_id in self._jobs},
+            }
+            self._dirty_jobs = set()
+            self._dirty_groups = set()
+            return snapshot, list(self._subscribers)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            snapshot, subscribers = self._take_snapshot()
+            for callback in subscribers:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    logging.getLogger(__name__).error(f"进度订阅回调出错: {e}")
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,289 @@
+"""
+下载限速：全局、按主机、按任务三级上限，可在运行时调整。
+
+每个进行中的任务有自己的令牌桶，速率按最大最小公平分配（注水法）计算：
+- 先把主机上限分给该主机上的任务，再把全局上限分给全部任务；
+- 最近一段时间没有用满份额的任务（例如源站本身较慢）只分到它实际需要的速率加一些余量，
+  剩下的带宽平均分给其余任务；
+- 任务自身的上限（ydl_opts 中的 'rate_limit'）同样参与分配。
+所以总速率不超过上限，同时一个大文件或一个数据块很大的下载不会挤占其他下载。
+
+令牌桶允许透支：一次消耗超过桶中令牌时，调用方按欠下的字节数等待。
+下载线程在每个数据块之后调用 throttle()，睡眠就是限速本身。
+
+限速计划（例如白天 2M、夜间不限）按"HH:MM=速率"列表设置，到达切换时间时改变全局上限。
+速率为字节每秒，0 表示不限；parse_rate() 支持 "500K"、"2M" 这样的写法。
+"""
+import re
+import threading
+import time
+
+from scheduler import host_of
+
+BURST_SECONDS = 0.5
+MIN_BURST = 64 * 1024
+SCHEDULE_CHECK_INTERVAL = 30
+REBALANCE_INTERVAL = 1.0
+DEMAND_HEADROOM = 1.25  # 未用满份额的任务按实际速率的这个倍数分配，以便逐步提速
+
+_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text):
+    """把 "500K"、"2M"、"1048576" 转换为字节每秒，空字符串、"0"、"不限" 返回 0"""
+    if text is None:
+        return 0
+    if isinstance(text, (int, float)):
+        return max(0, int(text))
+    text = text.strip().upper()
+    if text in ('', '0', '不限'):
+        return 0
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([BKMG]?)(?:I?B)?(?:/S)?', text)
+    if not match:
+        raise ValueError(f"无法识别的速率: {text}")
+    return int(float(match.group(1)) * _UNITS[match.group(2)])
+
+
+def format_rate(rate):
+    if not rate:
+        return "不限"
+    for unit in ('G', 'M', 'K'):
+        if rate >= _UNITS[unit]:
+            return f"{rate / _UNITS[unit]:g}{unit}"
+    return str(rate)
+
+
+def parse_schedule(text):
+    """把 "09:00=2M,19:00=0" 转换为 [(一天中的分钟数, 速率)]，按时间排序"""
+    schedule = []
+    for entry in filter(None, (part.strip() for part in (text or '').split(','))):
+        when, _, rate = entry.partition('=')
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})', when.strip())
+        if not match or not _:
+            raise ValueError(f"无法识别的限速计划: {entry}")
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour > 23 or minute > 59:
+            raise ValueError(f"无法识别的限速计划: {entry}")
+        schedule.append((hour * 60 + minute, parse_rate(rate)))
+    return sorted(schedule)
+
+
+class TokenBucket:
+    """令牌桶，rate 为 0 时不限速；不加锁，由 BandwidthLimiter 统一加锁"""
+
+    def __init__(self, rate=0):
+        self.rate = 0
+        self.burst = MIN_BURST
+        self.tokens = 0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        self._refill(time.monotonic())
+        self.rate = rate
+        self.burst = max(MIN_BURST, rate * BURST_SECONDS)
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes, now):
+        """消耗 nbytes 个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0
+        self._refill(now)
+        self.tokens -= nbytes
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+
+def fair_shares(capacity, demands):
+    """
+    注水法：把 capacity 按最大最小公平分给各项，demands 为 {键: 需求}，None 表示需求不限。
+    需求小于平均份额的项只分到需求，剩余部分继续平均分给其余项。
+    """
+    shares = {}
+    remaining = capacity
+    pending = sorted(demands.items(), key=lambda item: float('inf') if item[1] is None else item[1])
+    while pending:
+        share = remaining / len(pending)
+        key, demand = pending[0]
+        if demand is not None and demand < share:
+            shares[key] = demand
+            remaining -= demand
+            pending.pop(0)
+        else:
+            for key, _ in pending:
+                shares[key] = share
+            break
+    return shares
+
+
+class BandwidthLimiter:
+    def __init__(self, global_rate=0, host_rates=None, schedule=None):
+        self._lock = threading.Lock()
+        self.global_rate = global_rate
+        self.host_rates = dict(host_rates or {})  # 域名后缀 -> 速率
+        # 任务 ID -> {'host', 'limit', 'bucket', 'bytes'（本周期字节数）, 'waited'（本周期是否被限速）}
+        self._jobs = {}
+        self._rebalanced = time.monotonic()
+        self._schedule = []
+        self._schedule_entry = None
+        self._schedule_checked = 0
+        if schedule:
+            self.set_schedule(schedule)
+
+    # --- 配置 ---
+
+    def set_global_rate(self, rate):
+        with self._lock:
+            self._set_global_rate(rate)
+
+    def _set_global_rate(self, rate):
+        self.global_rate = rate
+        self._rebalance()
+
+    def set_host_rate(self, host_suffix, rate):
+        with self._lock:
+            if rate:
+                self.host_rates[host_suffix] = rate
+            else:
+                self.host_rates.pop(host_suffix, None)
+            self._rebalance()
+
+    def set_job_rate(self, job_id, rate):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['limit'] = rate
+                self._rebalance()
+
+    def set_schedule(self, schedule):
+        """schedule 为 parse_schedule() 的结果或其文本形式，空列表表示取消计划"""
+        if isinstance(schedule, str):
+            schedule = parse_schedule(schedule)
+        with self._lock:
+            self._schedule = list(schedule)
+            self._schedule_entry = None
+            self._apply_schedule(force=True)
+
+    def limits(self):
+        with self._lock:
+            return {
+                'global': self.global_rate,
+                'hosts': dict(self.host_rates),
+                'schedule': [f"{minute // 60:02d}:{minute % 60:02d}={format_rate(rate)}"
+                             for minute, rate in self._schedule],
+                'jobs': {job_id: job['bucket'].rate for job_id, job in self._jobs.items()},
+            }
+
+    def _apply_schedule(self, force=False):
+        """到达计划中的切换时间时修改全局上限；两次切换之间手动设置的上限保持有效"""
+        now = time.monotonic()
+        if not self._schedule or (not force and now - self._schedule_checked < SCHEDULE_CHECK_INTERVAL):
+            return
+        self._schedule_checked = now
+        local = time.localtime()
+        minute = local.tm_hour * 60 + local.tm_min
+        # 当前时间之前最近的一项，都晚于当前时间时沿用前一天最后一项
+        entry = self._schedule[-1]
+        for candidate in self._schedule:
+            if candidate[0] <= minute:
+                entry = candidate
+        if entry != self._schedule_entry:
+            self._schedule_entry = entry
+            self._set_global_rate(entry[1])
+
+    def _host_limit(self, host):
+        """返回 (匹配的域名后缀, 速率)，同一后缀下的主机共用一个上限；没有上限时返回 (None, 0)"""
+        for suffix, rate in self.host_rates.items():
+            if host == suffix or host.endswith('.' + suffix):
+                return suffix, rate
+        return None, 0
+
+    # --- 分配 ---
+
+    def _rebalance(self):
+        """根据上一周期各任务的实际速率重新分配每个任务的令牌桶速率"""
+        now = time.monotonic()
+        elapsed = max(now - self._rebalanced, 1e-3)
+        self._rebalanced = now
+
+        demands = {}
+        for job_id, job in self._jobs.items():
+            # 被限速过的任务需求不限；没用满份额的任务按实际速率加余量
+            demand = None
+            if not job['waited'] and job['bucket'].rate and job['bytes']:
+                demand = job['bytes'] / elapsed * DEMAND_HEADROOM
+            if job['limit']:
+                demand = job['limit'] if demand is None else min(demand, job['limit'])
+            demands[job_id] = demand
+            job['bytes'] = 0
+            job['waited'] = False
+
+        by_host = {}
+        for job_id, job in self._jobs.items():
+            suffix, host_rate = self._host_limit(job['host'])
+            if host_rate:
+                by_host.setdefault(suffix, (host_rate, []))[1].append(job_id)
+        host_shares = {}
+        for host_rate, job_ids in by_host.values():
+            host_shares.update(fair_shares(host_rate, {job_id: demands[job_id] for job_id in job_ids}))
+        demands.update(host_shares)
+
+        if self.global_rate:
+            rates = fair_shares(self.global_rate, demands)
+        else:
+            # 没有全局上限时，需求估计只用于分配，速率只受主机和任务上限约束
+            rates = {job_id: host_shares.get(job_id, job['limit']) for job_id, job in self._jobs.items()}
+        for job_id, job in self._jobs.items():
+            job['bucket'].set_rate(rates[job_id] or 0)
+
+    # --- 任务 ---
+
+    def start_job(self, job_id, url, rate=0):
+        with self._lock:
+            self._jobs[job_id] = {'host': host_of(url), 'limit': rate or 0, 'bucket': TokenBucket(),
+                                  'bytes': 0, 'waited': True}
+            self._rebalance()
+
+    def finish_job(self, job_id):
+        with self._lock:
+            if self._jobs.pop(job_id, None) is not None:
+                self._rebalance()
+
+    def throttle(self, job_id, nbytes, cancel_event=None):
+        """记录任务刚下载的 nbytes 字节，超出分到的速率时睡眠；cancel_event 被设置时立即返回"""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._apply_schedule()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            now = time.monotonic()
+            job['bytes'] += nbytes
+            delay = job['bucket'].reserve(nbytes, now)
+            if delay > 0:
+                job['waited'] = True
+            if now - self._rebalanced >= REBALANCE_INTERVAL:
+                self._rebalance()
+        if delay > 0:
+            if cancel_event is not None:
+                cancel_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """进程内共用的限速器，所有引擎共享同一个全局上限"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter()
+        return _limiter
@@ -0,0 +1,188 @@
+"""
+自适应并发调度。
+
+AdaptiveScheduler 决定同时进行多少个下载：
+- 按时间窗口统计总吞吐量、错误数和 429 限流次数；
+- 没有错误且吞吐量仍在增长时逐步加一（加性增加）；
+- 出现 429 或错误率过高时减半（乘性减少），增加后吞吐不再提升则回退一步；
+- 每个主机单独限制并发数，被限流的主机单独减半，窗口内恢复正常后逐步恢复。
+
+HostLimiter 只做按主机的并发上限，供元数据抓取等不需要自适应的场景复用。
+"""
+import threading
+import time
+import urllib.parse
+
+# 不同主机的默认并发上限，按域名后缀匹配
+DEFAULT_HOST_LIMITS = {
+    'xyzcdn.net': 4,         # 小宇宙音频主机，较早开始限流
+    'xiaoyuzhoufm.com': 4,
+    'googlevideo.com': 16,
+    'bilivideo.com': 8,
+    'bilivideo.cn': 8,
+}
+DEFAULT_HOST_LIMIT = 6
+
+
+def host_of(url):
+    return (urllib.parse.urlparse(url).hostname or '').lower()
+
+
+def is_throttle_error(error):
+    """根据错误信息判断是否被服务器限流"""
+    text = str(error or '')
+    return '429' in text or 'Too Many Requests' in text
+
+
+class HostLimiter:
+    """按主机限制并发数，limit_for() 按域名后缀查找上限"""
+
+    def __init__(self, host_limits=None, default_limit=DEFAULT_HOST_LIMIT):
+        self.host_limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+        self.default_limit = default_limit
+        self._active = {}  # host -> 进行中的数量
+        self._cond = threading.Condition()
+
+    def limit_for(self, host):
+        for suffix, limit in self.host_limits.items():
+            if host == suffix or host.endswith('.' + suffix):
+                return limit
+        return self.default_limit
+
+    def try_acquire(self, url):
+        host = host_of(url)
+        with self._cond:
+            if self._active.get(host, 0) >= self.limit_for(host):
+                return False
+            self._active[host] = self._active.get(host, 0) + 1
+            return True
+
+    def acquire(self, url):
+        """阻塞直到该主机有空位"""
+        host = host_of(url)
+        with self._cond:
+            while self._active.get(host, 0) >= self.limit_for(host):
+                self._cond.wait()
+            self._active[host] = self._active.get(host, 0) + 1
+
+    def release(self, url):
+        host = host_of(url)
+        with self._cond:
+            count = self._active.get(host, 0) - 1
+            if count > 0:
+                self._active[host] = count
+            else:
+                self._active.pop(host, None)
+            self._cond.notify_all()
+
+    def active(self, host):
+        with self._cond:
+            return self._active.get(host, 0)
+
+
+class AdaptiveScheduler:
+    def __init__(self, initial=5, min_workers=1, max_workers=32,
+                 host_limits=None, default_host_limit=DEFAULT_HOST_LIMIT,
+                 window=5.0, error_threshold=0.2):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.limit = max(min_workers, min(initial, max_workers))
+        self.window = window
+        self.error_threshold = error_threshold
+        self.hosts = HostLimiter(host_limits, default_host_limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._host_caps = {}  # host -> 被限流后临时降低的上限
+
+        # 当前窗口的统计
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._window_done = 0
+        self._window_errors = 0
+        self._window_throttled = set()
+        self._peak_in_flight = 0
+        self._last_throughput = 0
+        self._last_change = 0  # 上一次调整方向：1 增加，-1 减少，0 不变
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def host_cap(self, host):
+        cap = self.hosts.limit_for(host)
+        return min(cap, self._host_caps.get(host, cap))
+
+    def try_acquire(self, url):
+        """全局和主机都有空位时占用一个名额，返回是否成功"""
+        host = host_of(url)
+        with self._lock:
+            if self._in_flight >= self.limit:
+                return False
+            if self.hosts.active(host) >= self.host_cap(host):
+                return False
+            if not self.hosts.try_acquire(url):
+                return False
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+            return True
+
+    def release(self, url, error=None):
+        """任务结束时调用，error 为失败原因（成功时为 None），返回并发上限是否变化"""
+        host = host_of(url)
+        self.hosts.release(url)
+        with self._lock:
+            self._in_flight -= 1
+            self._window_done += 1
+            if error is not None:
+                self._window_errors += 1
+                if is_throttle_error(error):
+                    self._window_throttled.add(host)
+            return self._maybe_adjust()
+
+    def record_bytes(self, nbytes):
+        """记录新下载的字节数，返回并发上限是否变化"""
+        with self._lock:
+            self._window_bytes += nbytes
+            return self._maybe_adjust()
+
+    def _maybe_adjust(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return False
+
+        throughput = self._window_bytes / elapsed
+        old_limit = self.limit
+        finished = self._window_done
+
+        if self._window_throttled:
+            # 被限流：全局与对应主机都减半
+            self.limit = max(self.min_workers, self.limit // 2)
+            for host in self._window_throttled:
+                cap = self.host_cap(host)
+                self._host_caps[host] = max(1, cap // 2)
+        elif finished and self._window_errors / finished > self.error_threshold:
+            self.limit = max(self.min_workers, self.limit // 2)
+        else:
+            # 恢复被限流主机的上限
+            for host in list(self._host_caps):
+                self._host_caps[host] += 1
+                if self._host_caps[host] >= self.hosts.limit_for(host):
+                    del self._host_caps[host]
+
+            saturated = self._peak_in_flight >= self.limit
+            if self._last_change > 0 and throughput < self._last_throughput * 1.05:
+                # 上次增加并发后吞吐没有明显提升，回退一步
+                self.limit = max(self.min_workers, self.limit - 1)
+            elif saturated and throughput > 0:
+                self.limit = min(self.max_workers, self.limit + 1)
+
+        self._last_change = (self.limit > old_limit) - (self.limit < old_limit)
+        self._last_throughput = throughput
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_done = 0
+        self._window_errors = 0
+        self._window_throttled = set()
+        self._peak_in_flight = self._in_flight
+        return self.limit != old_limit
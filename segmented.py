@@ -0,0 +1,268 @@
+"""
+多连接分段下载器，用于播客音频这类可以直接访问的媒体文件。
+
+把文件按字节范围切成 N 段，每段一个连接并发下载，直接写入预先分配好大小的 .segpart 文件。
+每段的进度保存在 .segpart.json 中，中断后可以从断点继续。全部完成后校验文件长度再改名。
+服务器不支持 Range 或文件太小时抛出 SegmentedUnsupported，调用方应回退到 yt-dlp。
+
+临时文件不能用 yt-dlp 的 .part：预先分配的文件大小已经是完整长度，yt-dlp 续传时会把它当成下载完成。
+下载中途发现服务器不支持分段时，临时文件和进度文件会被删除，再交给 yt-dlp 从头下载。
+
+进度通过 yt-dlp 格式的回调字典报告，可以直接复用引擎的 progress hook。
+传入 throttle(nbytes) 时每个分段线程在写入数据块后调用它限速。
+"""
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+import http_session
+
+# 常见的可直接下载的媒体扩展名
+MEDIA_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.ogg', '.oga', '.opus', '.wav', '.flac', '.mp4', '.m4v')
+
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+SEGMENT_RETRIES = 5
+HOOK_INTERVAL = 0.5
+STATE_INTERVAL = 2.0
+
+
+class SegmentedUnsupported(Exception):
+    """该链接不适合分段下载"""
+
+
+def media_extension(url):
+    """返回链接路径中的媒体扩展名（不含点），不是媒体链接时返回 None"""
+    path = urllib.parse.urlparse(url).path.lower()
+    for ext in MEDIA_EXTENSIONS:
+        if path.endswith(ext):
+            return ext[1:]
+    return None
+
+
+def is_direct_media(url):
+    return media_extension(url) is not None
+
+
+def target_path(outtmpl, url):
+    """用链接中的扩展名填充只包含 %(ext)s 的输出模板"""
+    ext = media_extension(url)
+    if ext is None or '%(ext)s' not in outtmpl:
+        raise SegmentedUnsupported("无法确定输出文件名")
+    return outtmpl.replace('%(ext)s', ext).replace('%%', '%')
+
+
+class SegmentedDownloader:
+    def __init__(self, url, path, connections=4, progress_hook=None, min_segment_size=MIN_SEGMENT_SIZE,
+                 throttle=None):
+        self.url = url
+        self.path = path
+        self.part_path = path + '.segpart'
+        self.state_path = path + '.segpart.json'
+        self.connections = max(1, connections)
+        self.progress_hook = progress_hook
+        self.min_segment_size = min_segment_size
+        self.throttle = throttle
+        self.total_bytes = 0
+        self._segments = []  # [{'start', 'end', 'pos'}]，end 为闭区间
+        self._lock = threading.Lock()
+        self._error = None
+        self._stop = threading.Event()
+        self._last_state = 0
+        self._started_at = 0
+        self._resumed_bytes = 0
+
+    # --- 准备 ---
+
+    def probe(self):
+        """用 Range: bytes=0-0 请求获取文件大小并确认服务器支持分段"""
+        response = http_session.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True)
+        try:
+            response.raise_for_status()
+            content_range = response.headers.get('Content-Range', '')
+            match = re.match(r'bytes 0-0/(\d+)', content_range)
+            if response.status_code != 206 or not match:
+                raise SegmentedUnsupported("服务器不支持分段下载")
+            # 跟随重定向后的最终地址，避免每个分段重复跳转
+            self.url = getattr(response, 'url', None) or self.url
+            return int(match.group(1))
+        finally:
+            response.close()
+
+    def _plan_segments(self):
+        count = min(self.connections, max(1, self.total_bytes // self.min_segment_size))
+        size = self.total_bytes // count
+        segments = []
+        for i in range(count):
+            start = i * size
+            end = self.total_bytes - 1 if i == count - 1 else start + size - 1
+            segments.append({'start': start, 'end': end, 'pos': start})
+        return segments
+
+    def _load_state(self):
+        """读取上次中断时保存的分段进度，文件大小不一致时重新开始"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('total_bytes') != self.total_bytes or not os.path.exists(self.part_path):
+            return None
+        if os.path.getsize(self.part_path) != self.total_bytes:
+            return None
+        return state['segments']
+
+    def _save_state(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_state < STATE_INTERVAL:
+            return
+        self._last_state = now
+        with self._lock:
+            state = {'url': self.url, 'total_bytes': self.total_bytes,
+                     'segments': [dict(segment) for segment in self._segments]}
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def discard(self):
+        """删除临时文件和进度文件"""
+        for path in (self.part_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _preallocate(self):
+        with open(self.part_path, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(f.fileno(), 0, self.total_bytes)
+                    return
+                except OSError:
+                    pass
+            f.truncate(self.total_bytes)
+
+    # --- 下载 ---
+
+    def downloaded_bytes(self):
+        with self._lock:
+            return sum(segment['pos'] - segment['start'] for segment in self._segments)
+
+    def _report(self):
+        if not self.progress_hook:
+            return
+        now = time.monotonic()
+        downloaded = self.downloaded_bytes()
+        elapsed = max(now - self._started_at, 1e-6)
+        self.progress_hook({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': self.total_bytes,
+            'speed': (downloaded - self._resumed_bytes) / elapsed,
+            'filename': self.path,
+            'tmpfilename': self.part_path,
+        })
+
+    def _download_segment(self, segment):
+        attempts = 0
+        with open(self.part_path, 'r+b') as f:
+            while segment['pos'] <= segment['end'] and not self._stop.is_set():
+                try:
+                    response = http_session.get(
+                        self.url,
+                        headers={'Range': f"bytes={segment['pos']}-{segment['end']}"},
+                        stream=True,
+                    )
+                    try:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise SegmentedUnsupported("服务器忽略了 Range 请求")
+                        f.seek(segment['pos'])
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            if self._stop.is_set():
+                                return
+                            # 防止服务器返回超出范围的数据
+                            chunk = chunk[:segment['end'] + 1 - segment['pos']]
+                            f.write(chunk)
+                            with self._lock:
+                                segment['pos'] += len(chunk)
+                            if self.throttle:
+                                self.throttle(len(chunk))
+                            if segment['pos'] > segment['end']:
+                                break
+                    finally:
+                        response.close()
+                except SegmentedUnsupported:
+                    raise
+                except http_session.RequestError:
+                    attempts += 1
+                    if attempts > SEGMENT_RETRIES:
+                        raise
+                    time.sleep(min(2 ** attempts, 30))
+
+    def _worker(self, segment):
+        try:
+            self._download_segment(segment)
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop.set()
+
+    def download(self):
+        """下载到 self.path，返回文件路径；失败时抛出异常，已下载的部分保留以便继续"""
+        self.total_bytes = self.probe()
+        if self.total_bytes < self.min_segment_size:
+            raise SegmentedUnsupported("文件太小，无需分段")
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        segments = self._load_state()
+        if segments is None:
+            self._preallocate()
+            segments = self._plan_segments()
+        self._segments = segments
+        self._resumed_bytes = self.downloaded_bytes()
+        self._started_at = time.monotonic()
+
+        threads = [
+            threading.Thread(target=self._worker, args=(segment,), daemon=True)
+            for segment in self._segments if segment['pos'] <= segment['end']
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            # 进度回调和状态保存都在调用线程中执行，回调抛出的异常（例如用户取消）会中止所有分段
+            while any(thread.is_alive() for thread in threads):
+                if self._stop.wait(HOOK_INTERVAL):
+                    for thread in threads:
+                        thread.join()
+                    break
+                self._report()
+                self._save_state()
+        except BaseException:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self._save_state(force=True)
+            raise
+
+        if isinstance(self._error, SegmentedUnsupported):
+            # 部分分段已经写入，回退到 yt-dlp 前清除，避免以后被当成可以续传的进度
+            self.discard()
+            raise self._error
+        self._save_state(force=True)
+        if self._error is not None:
+            raise self._error
+
+        # 校验长度
+        if self.downloaded_bytes() != self.total_bytes or os.path.getsize(self.part_path) != self.total_bytes:
+            raise Exception("分段下载完成但文件长度不一致")
+
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+        self._report()
+        if self.progress_hook:
+            self.progress_hook({'status': 'finished', 'filename': self.path, 'total_bytes': self.total_bytes})
+        return self.path
@@ -0,0 +1,101 @@
+"""
+列表选择模型：项目 ID 索引 + 已选集合 + 计数，配合虚拟化列表使用。
+
+查询某个项目、判断是否全选、统计已选数量都是 O(1)，
+批量操作（全选、范围选择、按日期或条件选择）只遍历一次数据，不涉及任何界面调用。
+"""
+
+
+class SelectionModel:
+    def __init__(self, items=()):
+        self._items = {}      # 项目 ID -> 项目
+        self._selected = set()
+        self.add(items)
+
+    # --- 数据 ---
+
+    def reset(self, items=()):
+        self._items = {}
+        self._selected = set()
+        self.add(items)
+
+    def add(self, items):
+        """加入项目，每个项目必须带有唯一的 'id'"""
+        for item in items:
+            self._items[item['id']] = item
+
+    def get(self, item_id):
+        return self._items.get(item_id)
+
+    def __len__(self):
+        return len(self._items)
+
+    # --- 查询 ---
+
+    def is_selected(self, item_id):
+        return item_id in self._selected
+
+    @property
+    def count(self):
+        return len(self._selected)
+
+    def all_selected(self):
+        return bool(self._items) and len(self._selected) == len(self._items)
+
+    def selected_ids(self):
+        return set(self._selected)
+
+    def selected_items(self, order):
+        """按给定的项目 ID 顺序（例如当前显示顺序）返回已选项目"""
+        return [self._items[item_id] for item_id in order if item_id in self._selected]
+
+    # --- 修改 ---
+
+    def set_selected(self, item_id, selected):
+        if item_id not in self._items:
+            return
+        if selected:
+            self._selected.add(item_id)
+        else:
+            self._selected.discard(item_id)
+
+    def toggle(self, item_id):
+        """切换选中状态，返回新状态"""
+        selected = item_id not in self._selected
+        self.set_selected(item_id, selected)
+        return selected
+
+    def select_all(self):
+        self._selected = set(self._items)
+
+    def clear(self):
+        self._selected = set()
+
+    def select_range(self, order, first_id, last_id, selected=True):
+        """选中 order 中 first_id 与 last_id 之间（含两端）的项目，返回受影响的 ID 列表"""
+        positions = {item_id: i for i, item_id in enumerate(order) if item_id in (first_id, last_id)}
+        if first_id not in positions or last_id not in positions:
+            return []
+        start, end = sorted((positions[first_id], positions[last_id]))
+        changed = order[start:end + 1]
+        if selected:
+            self._selected.update(changed)
+        else:
+            self._selected.difference_update(changed)
+        return changed
+
+    def select_where(self, predicate, replace=True):
+        """选中满足 predicate(item) 的项目；replace 为 True 时先清空原有选择，返回选中数量"""
+        matched = {item_id for item_id, item in self._items.items() if predicate(item)}
+        if replace:
+            self._selected = matched
+        else:
+            self._selected |= matched
+        return len(matched)
+
+    def select_by_date(self, start, end, date_of, replace=True):
+        """选中日期在 [start, end] 之间的项目，日期为 YYYY-MM-DD 字符串，空字符串表示不限"""
+        def in_range(item):
+            date = date_of(item)
+            return bool(date) and (not start or date >= start) and (not end or date <= end)
+        return self.select_where(in_range, replace)
@@ -0,0 +1,360 @@
+"""
+StreamHarvester 命令行入口，与图形界面共用下载引擎和解析逻辑。
+
+    python streamharvester.py video URL [URL ...] [--policy "≤1080p（优先 avc1+m4a）"]
+    python streamharvester.py formats URL --json
+    python streamharvester.py podcast URL [URL ...] --latest 3
+    python streamharvester.py sync [--add URL] [--opml FILE]
+    python streamharvester.py daemon --interval 3600
+    python streamharvester.py serve --port 8765
+    python streamharvester.py --limit-schedule "09:00=2M,19:00=0" daemon
+
+加上 --json 时每个事件输出一行 JSON，便于脚本处理。
+这里不导入 customtkinter、PIL；yt-dlp 和 browser_cookie3 只在真正用到时才加载，适合 cron 定时运行。
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+import extractors
+import feed_batch
+from cookies import BROWSERS
+from dedup import MediaIndex
+from engine import FINISHED, RUNNING, DownloadEngine
+from jobstore import JobStore
+from postprocess import CODECS, DEFAULT_LOUDNESS, PostProcessor
+from progress import ProgressAggregator
+from ratelimit import parse_rate, parse_schedule
+from options import (NATIVE_DOWNLOADER, VIDEO_FORMAT_POLICIES, podcast_dir, podcast_postprocess_opts,
+                     podcast_ydl_opts, video_ydl_opts)
+from subscriptions import SubscriptionStore, import_opml, sync_all
+
+DEFAULT_VIDEO_DIR = os.path.expanduser("~/Downloads")
+DEFAULT_PODCAST_DIR = os.path.expanduser("~/Downloads/Podcasts")
+DEFAULT_POLICY = "最佳质量"
+PROGRESS_INTERVAL = 1.0
+
+
+class Reporter:
+    """
+    把引擎事件输出到标准输出：JSON 模式每个事件一行，文本模式只输出状态变化。
+    下载进度不直接来自引擎事件，而是订阅 ProgressAggregator 的快照，每 PROGRESS_INTERVAL 秒每个任务最多一行。
+    """
+
+    def __init__(self, json_mode=False, progress=False):
+        self.json_mode = json_mode
+        self.progress = progress
+        self.engine = None
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        self.engine = engine
+        engine.add_listener(self.on_event)
+        if self.progress:
+            ProgressAggregator(engine, interval=PROGRESS_INTERVAL).subscribe(self.on_progress)
+
+    def emit(self, record):
+        with self._lock:
+            if self.json_mode:
+                print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+            else:
+                print(record.get('message', ''), flush=True)
+
+    def on_event(self, event):
+        status = event['status']
+        if status == 'downloading':
+            return
+        job = event['job']
+        title = job['meta'].get('title') or job['url']
+        if status == 'error':
+            message = f"[{job['id']}] 失败: {title}: {event.get('error')}"
+        else:
+            message = f"[{job['id']}] {status}: {title}"
+        # 事件中的 data 是 yt-dlp 的进度字典，包含无法序列化的对象，只输出任务快照
+        self.emit({'event': status, 'job': job, 'error': event.get('error'), 'message': message})
+
+    def on_progress(self, snapshot):
+        """汇总快照中仍在下载的任务各输出一行进度"""
+        for job_id, progress in snapshot['jobs'].items():
+            if progress['state'] != RUNNING:
+                continue
+            job = self.engine.status(job_id)
+            if job is None or job['state'] != RUNNING:
+                continue
+            title = job['meta'].get('title') or job['url']
+            message = f"[{job_id}] {progress['percent']:5.1f}% {extractors.format_size(job['speed'])}/s {title}"
+            self.emit({'event': 'downloading', 'job': job, 'error': None, 'message': message})
+
+
+def make_engine(args, reporter):
+    logger = logging.getLogger("streamharvester")
+    engine = DownloadEngine(max_workers=args.workers, logger=logger, store=JobStore(),
+                            info_cache=extractors.get_info_cache(), media_index=MediaIndex(),
+                            postprocessor=PostProcessor())
+    reporter.attach(engine)
+    engine.limiter.set_global_rate(args.limit)
+    for host, rate in args.host_limit:
+        engine.limiter.set_host_rate(host, rate)
+    if args.limit_schedule:
+        engine.limiter.set_schedule(args.limit_schedule)
+    return engine
+
+
+def rate_arg(text):
+    try:
+        return parse_rate(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def host_rate_arg(text):
+    host, _, rate = text.partition('=')
+    if not host or not rate:
+        raise argparse.ArgumentTypeError(f"应为 主机=速率: {text}")
+    return host.lower(), rate_arg(rate)
+
+
+def schedule_arg(text):
+    try:
+        return parse_schedule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def wait_for_jobs(engine, job_ids):
+    """等待任务结束，Ctrl+C 时取消全部任务；返回退出码"""
+    try:
+        while not engine.wait(job_ids, timeout=0.5):
+            pass
+    except KeyboardInterrupt:
+        engine.shutdown(wait=True)
+        return 130
+    failed = [job_id for job_id in job_ids if engine.status(job_id)['state'] != FINISHED]
+    engine.shutdown(wait=True)
+    return 1 if failed else 0
+
+
+# --- 子命令 ---
+
+def cmd_formats(args, reporter):
+    ydl_opts = {'quiet': True, 'no_warnings': True}
+    if args.cookies:
+        ydl_opts['cookies_from'] = args.cookies
+    info = extractors.extract_video_info(args.url, ydl_opts)
+    formats = [
+        {key: f.get(key) for key in ('format_id', 'ext', 'height', 'fps', 'vcodec', 'acodec', 'filesize', 'tbr')}
+        for f in info.get('formats', [])
+    ]
+    if args.json:
+        reporter.emit({'title': info.get('title'), 'duration': info.get('duration'), 'formats': formats})
+        return 0
+    video_formats, audio_formats = extractors.split_formats(info.get('formats', []))
+    lines = [info.get('title') or args.url, "视频格式:"] + video_formats + ["音频格式:"] + audio_formats
+    reporter.emit({'message': "\n".join(lines)})
+    return 0
+
+
+def cmd_video(args, reporter):
+    format_spec = args.format or VIDEO_FORMAT_POLICIES[args.policy]
+    ydl_opts = video_ydl_opts(args.dir, format_spec, fragments=args.fragments, downloader=args.downloader,
+                              connections=args.connections, buffersize=args.buffersize,
+                              logger=logging.getLogger("streamharvester"))
+    if args.cookies:
+        ydl_opts['cookies_from'] = args.cookies
+    ydl_opts['rate_limit'] = args.job_limit
+    engine = make_engine(args, reporter)
+    job_ids = engine.submit_many([(url, ydl_opts, 'video', {'title': url}) for url in args.urls])
+    return wait_for_jobs(engine, job_ids)
+
+
+def cmd_podcast(args, reporter):
+    logger = logging.getLogger("streamharvester")
+    urls = feed_batch.split_urls(" ".join(args.urls))
+    if len(urls) == 1:
+        title, items = extractors.fetch_podcast(urls[0], logger=logger)
+    else:
+        # 多个链接（例如一批小宇宙单集）并发解析后合并，失败的链接只报告不中断
+        title, items, errors = feed_batch.fetch_merged(urls, logger=logger)
+        for url, error in errors:
+            reporter.emit({'event': 'fetch_error', 'url': url, 'error': error, 'message': f"获取 {url} 失败: {error}"})
+    if args.latest is not None:
+        items = items[:args.latest]
+    elif not args.all:
+        # 没有指定下载范围时只列出单集
+        if args.json:
+            reporter.emit({'title': title, 'items': items})
+        else:
+            lines = [title] + [
+                f"{i + 1:4d}. {extractors.format_date(item.get('upload_date', ''))} "
+                f"{extractors.format_duration(item.get('duration'))} {item['title']}"
+                for i, item in enumerate(items)
+            ]
+            reporter.emit({'message': "\n".join(lines)})
+        return 0
+
+    engine = make_engine(args, reporter)
+    requests = []
+    for track, item in enumerate(items, 1):
+        item_title = item.get('podcast_title', title)
+        dir_path = podcast_dir(args.dir, item_title)
+        os.makedirs(dir_path, exist_ok=True)
+        ydl_opts = podcast_ydl_opts(dir_path, item_title, item['title'], logger=engine.logger,
+                                    connections=args.connections)
+        ydl_opts['rate_limit'] = args.job_limit
+        # 曲目号与列出单集时的序号一致
+        ydl_opts['postprocess'] = podcast_postprocess_opts(item_title, item, track=track, tags=not args.no_tags,
+                                                           loudnorm=args.loudnorm, codec=args.codec)
+        meta = {'title': item['title'], 'guid': item.get('guid')}
+        requests.append((item['url'], ydl_opts, 'podcast', meta))
+    return wait_for_jobs(engine, engine.submit_many(requests))
+
+
+def cmd_sync(args, reporter):
+    store = SubscriptionStore()
+    if args.add:
+        title, items = extractors.fetch_podcast(args.add)
+        store.subscribe(args.add, args.dir, title, known_items=items)
+        reporter.emit({'event': 'subscribed', 'url': args.add, 'title': title, 'message': f"已订阅 {title}"})
+    if args.opml:
+        subscribed, failed = import_opml(store, args.opml, args.dir)
+        reporter.emit({'event': 'imported', 'subscribed': subscribed, 'failed': failed,
+                       'message': f"已导入 {subscribed} 个订阅，{len(failed)} 个失败"})
+
+    engine = make_engine(args, reporter)
+    store.attach(engine)
+    results = sync_all(store, engine, logger=engine.logger, connections=args.connections)
+    job_ids = [job_id for result in results.values() for job_id in result['jobs']]
+    for url, result in results.items():
+        if result['error']:
+            reporter.emit({'event': 'sync_error', 'url': url, 'error': result['error'],
+                           'message': f"同步失败 {url}: {result['error']}"})
+    reporter.emit({'event': 'synced', 'feeds': len(results), 'jobs': len(job_ids),
+                   'message': f"已同步 {len(results)} 个订阅，新增 {len(job_ids)} 个下载任务"})
+    return wait_for_jobs(engine, job_ids)
+
+
+def cmd_daemon(args, reporter):
+    """常驻运行：继续未完成的任务，然后按间隔同步订阅，直到收到 SIGTERM 或 Ctrl+C"""
+    store = SubscriptionStore()
+    engine = make_engine(args, reporter)
+    store.attach(engine)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    resumed = engine.resume_unfinished()
+    if resumed:
+        reporter.emit({'event': 'resumed', 'jobs': len(resumed), 'message': f"继续 {len(resumed)} 个未完成的任务"})
+    try:
+        while not stop.is_set():
+            results = sync_all(store, engine, logger=engine.logger, connections=args.connections)
+            new_jobs = sum(len(result['jobs']) for result in results.values())
+            reporter.emit({'event': 'synced', 'feeds': len(results), 'jobs': new_jobs,
+                           'message': f"已同步 {len(results)} 个订阅，新增 {new_jobs} 个下载任务"})
+            stop.wait(args.interval)
+    except KeyboardInterrupt:
+        pass
+    engine.shutdown(wait=True)
+    return 0
+
+
+def cmd_serve(args, reporter):
+    """启动本地 HTTP/JSON 接口，阻塞直到 Ctrl+C"""
+    import api_server
+
+    engine = make_engine(args, reporter)
+    api_server.serve(engine, args.host, args.port, token=args.token, download_roots=args.allow_dir or None)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="streamharvester", description="StreamHarvester 视频和播客下载工具")
+    parser.add_argument("--json", action="store_true", help="以 JSON 行输出结果和事件")
+    parser.add_argument("--progress", action="store_true", help="输出下载进度（每秒最多一次）")
+    parser.add_argument("--workers", type=int, default=5, help="初始并发下载数")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出详细日志")
+    parser.add_argument("--limit", type=rate_arg, default=0, help="全局限速，例如 2M，默认不限")
+    parser.add_argument("--host-limit", type=host_rate_arg, action="append", default=[], metavar="HOST=RATE",
+                        help="按主机限速，按域名后缀匹配，可重复")
+    parser.add_argument("--job-limit", type=rate_arg, default=0, help="video/podcast 命令每个任务的限速")
+    parser.add_argument("--limit-schedule", type=schedule_arg, metavar="HH:MM=RATE,...",
+                        help="按时间切换全局限速，例如 09:00=2M,19:00=0")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    formats = subparsers.add_parser("formats", help="列出视频的可用格式")
+    formats.add_argument("url")
+    formats.add_argument("--cookies", choices=BROWSERS)
+    formats.set_defaults(func=cmd_formats)
+
+    video = subparsers.add_parser("video", help="下载视频")
+    video.add_argument("urls", nargs="+")
+    video.add_argument("--dir", default=DEFAULT_VIDEO_DIR)
+    video.add_argument("--policy", choices=list(VIDEO_FORMAT_POLICIES), default=DEFAULT_POLICY)
+    video.add_argument("--format", help="yt-dlp 格式表达式，优先于 --policy")
+    video.add_argument("--fragments", type=int, default=4, help="HLS/DASH 同时下载的分片数")
+    video.add_argument("--downloader", default=NATIVE_DOWNLOADER, choices=("native", "aria2c"))
+    video.add_argument("--connections", type=int, default=8, help="aria2c 每个文件的连接数")
+    video.add_argument("--buffersize", type=int, help="下载缓冲区字节数")
+    video.add_argument("--cookies", choices=BROWSERS)
+    video.set_defaults(func=cmd_video)
+
+    podcast = subparsers.add_parser("podcast", help="列出或下载播客单集")
+    podcast.add_argument("urls", nargs="+", metavar="url", help="播客或单集链接，可以一次给出多个")
+    podcast.add_argument("--dir", default=DEFAULT_PODCAST_DIR)
+    podcast.add_argument("--latest", type=int, help="下载最新的 N 集")
+    podcast.add_argument("--all", action="store_true", help="下载全部单集")
+    podcast.add_argument("--connections", type=int, default=1, help="直链音频的分段连接数")
+    podcast.add_argument("--no-tags", action="store_true", help="下载后不写入标签和封面")
+    podcast.add_argument("--loudnorm", type=float, nargs="?", const=DEFAULT_LOUDNESS, metavar="LUFS",
+                         help=f"下载后标准化响度，默认目标 {DEFAULT_LOUDNESS} LUFS")
+    podcast.add_argument("--codec", choices=list(CODECS), help="下载后转码为指定编码")
+    podcast.set_defaults(func=cmd_podcast)
+
+    sync = subparsers.add_parser("sync", help="同步订阅并下载新单集")
+    sync.add_argument("--add", metavar="URL", help="先添加订阅，现有单集视为已处理")
+    sync.add_argument("--opml", metavar="FILE", help="先从 OPML 文件导入订阅")
+    sync.add_argument("--dir", default=DEFAULT_PODCAST_DIR, help="新订阅的下载目录")
+    sync.add_argument("--connections", type=int, default=1, help="直链音频的分段连接数")
+    sync.set_defaults(func=cmd_sync)
+
+    daemon = subparsers.add_parser("daemon", help="常驻运行，定时同步订阅")
+    daemon.add_argument("--interval", type=float, default=3600, help="同步间隔（秒）")
+    daemon.add_argument("--connections", type=int, default=1, help="直链音频的分段连接数")
+    daemon.set_defaults(func=cmd_daemon)
+
+    serve = subparsers.add_parser("serve", help="启动本地 HTTP/JSON 接口")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--token", default=os.environ.get("STREAMHARVESTER_API_TOKEN"),
+                       help="要求请求携带 Authorization: Bearer <token>")
+    serve.add_argument("--allow-dir", action="append", default=[], metavar="DIR",
+                       help="允许通过接口写入的下载目录，可重复，默认为用户主目录")
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    # 打包后的程序中，后处理进程池的子进程需要由这里接管
+    multiprocessing.freeze_support()
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        stream=sys.stderr,
+    )
+    reporter = Reporter(json_mode=args.json, progress=args.progress)
+    try:
+        return args.func(args, reporter)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        reporter.emit({'event': 'error', 'error': str(e), 'message': f"错误: {e}"})
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
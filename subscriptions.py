@@ -0,0 +1,279 @@
+"""
+播客订阅与增量同步。
+
+每个订阅记录 feed 地址、下载目录和最近一次看到的单集（guid / 发布时间），
+episodes 表记录已经下载、正在下载、失败或被跳过的单集。同步时用条件请求获取 feed，
+只解析到第一个已知单集为止，并且只下载新增部分。
+
+下载失败或被用户取消的单集记为 failed，之后的同步与新单集一起重新提交；
+它们可能比已下载的单集更早，增量解析不会再遇到，所以不能靠从记录中删除来重试。
+每次失败后等待的时间加倍（从 RETRY_BACKOFF 开始），失败 MAX_ATTEMPTS 次后不再重试。
+程序退出时中止的单集保持 queued，由引擎的 resume_unfinished() 继续；引擎中已有任务的单集不会重复提交。
+"""
+import sqlite3
+import threading
+import time
+
+import extractors
+from engine import FINAL_STATES
+from feed_batch import DEFAULT_WORKERS, fetch_feeds, load_opml, run_per_host
+from options import podcast_dir, podcast_postprocess_opts, podcast_ydl_opts
+from paths import state_path
+
+# episodes 表中的状态
+QUEUED = 'queued'
+DOWNLOADED = 'downloaded'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 1800  # 第一次失败后至少等待的秒数，之后每次加倍
+
+
+class SubscriptionStore:
+    def __init__(self, path=None):
+        self.path = path or state_path("subscriptions.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS feeds (
+                    url TEXT PRIMARY KEY,
+                    title TEXT,
+                    download_dir TEXT NOT NULL,
+                    last_guid TEXT,
+                    last_pub_date TEXT,
+                    last_synced_at REAL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS episodes (
+                    feed_url TEXT NOT NULL,
+                    guid TEXT NOT NULL,
+                    url TEXT,
+                    title TEXT,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    upload_date TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (feed_url, guid)
+                )
+                """
+            )
+            # 旧版本的数据库没有 upload_date 列（重试失败单集时用于写入标签）
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(episodes)")}
+            if 'upload_date' not in columns:
+                self._conn.execute("ALTER TABLE episodes ADD COLUMN upload_date TEXT")
+            if 'attempts' not in columns:
+                self._conn.execute("ALTER TABLE episodes ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def subscribe(self, url, download_dir, title=None, known_items=()):
+        """添加订阅，known_items 中的单集视为已处理，以后同步不会再下载"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO feeds (url, title, download_dir) VALUES (?, ?, ?)",
+                (url, title, download_dir),
+            )
+        self.mark_episodes(url, known_items, SKIPPED)
+
+    def unsubscribe(self, url):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM feeds WHERE url = ?", (url,))
+            self._conn.execute("DELETE FROM episodes WHERE feed_url = ?", (url,))
+
+    def feeds(self):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM feeds ORDER BY url")]
+
+    def known_ids(self, feed_url):
+        """已处理单集的 guid 和音频链接集合"""
+        with self._lock:
+            rows = self._conn.execute("SELECT guid, url FROM episodes WHERE feed_url = ?", (feed_url,))
+            known = set()
+            for row in rows:
+                known.add(row['guid'])
+                if row['url']:
+                    known.add(row['url'])
+        return known
+
+    def mark_episodes(self, feed_url, items, state):
+        """记录单集状态；记为 failed 时失败次数加一，其他状态保留已有的失败次数"""
+        now = time.time()
+        failed = 1 if state == FAILED else 0
+        rows = [
+            (feed_url, item.get('guid') or item['url'], item.get('url'), item.get('title'), state, now,
+             item.get('upload_date'), failed)
+            for item in items
+        ]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO episodes (feed_url, guid, url, title, state, updated_at, upload_date, attempts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (feed_url, guid) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                "state = excluded.state, updated_at = excluded.updated_at, "
+                "upload_date = COALESCE(excluded.upload_date, upload_date), "
+                "attempts = attempts + excluded.attempts",
+                rows,
+            )
+
+    def failed_episodes(self, feed_url, now=None):
+        """需要在本次同步时重新提交的失败单集（已过退避时间且未超过重试次数），按记录时间排列"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT guid, url, title, upload_date, attempts, updated_at FROM episodes "
+                "WHERE feed_url = ? AND state = ? AND url IS NOT NULL AND attempts < ? ORDER BY updated_at",
+                (feed_url, FAILED, MAX_ATTEMPTS),
+            ).fetchall()
+        return [{'guid': row['guid'], 'url': row['url'], 'title': row['title'] or "未知标题",
+                 'upload_date': row['upload_date'] or ''}
+                for row in rows if now - row['updated_at'] >= RETRY_BACKOFF * 2 ** max(row['attempts'] - 1, 0)]
+
+    def update_feed(self, url, title=None, last_guid=None, last_pub_date=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE feeds SET title = COALESCE(?, title), last_guid = COALESCE(?, last_guid), "
+                "last_pub_date = COALESCE(?, last_pub_date), last_synced_at = ? WHERE url = ?",
+                (title, last_guid, last_pub_date, time.time(), url),
+            )
+
+    def attach(self, engine):
+        """监听引擎事件，记录订阅单集的下载结果"""
+        def on_event(event):
+            meta = event['job'].get('meta') or {}
+            feed_url = meta.get('feed_url')
+            if not feed_url:
+                return
+            if event['status'] == 'finished':
+                self.mark_episodes(feed_url, [meta], DOWNLOADED)
+            elif event['status'] == 'error' or (event['status'] == 'cancelled' and not event.get('interrupted')):
+                # 程序退出时中止的任务保持 queued，下次启动时由 resume_unfinished() 继续
+                self.mark_episodes(feed_url, [meta], FAILED)
+        engine.add_listener(on_event)
+
+
+def fetch_feed_delta(feed, known_ids):
+    """返回订阅自上次同步以来的 (播客标题, 新单集列表)"""
+    url = feed['url']
+    if "xiaoyuzhoufm.com" in url:
+        if "xiaoyuzhoufm.com/podcast/" in url:
+            # 分页取到第一个已知单集为止
+            return extractors.parse_xiaoyuzhou_podcast(url, known_ids=known_ids)
+        # 小宇宙没有条件请求，取回列表后按已知集合过滤
+        title, items = extractors.fetch_podcast(url)
+        new_items = []
+        for item in items:
+            if (item.get('guid') or item['url']) in known_ids or item['url'] in known_ids:
+                break
+            new_items.append(item)
+        return title, new_items
+    return extractors.fetch_new_episodes(extractors.resolve_feed_url(url), known_ids)
+
+
+def live_episode_ids(engine, feed_url):
+    """该订阅在引擎中未结束任务的 guid 和音频链接集合"""
+    live = set()
+    for job in engine.jobs():
+        meta = job['meta'] or {}
+        if job['state'] not in FINAL_STATES and meta.get('feed_url') == feed_url:
+            live.add(meta.get('guid'))
+            live.add(job['url'])
+    return live
+
+
+def sync_feed(store, feed, engine, logger=None, connections=1):
+    """同步单个订阅，把新单集提交给下载引擎，返回任务 ID 列表"""
+    title, new_items = fetch_feed_delta(feed, store.known_ids(feed['url']))
+    title = title or feed.get('title') or "未知播客"
+    # 之前失败或被取消的单集一起重新提交；引擎中已有未结束任务（例如刚继续的中断任务）的单集不再提交，
+    # 避免两个任务写同一个文件
+    live = live_episode_ids(engine, feed['url'])
+
+    def pending(item):
+        return (item.get('guid') or item['url']) not in live and item['url'] not in live
+
+    new_ids = {item.get('guid') or item['url'] for item in new_items}
+    retries = [item for item in store.failed_episodes(feed['url']) if item['guid'] not in new_ids]
+    new_items = [item for item in new_items if pending(item)]
+    items = new_items + [item for item in retries if pending(item)]
+
+    if not items:
+        store.update_feed(feed['url'], title=title)
+        return []
+
+    dir_path = podcast_dir(feed['download_dir'], title)
+    # 先记录为下载中，避免下载很快完成时状态被覆盖
+    store.mark_episodes(feed['url'], items, QUEUED)
+    requests = []
+    for item in items:
+        meta = {
+            'feed_url': feed['url'],
+            'guid': item.get('guid') or item['url'],
+            'url': item['url'],
+            'title': item.get('title', 'Unknown Title'),
+            'podcast_title': title,
+            'upload_date': item.get('upload_date', ''),
+        }
+        ydl_opts = podcast_ydl_opts(dir_path, title, meta['title'], logger=logger, connections=connections)
+        ydl_opts['postprocess'] = podcast_postprocess_opts(title, item)
+        requests.append((item['url'], ydl_opts, 'podcast', meta))
+    job_ids = engine.submit_many(requests)
+
+    if new_items:
+        newest = new_items[0]
+        store.update_feed(feed['url'], title=title, last_guid=newest.get('guid') or newest['url'],
+                          last_pub_date=newest.get('upload_date'))
+    else:
+        store.update_feed(feed['url'], title=title)
+    if logger:
+        retried = len(items) - len(new_items)
+        logger.info(f"订阅 {title} 有 {len(new_items)} 个新单集" + (f"，重试 {retried} 个失败的单集" if retried else ""))
+    return job_ids
+
+
+def sync_all(store, engine, logger=None, max_workers=DEFAULT_WORKERS, on_result=None, connections=1):
+    """
+    并发同步全部订阅，返回 {feed_url: {'title', 'jobs', 'error'}}。
+
+    on_result(feed_url, 结果) 在每个订阅同步完成时调用。
+    """
+    def sync(feed):
+        return sync_feed(store, feed, engine, logger, connections)
+
+    results = {}
+    feeds = store.feeds()
+    for feed, job_ids, error in run_per_host(feeds, sync, url_of=lambda feed: feed['url'],
+                                             max_workers=max_workers):
+        if error is not None:
+            if logger:
+                logger.error(f"同步订阅失败 {feed['url']}: {error}")
+            result = {'title': feed.get('title'), 'jobs': [], 'error': str(error)}
+        else:
+            result = {'title': feed.get('title'), 'jobs': job_ids, 'error': None}
+        results[feed['url']] = result
+        if on_result:
+            on_result(feed['url'], result)
+    return results
+
+
+def import_opml(store, path, download_dir, logger=None, max_workers=DEFAULT_WORKERS):
+    """
+    并发获取 OPML 中的全部 feed 并添加订阅，现有单集视为已处理。
+
+    返回成功订阅的数量和失败的 feed 列表。
+    """
+    subscribed = 0
+    failed = []
+    for result in fetch_feeds(load_opml(path), max_workers=max_workers, logger=logger):
+        if result['error']:
+            failed.append(result['url'])
+            continue
+        store.subscribe(result['url'], download_dir, result['title'], known_items=result['items'])
+        subscribed += 1
+    return subscribed, failed
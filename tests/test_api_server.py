@@ -0,0 +1,170 @@
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+pytest.importorskip('requests')
+
+from api_server import ApiServer, build_job, resolve_dir  # noqa: E402
+from ratelimit import BandwidthLimiter  # noqa: E402
+
+
+class FakeEngine:
+    """只记录提交和取消的任务"""
+
+    def __init__(self):
+        self.limiter = BandwidthLimiter()
+        self.submitted = []
+        self.cancelled = []
+        self.listeners = []
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def submit(self, url, ydl_opts=None, kind='podcast', meta=None):
+        self.submitted.append((url, ydl_opts, kind, meta))
+        return f"job{len(self.submitted)}"
+
+    def status(self, job_id):
+        if job_id == "job1" and self.submitted:
+            return {'id': job_id, 'state': 'queued'}
+        return None
+
+    def jobs(self):
+        return [self.status("job1")] if self.submitted else []
+
+    def cancel(self, job_id):
+        self.cancelled.append(job_id)
+        return True
+
+
+@pytest.fixture
+def server(tmp_path):
+    engine = FakeEngine()
+    server = ApiServer(engine, port=0, download_roots=[str(tmp_path)])
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    conn.request(method, path, body=data, headers=headers or {})
+    response = conn.getresponse()
+    result = response.status, json.loads(response.read() or b'null')
+    conn.close()
+    return result
+
+
+JSON = {'Content-Type': "application/json"}
+
+
+def test_submit_and_query_job(server, tmp_path):
+    status, body = request(server, 'POST', "/jobs",
+                           {'url': "https://cdn.example.com/a.mp3", 'kind': 'podcast', 'dir': str(tmp_path),
+                            'podcast_title': "播客", 'title': "第一集", 'tags': False},
+                           {'Content-Type': "application/json; charset=utf-8"})
+    assert (status, body) == (201, {'id': "job1"})
+    url, ydl_opts, kind, meta = server.engine.submitted[0]
+    assert kind == 'podcast'
+    assert ydl_opts['outtmpl'].startswith(os.path.join(str(tmp_path), "播客"))
+    assert meta['podcast_title'] == "播客"
+
+    assert request(server, 'GET', "/jobs/job1") == (200, {'id': "job1", 'state': 'queued'})
+    assert request(server, 'GET', "/jobs/missing")[0] == 404
+    assert request(server, 'DELETE', "/jobs/job1") == (200, {'id': "job1", 'cancelled': True})
+    assert server.engine.cancelled == ["job1"]
+
+
+def test_foreign_host_header_is_rejected(server):
+    # DNS 重绑定：请求发到本机，但 Host 是攻击者的域名
+    assert request(server, 'GET', "/jobs", headers={'Host': "evil.example:8765"})[0] == 403
+    assert request(server, 'GET', "/jobs", headers={'Host': "localhost:8765"})[0] == 200
+
+
+def test_modifying_requests_require_json(server, tmp_path):
+    body = {'url': "https://cdn.example.com/a.mp3", 'kind': 'podcast', 'dir': str(tmp_path)}
+    assert request(server, 'POST', "/jobs", body, {'Content-Type': "text/plain"})[0] == 415
+    assert request(server, 'POST', "/jobs", body)[0] == 415
+    assert request(server, 'PUT', "/limits", {'global': "1M"}, {'Content-Type': "application/x-www-form-urlencoded"})[0] == 415
+    assert server.engine.submitted == []
+
+
+def test_cross_site_origin_is_rejected(server):
+    headers = dict(JSON, Origin="https://evil.example")
+    assert request(server, 'PUT', "/limits", {'global': "1M"}, headers)[0] == 403
+    assert request(server, 'DELETE', "/jobs/job1", headers={'Origin': "null"})[0] == 403
+    assert server.engine.limiter.limits()['global'] == 0
+
+    headers = dict(JSON, Origin=f"http://127.0.0.1:{server.server_address[1]}")
+    status, limits = request(server, 'PUT', "/limits", {'global': "1M"}, headers)
+    assert status == 200
+    assert limits['global'] == 1024 ** 2
+
+
+def test_token_is_required_when_configured(server):
+    server.token = "secret"
+    assert request(server, 'GET', "/jobs")[0] == 401
+    assert request(server, 'GET', "/jobs", headers={'Authorization': "Bearer secret"})[0] == 200
+
+
+def test_download_dir_outside_roots_is_rejected(server):
+    status, body = request(server, 'POST', "/jobs", {'url': "https://cdn.example.com/a.mp3", 'kind': 'podcast',
+                                                      'dir': "/etc"}, JSON)
+    assert status == 400
+    assert "不允许的下载目录" in body['error']
+    assert server.engine.submitted == []
+
+
+def test_resolve_dir_stays_inside_roots(tmp_path):
+    root = tmp_path / "downloads"
+    (root / "podcasts").mkdir(parents=True)
+    assert resolve_dir(str(root / "podcasts"), [str(root)]) == os.path.realpath(root / "podcasts")
+    assert resolve_dir(str(root), [str(root)]) == os.path.realpath(root)
+    # 同名前缀的兄弟目录不算在内
+    with pytest.raises(ValueError):
+        resolve_dir(str(tmp_path / "downloads2"), [str(root)])
+    with pytest.raises(ValueError):
+        resolve_dir(str(root / ".." / "other"), [str(root)])
+    with pytest.raises(ValueError):
+        resolve_dir("downloads", [str(root)])
+
+
+def test_resolve_dir_follows_symlinks(tmp_path):
+    root = tmp_path / "downloads"
+    root.mkdir()
+    os.symlink("/etc", root / "escape")
+    with pytest.raises(ValueError):
+        resolve_dir(str(root / "escape"), [str(root)])
+
+
+@pytest.mark.parametrize('payload, message', [
+    ([], "JSON 对象"),
+    ({'kind': 'video'}, "缺少 url"),
+    ({'url': "https://example.com/v", 'kind': 'audio'}, "未知的任务类型"),
+    ({'url': "https://example.com/v", 'policy': "不存在"}, "未知的格式策略"),
+    ({'url': "https://example.com/v", 'cookies': "netscape"}, "不支持的浏览器"),
+    ({'url': "https://example.com/a.mp3", 'kind': 'podcast', 'codec': "wav"}, "未知的目标编码"),
+])
+def test_build_job_validates_payload(tmp_path, payload, message):
+    if isinstance(payload, dict):
+        payload.setdefault('dir', str(tmp_path))
+    with pytest.raises(ValueError, match=message):
+        build_job(payload, [str(tmp_path)])
+
+
+def test_build_job_applies_rate_limit(tmp_path):
+    url, ydl_opts, kind, meta = build_job({'url': "https://example.com/v", 'dir': str(tmp_path),
+                                           'rate_limit': "500K", 'title': "视频"}, [str(tmp_path)])
+    assert (url, kind) == ("https://example.com/v", 'video')
+    assert ydl_opts['rate_limit'] == 500 * 1024
+    assert meta == {'title': "视频", 'source': 'api'}
@@ -0,0 +1,134 @@
+import os
+
+import pytest
+
+pytest.importorskip('requests')
+
+from dedup import MediaIndex, media_url_key  # noqa: E402
+
+URL = "https://cdn.example.com/show/ep1.mp3"
+GUID = "urn:uuid:5f3a0c1e-ep1"
+
+
+@pytest.fixture
+def index(tmp_path):
+    return MediaIndex(str(tmp_path / "media.db"))
+
+
+def write(path, data=b"ID3 audio data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('url', [
+    "http://CDN.example.com/show/ep1.mp3?utm_source=feed",
+    "https://www.cdn.example.com/show/ep1.mp3#t=30",
+    "https://dts.podtrac.com/redirect.mp3/cdn.example.com/show/ep1.mp3",
+    "https://chtbl.com/track/ABC123/https://op3.dev/e/cdn.example.com/show/ep1.mp3?ts=1",
+])
+def test_media_url_key_ignores_tracking(url):
+    assert media_url_key(url) == media_url_key(URL) == "cdn.example.com/show/ep1.mp3"
+
+
+def test_page_urls_keep_meaningful_query():
+    assert media_url_key("https://example.com/play?id=2&utm_medium=x&a=1") == "example.com/play?a=1&id=2"
+    assert media_url_key("https://example.com/play?id=2") != media_url_key("https://example.com/play?id=3")
+
+
+def test_existing_download_is_hardlinked_to_new_target(index, tmp_path):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    index.add(first, URL, GUID)
+    # 另一个订阅里的同一集（不同的跳转链接），不传输数据直接放到新文件名下
+    target = str(tmp_path / "B" / "ep1.%(ext)s")
+    path, placed = index.place("https://dts.podtrac.com/redirect.mp3/cdn.example.com/show/ep1.mp3", None, target)
+    assert (path, placed) == (str(tmp_path / "B" / "ep1.mp3"), True)
+    assert os.path.samefile(path, first)
+
+    # 再次运行时目标已存在，直接跳过
+    assert index.place(URL, None, target) == (path, False)
+    assert index.find(guid=GUID) in (first, path)
+
+
+def test_short_guids_are_not_used_across_feeds(index, tmp_path):
+    index.add(write(tmp_path / "A" / "ep1.mp3"), "https://a.example.com/1.mp3", "1")
+    assert index.find(guid="1") is None
+    assert index.reuse("https://b.example.com/1.mp3", "1", str(tmp_path / "B" / "1.mp3")) is None
+
+
+def test_same_content_is_replaced_by_hardlink(index, tmp_path):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    second = write(tmp_path / "B" / "episode-one.mp3")
+    index.add(first, URL)
+    assert index.add(second, "https://mirror.example.org/e1.mp3", "urn:uuid:mirror-ep1") == second
+    assert os.path.samefile(first, second)
+    # 新的链接和 guid 也登记到同一内容上
+    assert index.find("https://mirror.example.org/e1.mp3") is not None
+    assert index.find(guid="urn:uuid:mirror-ep1") is not None
+
+
+def test_add_without_link_keeps_separate_file(index, tmp_path):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    second = write(tmp_path / "B" / "ep1.mp3")
+    index.add(first, URL)
+    index.add(second, URL, link=False)
+    assert not os.path.samefile(first, second)
+
+
+def test_different_file_at_target_is_left_to_downloader(index, tmp_path):
+    index.add(write(tmp_path / "A" / "ep1.mp3"), URL)
+    write(tmp_path / "B" / "ep1.mp3", b"other")
+    assert index.place(URL, None, str(tmp_path / "B" / "ep1.mp3")) == (None, False)
+
+
+def test_unknown_target_name(index, tmp_path):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    index.add(first, URL)
+    assert index.place(URL, None, str(tmp_path / "B" / "%(title)s.%(ext)s")) == (first, False)
+    # 还要单独处理的文件不能直接沿用已有文件
+    assert index.place(URL, None, str(tmp_path / "B" / "%(title)s.%(ext)s"), private=True) == (None, False)
+    assert index.place(URL, None, None, private=True) == (None, False)
+
+
+def test_private_copy_when_hardlink_fails(index, tmp_path, monkeypatch):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    index.add(first, URL)
+
+    def cross_device(src, dst):
+        raise OSError(18, "Invalid cross-device link")
+
+    monkeypatch.setattr(os, 'link', cross_device)
+    target = str(tmp_path / "B" / "ep1.mp3")
+    assert index.place(URL, None, target) == (first, False)
+    assert index.place(URL, None, target, private=True) == (target, True)
+    assert not os.path.samefile(first, target)
+
+
+def test_deleted_and_changed_files_are_forgotten(index, tmp_path):
+    first = write(tmp_path / "A" / "ep1.mp3")
+    index.add(first, URL)
+    os.remove(first)
+    assert index.find(URL) is None
+
+    second = write(tmp_path / "A" / "ep2.mp3")
+    index.add(second, "https://cdn.example.com/show/ep2.mp3")
+    write(tmp_path / "A" / "ep2.mp3", b"truncated")
+    assert index.purge() == 1
+    assert index.find("https://cdn.example.com/show/ep2.mp3") is None
+
+
+def test_update_path_keeps_original_hash(index, tmp_path):
+    raw = write(tmp_path / "A" / "ep1.mp3")
+    index.add(raw, URL, link=False)
+    # 写完标签后文件内容变了，但仍按原始内容识别
+    tagged = write(tmp_path / "A" / "ep1.tagged.mp3", b"ID3 tags + audio data")
+    os.remove(raw)
+    index.update_path(raw, tagged)
+    assert index.find(URL) == tagged
+
+    other = write(tmp_path / "B" / "ep1.mp3")
+    index.add(other, "https://mirror.example.org/e1.mp3", link=False)
+    assert index.find("https://mirror.example.org/e1.mp3") in (tagged, other)
+    assert index.find(URL) in (tagged, other)
+    index.update_path(str(tmp_path / "missing.mp3"), tagged)
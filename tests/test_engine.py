@@ -0,0 +1,312 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip('requests')
+
+import engine as engine_module  # noqa: E402
+import ratelimit  # noqa: E402
+from engine import CANCELLED, ERROR, FINISHED, POSTPROCESSING, DownloadEngine, DownloadJob  # noqa: E402
+from jobstore import JobStore  # noqa: E402
+from ratelimit import BandwidthLimiter  # noqa: E402
+from scheduler import AdaptiveScheduler  # noqa: E402
+
+M = 1024 ** 2
+
+
+class FakeScheduler:
+    """调度器替身：不启动任何任务（任务一直排队），只记录吞吐量"""
+
+    max_workers = 2
+    limit = 0
+    in_flight = 0
+
+    def __init__(self):
+        self.recorded = []
+
+    def record_bytes(self, nbytes):
+        self.recorded.append(nbytes)
+        return False
+
+
+@pytest.fixture
+def waits(monkeypatch):
+    """记录限速等待的秒数，不真的睡眠"""
+    waits = []
+    monkeypatch.setattr(ratelimit.time, 'sleep', waits.append)
+    return waits
+
+
+def make_engine(global_rate=2 * M, store=None):
+    return DownloadEngine(scheduler=FakeScheduler(), rate_limiter=BandwidthLimiter(global_rate=global_rate),
+                          store=store)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def submit(engine, count):
+    return engine.submit_many([(f"https://cdn.example.com/{i}.mp3", {'outtmpl': f"/tmp/{i}.%(ext)s"},
+                                'podcast', {'title': str(i)}) for i in range(count)])
+
+
+def progress(downloaded):
+    return {'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': 2048 * M}
+
+
+def test_resumed_download_is_not_charged_for_bytes_on_disk(waits):
+    engine = make_engine()
+    job = DownloadJob('job1', "https://cdn.example.com/a.mp4", {}, 'video', {})
+    engine.limiter.start_job(job.id, job.url)
+    hook = engine._make_progress_hook(job)
+    job.cancel_event.wait = waits.append  # throttle 带 cancel_event 时用它等待
+
+    # yt-dlp 从 1 GB 的 .part 继续，第一次报告就包含已有的部分
+    hook(progress(1024 * M))
+    assert waits == []
+    assert engine.scheduler.recorded == [0]
+    assert job.downloaded_bytes == 1024 * M
+
+    # 之后只按新增的字节计算
+    hook(progress(1024 * M + 1000))
+    assert engine.scheduler.recorded == [0, 1000]
+    engine.shutdown()
+
+
+def test_new_file_in_same_job_starts_from_its_own_offset(waits):
+    engine = make_engine()
+    job = DownloadJob('job2', "https://cdn.example.com/a.mp4", {}, 'video', {})
+    engine.limiter.start_job(job.id, job.url)
+    hook = engine._make_progress_hook(job)
+    job.cancel_event.wait = waits.append
+
+    hook(progress(0))
+    hook(progress(1000))
+    # 视频下载完开始下载音频，音频文件也是从 .part 续传的
+    hook(progress(500))
+    hook(progress(700))
+    assert engine.scheduler.recorded == [0, 1000, 0, 200]
+    # 只为实际新增的 1200 字节等待
+    assert sum(waits) < 0.01
+    engine.shutdown()
+
+
+def test_submitted_jobs_are_persisted(store):
+    engine = make_engine(store=store)
+    job_ids = submit(engine, 3)
+    records = store.unfinished('podcast')
+    assert [record['id'] for record in records] == job_ids
+    assert records[0]['ydl_opts'] == {'outtmpl': "/tmp/0.%(ext)s"}
+    assert records[0]['meta'] == {'title': "0"}
+    engine.shutdown()
+
+
+def test_user_cancellation_is_not_resumed(store):
+    engine = make_engine(store=store)
+    job_id = submit(engine, 1)[0]
+    events = []
+    engine.add_listener(events.append)
+    assert engine.cancel(job_id)
+    assert engine.status(job_id)['state'] == CANCELLED
+    assert events[-1]['interrupted'] is False
+    assert store.get(job_id)['state'] == 'cancelled'
+    assert store.unfinished() == []
+    engine.shutdown()
+
+
+def test_shutdown_interrupts_and_next_start_resumes(store):
+    engine = make_engine(store=store)
+    job_ids = submit(engine, 2)
+    events = []
+    engine.add_listener(events.append)
+    engine.shutdown()
+    # 监听器看到的仍是 cancelled，但带有 interrupted 标记
+    assert [(event['status'], event['interrupted']) for event in events] == [(CANCELLED, True)] * 2
+    assert [store.get(job_id)['state'] for job_id in job_ids] == ['interrupted'] * 2
+
+    engine = make_engine(store=store)
+    assert engine.resume_unfinished() == job_ids
+    assert engine.status(job_ids[0])['url'] == "https://cdn.example.com/0.mp3"
+    assert [store.get(job_id)['state'] for job_id in job_ids] == ['queued'] * 2
+    # 已在运行的任务不会重复提交
+    assert engine.resume_unfinished() == []
+    engine.shutdown()
+
+
+def test_interrupted_postprocessing_is_resumed(store):
+    engine = make_engine(store=store)
+    job_id = submit(engine, 1)[0]
+    store.update_state(job_id, 'postprocessing')
+    assert [record['id'] for record in store.unfinished()] == [job_id]
+    engine.shutdown()
+
+
+def fake_download(job, ydl_opts, cookies_from=None):
+    """代替 yt-dlp：按进度回调报告两次进度后完成，链接中带 fail 时出错"""
+    if 'fail' in job.url:
+        raise RuntimeError("HTTP Error 404")
+    for hook in ydl_opts['progress_hooks']:
+        hook({'status': 'downloading', 'downloaded_bytes': 50, 'total_bytes': 100})
+        hook({'status': 'downloading', 'downloaded_bytes': 100, 'total_bytes': 100})
+        hook({'status': 'finished', 'filename': ydl_opts['outtmpl'].replace('%(ext)s', 'mp3')})
+
+
+def make_running_engine(store=None):
+    engine = DownloadEngine(scheduler=AdaptiveScheduler(initial=2, max_workers=2),
+                            rate_limiter=BandwidthLimiter(), store=store)
+    engine._download_with_ydl = fake_download
+    return engine
+
+
+def test_job_lifecycle_events():
+    engine = make_running_engine()
+    events = []
+    engine.add_listener(events.append)
+    job_id = engine.submit("https://cdn.example.com/a.mp3", {'outtmpl': "/tmp/a.%(ext)s"}, 'podcast', {'title': "A"})
+    assert engine.wait([job_id], timeout=5)
+    assert [event['status'] for event in events] == ['queued', 'running', 'downloading', 'downloading', FINISHED]
+    assert all(event['job_id'] == job_id for event in events)
+    status = engine.status(job_id)
+    assert status['state'] == FINISHED
+    assert status['filename'] == "/tmp/a.mp3"
+    assert status['downloaded_bytes'] == 100
+    assert status['meta'] == {'title': "A"}
+    engine.shutdown()
+
+
+def test_failed_job_reports_error(store):
+    engine = make_running_engine(store=store)
+    events = []
+    engine.add_listener(events.append)
+    job_id = engine.submit("https://cdn.example.com/fail.mp3", {'outtmpl': "/tmp/fail.%(ext)s"})
+    assert engine.wait([job_id], timeout=5)
+    assert events[-1]['status'] == ERROR
+    assert events[-1]['error'] == "HTTP Error 404"
+    assert engine.status(job_id)['error'] == "HTTP Error 404"
+    assert store.get(job_id)['state'] == ERROR
+    engine.shutdown()
+
+
+def test_listener_errors_do_not_break_jobs():
+    engine = make_running_engine()
+
+    def broken(event):
+        raise ValueError("boom")
+
+    engine.add_listener(broken)
+    job_id = engine.submit("https://cdn.example.com/a.mp3", {'outtmpl': "/tmp/a.%(ext)s"})
+    assert engine.wait([job_id], timeout=5)
+    assert engine.status(job_id)['state'] == FINISHED
+    engine.shutdown()
+
+
+def test_finished_jobs_are_evicted_and_looked_up_in_store(store, monkeypatch):
+    monkeypatch.setattr(engine_module, 'MAX_FINISHED_JOBS', 2)
+    engine = make_running_engine(store=store)
+    job_ids = [engine.submit(f"https://cdn.example.com/{i}.mp3", {'outtmpl': f"/tmp/{i}.%(ext)s"},
+                             meta={'title': str(i)}) for i in range(4)]
+    assert engine.wait(job_ids, timeout=5)
+    # 内存中只剩最近结束的两个任务
+    assert len(engine.jobs()) == 2
+    evicted = [job_id for job_id in job_ids if job_id not in {job['id'] for job in engine.jobs()}]
+    assert len(evicted) == 2
+    # 已移除的任务仍能从任务库查到
+    status = engine.status(evicted[0])
+    assert status['state'] == FINISHED
+    assert status['downloaded_bytes'] == 100
+    assert status['meta']['title'] in ("0", "1", "2", "3")
+    assert engine.status("missing") is None
+    engine.shutdown()
+
+
+def test_evicted_job_without_store_is_unknown(monkeypatch):
+    monkeypatch.setattr(engine_module, 'MAX_FINISHED_JOBS', 1)
+    engine = make_running_engine()
+    first = engine.submit("https://cdn.example.com/0.mp3", {'outtmpl': "/tmp/0.%(ext)s"})
+    assert engine.wait([first], timeout=5)
+    second = engine.submit("https://cdn.example.com/1.mp3", {'outtmpl': "/tmp/1.%(ext)s"})
+    assert engine.wait([second], timeout=5)
+    assert engine.status(first) is None
+    assert engine.status(second)['state'] == FINISHED
+    engine.shutdown()
+
+
+class FakePostProcessor:
+    """后处理进程池替身：返回的 Future 由测试决定何时完成"""
+
+    def __init__(self):
+        self.submitted = []
+        self.ready = threading.Event()
+
+    def submit(self, path, options):
+        future = Future()
+        self.submitted.append((path, options, future))
+        self.ready.set()
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def submit_podcast(engine, postprocess):
+    return engine.submit("https://cdn.example.com/a.mp3", {'outtmpl': "/tmp/a.%(ext)s", 'postprocess': postprocess})
+
+
+def test_download_is_handed_to_postprocessor():
+    engine = make_running_engine()
+    engine.postprocessor = FakePostProcessor()
+    events = []
+    engine.add_listener(events.append)
+    job_id = submit_podcast(engine, {'tags': {'title': "A"}, 'codec': 'opus'})
+    assert engine.postprocessor.ready.wait(5)
+    assert engine.status(job_id)['state'] == POSTPROCESSING
+    path, options, future = engine.postprocessor.submitted[0]
+    assert (path, options) == ("/tmp/a.mp3", {'tags': {'title': "A"}, 'codec': 'opus'})
+
+    future.set_result({'path': "/tmp/a.opus", 'warnings': ["未安装 mutagen，跳过写入标签"]})
+    assert engine.wait([job_id], timeout=5)
+    assert [event['status'] for event in events][-2:] == [POSTPROCESSING, FINISHED]
+    assert engine.status(job_id)['filename'] == "/tmp/a.opus"
+    engine.shutdown()
+
+
+def test_postprocess_failure_fails_the_job():
+    engine = make_running_engine()
+    engine.postprocessor = FakePostProcessor()
+    job_id = submit_podcast(engine, {'loudnorm': -16})
+    assert engine.postprocessor.ready.wait(5)
+    engine.postprocessor.submitted[0][2].set_exception(RuntimeError("ffmpeg 处理失败"))
+    assert engine.wait([job_id], timeout=5)
+    status = engine.status(job_id)
+    assert (status['state'], status['error']) == (ERROR, "后处理失败: ffmpeg 处理失败")
+    engine.shutdown()
+
+
+def test_cancel_during_postprocessing():
+    engine = make_running_engine()
+    engine.postprocessor = FakePostProcessor()
+    job_id = submit_podcast(engine, {'tags': {'title': "A"}})
+    assert engine.postprocessor.ready.wait(5)
+    assert engine.cancel(job_id)
+    future = engine.postprocessor.submitted[0][2]
+    if not future.cancelled():
+        # 取消恰好发生在引擎记录 Future 之前：处理完成后同样按取消结束
+        future.set_result({'path': "/tmp/a.mp3", 'warnings': []})
+    assert engine.wait([job_id], timeout=5)
+    assert engine.status(job_id)['state'] == CANCELLED
+    engine.shutdown()
+
+
+def test_nothing_to_process_finishes_immediately():
+    engine = make_running_engine()
+    engine.postprocessor = FakePostProcessor()
+    job_id = submit_podcast(engine, {'tags': None, 'loudnorm': None, 'codec': None})
+    assert engine.wait([job_id], timeout=5)
+    assert engine.status(job_id)['state'] == FINISHED
+    assert engine.postprocessor.submitted == []
+    engine.shutdown()
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+from feed_batch import MIXED_PODCAST_TITLE, fetch_merged, run_per_host, split_urls  # noqa: E402
+import feed_batch  # noqa: E402
+from scheduler import HostLimiter  # noqa: E402
+
+SLOW = [f"https://slow.example.com/{i}" for i in range(5)]
+FAST = [f"https://fast{i % 3}.example.net/{i}" for i in range(12)]
+
+
+def collect(generator):
+    """在后台线程中迭代，测试线程可以在迭代进行中检查状态"""
+    results = []
+
+    def run():
+        for result in generator:
+            results.append(result)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, results
+
+
+def test_slow_host_does_not_starve_other_hosts():
+    release = threading.Event()
+    finished = []
+
+    def func(url):
+        if 'slow' in url:
+            release.wait(5)
+        finished.append(url)
+        return url
+
+    limiter = HostLimiter({'slow.example.com': 1}, default_limit=2)
+    thread, results = collect(run_per_host(SLOW + FAST, func, max_workers=3, limiter=limiter))
+    deadline = time.monotonic() + 3
+    while len(finished) < len(FAST) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # 慢主机只占一个线程，其余主机的任务全部完成
+    assert sorted(finished) == sorted(FAST)
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert sorted(item for item, _, _ in results) == sorted(SLOW + FAST)
+
+
+def test_host_limit_is_respected():
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def func(url):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.02)
+        with lock:
+            active['now'] -= 1
+
+    limiter = HostLimiter({'slow.example.com': 2})
+    list(run_per_host(SLOW, func, max_workers=8, limiter=limiter))
+    assert active['max'] == 2
+    assert limiter.active('slow.example.com') == 0
+
+
+def test_errors_are_reported_per_item():
+    def func(url):
+        if url.endswith('/3'):
+            raise ValueError("boom")
+        return url.upper()
+
+    results = {item: (result, error) for item, result, error in run_per_host(FAST, func)}
+    assert str(results[FAST[3]][1]) == "boom"
+    assert results[FAST[0]] == (FAST[0].upper(), None)
+
+
+def test_waits_for_hosts_held_by_other_callers(monkeypatch):
+    monkeypatch.setattr(feed_batch, 'RETRY_INTERVAL', 0.01)
+    limiter = HostLimiter({'slow.example.com': 1})
+    assert limiter.try_acquire(SLOW[0])  # 另一个调用方占着名额
+    threading.Timer(0.1, limiter.release, (SLOW[0],)).start()
+    assert sorted(item for item, _, _ in run_per_host(SLOW[:2], str, limiter=limiter)) == SLOW[:2]
+
+
+def test_stopping_early_releases_host_slots():
+    limiter = HostLimiter({'slow.example.com': 1})
+    generator = run_per_host(SLOW, str, max_workers=2, limiter=limiter)
+    next(generator)
+    generator.close()
+    assert limiter.active('slow.example.com') == 0
+
+
+def test_split_urls_dedups_and_keeps_order():
+    text = "https://a.example.com/1.xml, https://b.example.com/2.xml\nhttps://a.example.com/1.xml，https://c.example.com/3"
+    assert split_urls(text) == ["https://a.example.com/1.xml", "https://b.example.com/2.xml",
+                                "https://c.example.com/3"]
+
+
+def test_fetch_merged_keeps_input_order(monkeypatch):
+    feeds = {
+        "https://a.example.com/feed": ("A", [{'guid': 'a1', 'url': "https://cdn/a1.mp3", 'title': "a1"}]),
+        "https://b.example.com/feed": ("B", [{'guid': 'b1', 'url': "https://cdn/b1.mp3", 'title': "b1"},
+                                             {'guid': 'a1', 'url': "https://cdn/a1.mp3", 'title': "dup"}]),
+    }
+
+    def fetch_podcast(url, logger=None):
+        if url not in feeds:
+            raise Exception("404")
+        title, items = feeds[url]
+        return title, [dict(item) for item in items]
+
+    monkeypatch.setattr(feed_batch.extractors, 'fetch_podcast', fetch_podcast)
+    urls = ["https://b.example.com/feed", "https://missing.example.com/feed", "https://a.example.com/feed"]
+    title, items, errors = fetch_merged(urls)
+    assert title == MIXED_PODCAST_TITLE
+    assert [(item['title'], item['podcast_title']) for item in items] == [("b1", "B"), ("dup", "B")]
+    assert errors == [("https://missing.example.com/feed", "404")]
+
+    with pytest.raises(Exception):
+        fetch_merged(["https://missing.example.com/feed"])
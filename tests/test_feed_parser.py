@@ -0,0 +1,167 @@
+import pytest
+
+import feed_parser
+from feed_parser import EntityFixer, RssStreamParser, iter_rss_items
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+<channel>
+  <title> Example Cast </title>
+  <itunes:image href="https://example.com/cover.jpg"/>
+  <item>
+    <title>Episode 3</title>
+    <guid>ep-3</guid>
+    <pubDate>Wed, 03 Jan 2024 08:00:00 +0000</pubDate>
+    <itunes:duration>3600</itunes:duration>
+    <itunes:image href="https://example.com/ep3.jpg"/>
+    <enclosure url="https://cdn.example.com/ep3.mp3" type="audio/mpeg"/>
+  </item>
+  <item>
+    <title>Trailer without audio</title>
+    <guid>trailer</guid>
+  </item>
+  <item>
+    <title>Episode 2</title>
+    <guid>ep-2</guid>
+    <enclosure url="https://cdn.example.com/ep2.mp3" type="audio/mpeg"/>
+  </item>
+  <item>
+    <title>Episode 1</title>
+    <enclosure url="https://cdn.example.com/ep1.mp3" type="audio/mpeg"/>
+  </item>
+</channel>
+</rss>
+"""
+
+
+@pytest.fixture(params=['lxml', 'stdlib'])
+def backend(request, monkeypatch):
+    if request.param == 'lxml':
+        if feed_parser.lxml_etree is None:
+            pytest.skip("未安装 lxml")
+    else:
+        monkeypatch.setattr(feed_parser, 'lxml_etree', None)
+    return request.param
+
+
+def parse(data, chunk_size=None, known_ids=None):
+    parser = RssStreamParser(known_ids)
+    chunk_size = chunk_size or len(data) or 1
+    items = []
+    for start in range(0, len(data), chunk_size):
+        items += parser.feed(data[start:start + chunk_size])
+    items += parser.close()
+    return parser, items
+
+
+def test_parses_channel_and_items(backend):
+    parser, items = parse(FEED)
+    assert parser.podcast_title == "Example Cast"
+    assert parser.podcast_artwork == "https://example.com/cover.jpg"
+    assert [item['title'] for item in items] == ["Episode 3", "Episode 2", "Episode 1"]
+
+    first = items[0]
+    assert first['url'] == "https://cdn.example.com/ep3.mp3"
+    assert first['guid'] == "ep-3"
+    assert first['duration'] == "3600"
+    assert first['upload_date'] == "Wed, 03 Jan 2024 08:00:00 +0000"
+    assert first['artwork'] == "https://example.com/ep3.jpg"
+
+
+def test_item_defaults(backend):
+    _, items = parse(FEED)
+    last = items[-1]
+    # 没有 guid 时以音频链接代替，没有封面时使用频道封面
+    assert last['guid'] == "https://cdn.example.com/ep1.mp3"
+    assert last['duration'] == "0"
+    assert last['upload_date'] == ''
+    assert last['artwork'] == "https://example.com/cover.jpg"
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1000])
+def test_chunk_size_does_not_change_result(backend, chunk_size):
+    _, expected = parse(FEED)
+    _, items = parse(FEED, chunk_size)
+    assert items == expected
+
+
+def test_stops_at_known_episode(backend):
+    parser, items = parse(FEED, 16, known_ids={'ep-2'})
+    assert [item['title'] for item in items] == ["Episode 3"]
+    assert parser.stopped
+    assert parser.feed(b"<item/>") == []
+
+
+def test_known_ids_match_audio_url(backend):
+    _, items = parse(FEED, known_ids={"https://cdn.example.com/ep1.mp3"})
+    assert [item['title'] for item in items] == ["Episode 3", "Episode 2"]
+
+
+def test_close_without_data_returns_nothing(backend):
+    parser = RssStreamParser()
+    assert parser.close() == []
+    assert parser.podcast_title is None
+
+
+def test_processed_items_are_removed_from_tree(backend):
+    parser, _ = parse(FEED, 32)
+    assert [feed_parser._local(child.tag) for child in parser._channel].count('item') == 0
+
+
+def test_iter_rss_items_yields_batches(backend):
+    chunks = [FEED[i:i + 100] for i in range(0, len(FEED), 100)]
+    batches = list(iter_rss_items(chunks, RssStreamParser()))
+    assert all(batches)
+    assert [item['title'] for batch in batches for item in batch] == ["Episode 3", "Episode 2", "Episode 1"]
+
+
+MALFORMED = b"""<rss><channel><title>Q&A Cast&nbsp;&copy; 2024</title>
+<item><title>Tom &amp; Jerry &mdash; Q&A</title>
+<description><![CDATA[<p>a & b &nbsp; ]]&gt;</p>]]></description>
+<enclosure url="https://cdn.example.com/a.mp3?x=1&y=2"/></item>
+<item><title>Caf&eacute; &#233; &#xE9; &unknownentity; end</title>
+<enclosure url="https://cdn.example.com/b.mp3"/></item>
+</channel></rss>
+"""
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 11, 10000])
+def test_html_entities_and_stray_ampersands(backend, chunk_size):
+    parser, items = parse(MALFORMED, chunk_size)
+    assert parser.podcast_title == "Q&A Cast © 2024"
+    assert items[0]['title'] == "Tom & Jerry — Q&A"
+    assert items[0]['url'] == "https://cdn.example.com/a.mp3?x=1&y=2"
+    assert items[1]['title'] == "Café é é &unknownentity; end"
+
+
+@pytest.mark.skipif(feed_parser.lxml_etree is None, reason="未安装 lxml")
+def test_recovers_from_broken_markup():
+    data = b"""<rss><channel><title>Broken</title>
+<item><title>One</title><description>unclosed <b>bold</description>
+<enclosure url="https://cdn.example.com/1.mp3"/></item>
+<item><title>Two</title><enclosure url="https://cdn.example.com/2.mp3"/></item>
+</channel></rss>"""
+    _, items = parse(data, 13)
+    assert "https://cdn.example.com/2.mp3" in [item['url'] for item in items]
+
+
+def fix_in_chunks(data, chunk_size):
+    fixer = EntityFixer()
+    out = b''.join(fixer.feed(data[i:i + chunk_size]) for i in range(0, len(data), chunk_size))
+    return out + fixer.feed(b'', final=True)
+
+
+def test_entity_fixer_rewrites_entities():
+    assert EntityFixer().feed(b"a & b &nbsp; &amp; &lt; &#38; &bogus;", final=True) == \
+        b"a &amp; b &#160; &amp; &lt; &#38; &amp;bogus;"
+
+
+def test_entity_fixer_leaves_cdata_untouched():
+    data = b"x &nbsp;<![CDATA[ & &nbsp; ]]>&"
+    assert EntityFixer().feed(data, final=True) == b"x &#160;<![CDATA[ & &nbsp; ]]>&amp;"
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 12))
+def test_entity_fixer_is_independent_of_chunk_boundaries(chunk_size):
+    expected = fix_in_chunks(MALFORMED, len(MALFORMED))
+    assert fix_in_chunks(MALFORMED, chunk_size) == expected
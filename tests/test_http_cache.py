@@ -0,0 +1,161 @@
+import pytest
+
+pytest.importorskip('requests')
+
+import http_cache  # noqa: E402
+from http_cache import HttpCache  # noqa: E402
+
+URL = "https://example.com/feed.xml"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise http_cache.http_session.RequestError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), 4):
+            yield self.body[start:start + 4]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeServer:
+    """按 ETag 响应条件请求，记录请求头和所有响应"""
+
+    def __init__(self, body=b"<rss>v1</rss>", etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.error = None
+        self.requests = []
+        self.responses = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requests.append(dict(headers or {}))
+        if self.error:
+            raise self.error
+        if self.etag and (headers or {}).get('If-None-Match') == self.etag:
+            response = FakeResponse(304)
+        else:
+            response = FakeResponse(200, self.body, {'ETag': self.etag, 'Last-Modified': "Mon, 01 Jan 2024 00:00:00 GMT",
+                                                     'Content-Type': "application/rss+xml"})
+        self.responses.append(response)
+        return response
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(http_cache.http_session, 'get', server.get)
+    return server
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(http_cache.time, 'time', lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "cache"), ttl=60)
+
+
+def read(stream):
+    with stream:
+        return b''.join(stream.iter_content())
+
+
+def test_fresh_entry_is_served_without_request(cache, server, clock):
+    first = cache.get(URL)
+    assert first.content == b"<rss>v1</rss>"
+    assert not first.from_cache
+    second = cache.get(URL)
+    assert second.content == first.content
+    assert second.from_cache and second.not_modified
+    assert len(server.requests) == 1
+
+
+def test_expired_entry_sends_conditional_request(cache, server, clock):
+    cache.get(URL)
+    clock[0] += 61
+    response = cache.get(URL)
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert server.requests[-1]['If-Modified-Since'] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert response.not_modified and response.content == b"<rss>v1</rss>"
+    # 304 后重新计算 TTL
+    cache.get(URL)
+    assert len(server.requests) == 2
+
+
+def test_changed_content_replaces_entry_and_parsed_value(cache, server, clock):
+    cache.get(URL)
+    cache.put_parsed(URL, {'items': [1]})
+    assert cache.get_parsed(URL) == {'items': [1]}
+
+    server.body, server.etag = b"<rss>v2</rss>", '"v2"'
+    clock[0] += 61
+    response = cache.get(URL)
+    assert response.content == b"<rss>v2</rss>" and not response.not_modified
+    assert cache.get_parsed(URL) is None
+
+
+def test_network_error_falls_back_to_stale_entry(cache, server, clock):
+    cache.get(URL)
+    clock[0] += 61
+    server.error = http_cache.http_session.RequestError("offline")
+    assert cache.get(URL).content == b"<rss>v1</rss>"
+    with pytest.raises(http_cache.http_session.RequestError):
+        cache.get("https://example.com/other.xml")
+
+
+def test_stopping_early_does_not_cache_partial_body(cache, server, clock):
+    with cache.open(URL) as stream:
+        next(iter(stream.iter_content()))
+    assert cache.get_parsed(URL) is None
+    cache.get(URL)
+    assert 'If-None-Match' not in server.requests[-1]
+
+
+def test_partial_read_keeps_validators_for_next_sync(cache, server, clock):
+    with cache.open(URL, ttl=0, partial_ok=True) as stream:
+        next(iter(stream.iter_content()))
+    stream = cache.open(URL, ttl=0, partial_ok=True)
+    # 内容没变：条件请求得到 304，返回空内容
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert stream.not_modified
+    assert read(stream) == b''
+
+
+def test_closing_before_iteration_closes_response(cache, server, clock):
+    stream = cache.open(URL)
+    stream.close()
+    assert server.responses[-1].closed
+    with cache.open(URL):
+        pass
+    assert server.responses[-1].closed
+
+
+def test_response_is_closed_after_full_read(cache, server, clock):
+    cache.get(URL)
+    assert server.responses[-1].closed
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path, server, clock):
+    cache = HttpCache(str(tmp_path / "cache"), ttl=60, max_bytes=len(server.body) * 2)
+    for i in range(3):
+        clock[0] += 1
+        cache.get(f"https://example.com/{i}.xml")
+    requests = len(server.requests)
+    cache.get("https://example.com/2.xml")
+    assert len(server.requests) == requests
+    cache.get("https://example.com/0.xml")
+    assert len(server.requests) == requests + 1
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import info_cache
+from info_cache import EXPIRE_MARGIN, InfoCache, normalize_url, url_expiry
+
+URL = "https://www.youtube.com/watch?v=abc"
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(info_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return InfoCache(str(tmp_path), ttl=600)
+
+
+def make_info(expire=None):
+    url = "https://rr1.googlevideo.com/videoplayback?itag=22"
+    if expire is not None:
+        url += f"&expire={expire}"
+    return {'id': "abc", 'title': "标题", 'formats': [{'format_id': "22", 'url': url}]}
+
+
+def test_normalize_url_drops_fragment_and_whitespace():
+    assert normalize_url(f"  {URL}#t=10 ") == URL
+
+
+def test_url_expiry_uses_earliest_format():
+    info = {'formats': [{'url': "https://a/x?expire=1700003600"},
+                        {'url': "https://a/y/deadline/1700001800/z"},
+                        {'url': "https://a/z"}]}
+    assert url_expiry(info) == 1700001800
+    assert url_expiry(make_info()) is None
+
+
+def test_entries_expire_after_ttl(cache, clock):
+    cache.put(URL, make_info())
+    assert cache.get(URL + "#comments")['title'] == "标题"
+    clock.now += 599
+    assert cache.get(URL) is not None
+    clock.now += 1
+    assert cache.get(URL) is None
+    # 过期的磁盘文件在读取时删除
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_signed_urls_expire_before_ttl(cache, clock):
+    expire = int(clock.now) + EXPIRE_MARGIN + 60
+    cache.put(URL, make_info(expire))
+    clock.now += 59
+    assert cache.get(URL) is not None
+    clock.now += 1
+    assert cache.get(URL) is None
+
+
+def test_already_expired_links_are_not_cached(cache, clock):
+    cache.put(URL, make_info(int(clock.now) + EXPIRE_MARGIN))
+    assert cache.get(URL) is None
+    assert os.listdir(cache.cache_dir) == []
+
+
+def test_disk_entries_survive_restart(tmp_path, clock):
+    InfoCache(str(tmp_path), ttl=600).put(URL, make_info())
+    cache = InfoCache(str(tmp_path), ttl=600)
+    assert cache.get(URL)['formats'][0]['format_id'] == "22"
+    clock.now += 600
+    assert InfoCache(str(tmp_path), ttl=600).get(URL) is None
+
+
+def test_get_returns_a_copy(cache):
+    cache.put(URL, make_info())
+    info = cache.get(URL)
+    info['formats'].clear()
+    assert len(cache.get(URL)['formats']) == 1
+
+
+def test_memory_keeps_most_recent_entries(tmp_path, clock):
+    cache = InfoCache(str(tmp_path), ttl=600, memory_entries=2)
+    for i in range(3):
+        cache.put(f"{URL}{i}", make_info())
+    assert list(cache._memory) == [f"{URL}1", f"{URL}2"]
+    # 被挤出内存的条目仍可从磁盘读取
+    assert cache.get(f"{URL}0") is not None
+
+
+def test_invalidate_and_purge(cache, clock):
+    cache.put(URL, make_info())
+    cache.put(URL + "2", make_info())
+    cache.invalidate(URL)
+    assert cache.get(URL) is None
+    assert len(os.listdir(cache.cache_dir)) == 1
+    clock.now += 600
+    cache.purge()
+    assert os.listdir(cache.cache_dir) == []
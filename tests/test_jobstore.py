@@ -0,0 +1,97 @@
+import logging
+
+import pytest
+
+import jobstore
+from jobstore import JobStore
+
+
+class FakeJob:
+    def __init__(self, job_id, kind='podcast', ydl_opts=None, meta=None):
+        self.id = job_id
+        self.kind = kind
+        self.url = f"https://cdn.example.com/{job_id}.mp3"
+        self.ydl_opts = ydl_opts or {'outtmpl': f"/tmp/{job_id}.%(ext)s"}
+        self.meta = meta or {}
+        self.state = 'queued'
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(jobstore, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def test_unserializable_options_are_dropped(store):
+    opts = {'outtmpl': "/tmp/a.%(ext)s", 'logger': logging.getLogger(), 'progress_hooks': [print],
+            'continuedl': True}
+    store.add(FakeJob('a', ydl_opts=opts, meta={'title': "第一集"}))
+    record = store.get('a')
+    assert record['ydl_opts'] == {'outtmpl': "/tmp/a.%(ext)s", 'continuedl': True}
+    assert record['meta'] == {'title': "第一集"}
+    assert record['outtmpl'] == "/tmp/a.%(ext)s"
+
+
+def test_unfinished_filters_by_state_and_kind(store, clock):
+    for job_id, kind in [('a', 'podcast'), ('b', 'video'), ('c', 'podcast'), ('d', 'podcast')]:
+        store.add(FakeJob(job_id, kind))
+        clock.now += 1
+    store.update_state('c', 'finished')
+    store.update_state('d', 'interrupted')
+    assert [record['id'] for record in store.unfinished()] == ['a', 'b', 'd']
+    assert [record['id'] for record in store.unfinished('podcast')] == ['a', 'd']
+
+
+def test_progress_writes_are_throttled(store, clock):
+    store.add(FakeJob('a'))
+    store.update_progress('a', 100, 1000)
+    store.update_progress('a', 200, 1000)
+    assert store.get('a')['downloaded_bytes'] == 100
+    clock.now += jobstore.PROGRESS_INTERVAL
+    store.update_progress('a', 300, 1000)
+    assert store.get('a')['downloaded_bytes'] == 300
+
+
+def test_final_state_writes_last_progress(store):
+    store.add(FakeJob('a'))
+    store.update_progress('a', 100, 1000)
+    store.update_progress('a', 1000, 1000)
+    store.update_state('a', 'finished', None, 1000, 1000)
+    record = store.get('a')
+    assert (record['state'], record['downloaded_bytes']) == ('finished', 1000)
+    # 不传字节数时保留已有的进度
+    store.update_state('a', 'interrupted')
+    assert store.get('a')['downloaded_bytes'] == 1000
+
+
+def test_records_survive_reopen_and_discard(tmp_path, clock):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    store.add_many([FakeJob('a'), FakeJob('b')])
+    store.update_state('b', 'error', "HTTP Error 404")
+    store.close()
+
+    store = JobStore(path)
+    assert store.get('b')['error'] == "HTTP Error 404"
+    store.discard(['a', 'b'])
+    assert store.get('a') is None
+    assert store.unfinished() == []
+    store.close()
@@ -0,0 +1,144 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import postprocess
+from postprocess import break_hardlink, needs_processing, process_file, run_ffmpeg, write_tags
+
+
+def write(path, data=b"audio"):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('options, expected', [
+    (None, False),
+    ({}, False),
+    ({'tags': {}, 'loudnorm': None, 'codec': None}, False),
+    ({'tags': {'title': "第一集"}}, True),
+    ({'loudnorm': -16}, True),
+    ({'codec': 'opus'}, True),
+])
+def test_needs_processing(options, expected):
+    assert needs_processing(options) is expected
+
+
+def test_break_hardlink_leaves_other_links_untouched(tmp_path):
+    original = write(tmp_path / "a.mp3")
+    linked = str(tmp_path / "b.mp3")
+    os.link(original, linked)
+    break_hardlink(linked)
+    assert not os.path.samefile(original, linked)
+    with open(linked, 'wb') as f:
+        f.write(b"tagged")
+    with open(original, 'rb') as f:
+        assert f.read() == b"audio"
+
+    # 只有一个链接时不复制
+    inode = os.stat(original).st_ino
+    break_hardlink(original)
+    assert os.stat(original).st_ino == inode
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """记录各步骤的调用，不真的运行 ffmpeg 或 mutagen"""
+    calls = []
+
+    def fake_ffmpeg(path, loudnorm=None, codec=None):
+        calls.append(('ffmpeg', path, loudnorm, codec))
+        return os.path.splitext(path)[0] + '.' + (codec or 'mp3')
+
+    def fake_tags(path, tags):
+        calls.append(('tags', path, tags))
+        return ["未安装 mutagen，跳过写入标签"]
+
+    monkeypatch.setattr(postprocess, 'run_ffmpeg', fake_ffmpeg)
+    monkeypatch.setattr(postprocess, 'write_tags', fake_tags)
+    return calls
+
+
+def test_process_file_transcodes_before_tagging(tmp_path, steps):
+    path = write(tmp_path / "a.mp3")
+    result = process_file(path, {'tags': {'title': "第一集"}, 'loudnorm': -16, 'codec': 'opus'})
+    opus = str(tmp_path / "a.opus")
+    assert steps == [('ffmpeg', path, -16, 'opus'), ('tags', opus, {'title': "第一集"})]
+    assert result == {'path': opus, 'warnings': ["未安装 mutagen，跳过写入标签"]}
+
+
+def test_process_file_runs_only_requested_steps(tmp_path, steps):
+    path = write(tmp_path / "a.mp3")
+    assert process_file(path, {'tags': {'title': "第一集"}})['path'] == path
+    assert [call[0] for call in steps] == ['tags']
+    steps.clear()
+    assert process_file(path, {'loudnorm': -16, 'tags': None}) == {'path': path, 'warnings': []}
+    assert [call[0] for call in steps] == ['ffmpeg']
+
+
+@pytest.fixture
+def ffmpeg(monkeypatch):
+    """ffmpeg 替身：记录命令并写出输出文件，returncode 可以修改"""
+    class FakeFfmpeg:
+        def __init__(self):
+            self.returncode = 0
+            self.commands = []
+
+        def run(self, cmd, stdout=None, stderr=None):
+            self.commands.append(cmd)
+            write(cmd[-1], b"encoded")
+            return subprocess.CompletedProcess(cmd, self.returncode, b"", b"Invalid data found")
+
+    fake = FakeFfmpeg()
+    monkeypatch.setattr(postprocess.shutil, 'which', lambda name: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(postprocess.subprocess, 'run', fake.run)
+    return fake
+
+
+def test_transcode_replaces_original(tmp_path, ffmpeg):
+    path = write(tmp_path / "a.m4a")
+    out = run_ffmpeg(path, codec='opus')
+    assert out == str(tmp_path / "a.opus")
+    assert os.listdir(tmp_path) == ["a.opus"]
+    cmd = ffmpeg.commands[0]
+    assert cmd[cmd.index('-c:a') + 1] == 'libopus'
+    assert cmd[cmd.index('-b:a') + 1] == '64k'
+    assert '-vn' in cmd
+
+
+def test_loudnorm_keeps_format(tmp_path, ffmpeg):
+    path = write(tmp_path / "a.mp3")
+    assert run_ffmpeg(path, loudnorm=-16) == path
+    cmd = ffmpeg.commands[0]
+    assert cmd[cmd.index('-af') + 1].startswith("loudnorm=I=-16:")
+    assert cmd[cmd.index('-c:a') + 1] == 'libmp3lame'
+    assert '-b:a' not in cmd
+    with open(path, 'rb') as f:
+        assert f.read() == b"encoded"
+
+
+def test_file_already_in_target_codec_is_not_reencoded(tmp_path, ffmpeg):
+    path = write(tmp_path / "a.mp3")
+    assert run_ffmpeg(path, codec='mp3') == path
+    assert ffmpeg.commands == []
+
+
+def test_ffmpeg_failure_keeps_original(tmp_path, ffmpeg):
+    ffmpeg.returncode = 1
+    path = write(tmp_path / "a.mp3")
+    with pytest.raises(Exception, match="Invalid data found"):
+        run_ffmpeg(path, codec='opus')
+    assert os.listdir(tmp_path) == ["a.mp3"]
+
+
+def test_missing_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setattr(postprocess.shutil, 'which', lambda name: None)
+    with pytest.raises(Exception, match="未找到 ffmpeg"):
+        run_ffmpeg(write(tmp_path / "a.mp3"), codec='opus')
+
+
+def test_tags_are_skipped_without_mutagen(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'mutagen', None)
+    assert write_tags(write(tmp_path / "a.mp3"), {'title': "第一集"}) == ["未安装 mutagen，跳过写入标签"]
@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+
+pytest.importorskip('requests')
+
+import progress  # noqa: E402
+from progress import ProgressAggregator  # noqa: E402
+
+
+def event(job_id, status, downloaded=0, total=100, speed=0, error=None, meta=None):
+    state = 'running' if status == 'downloading' else status
+    return {'status': status, 'job_id': job_id, 'url': f"https://cdn.example.com/{job_id}.mp3", 'data': {},
+            'error': error, 'job': {'id': job_id, 'state': state, 'downloaded_bytes': downloaded,
+                                    'total_bytes': total, 'speed': speed, 'meta': meta or {}}}
+
+
+def test_progress_events_are_coalesced():
+    aggregator = ProgressAggregator()
+    aggregator.on_event(event('a', 'queued', meta={'title': "A"}))
+    for downloaded in range(0, 60, 10):
+        aggregator.on_event(event('a', 'downloading', downloaded, speed=1000))
+    aggregator.on_event(event('b', 'queued'))
+
+    snapshot, _ = aggregator._take_snapshot()
+    assert set(snapshot['jobs']) == {'a', 'b'}
+    job = snapshot['jobs']['a']
+    assert (job['state'], job['downloaded_bytes'], job['percent'], job['speed']) == ('running', 50, 50.0, 1000)
+    assert job['meta'] == {'title': "A"}
+
+    # 没有新事件时不发布；之后只发布有变化的任务
+    assert aggregator._take_snapshot() == (None, [])
+    aggregator.on_event(event('b', 'downloading', 20))
+    snapshot, _ = aggregator._take_snapshot()
+    assert list(snapshot['jobs']) == ['b']
+
+
+def test_group_totals_are_updated_incrementally():
+    aggregator = ProgressAggregator()
+    aggregator.track('batch', ['a', 'b'])
+    aggregator.on_event(event('a', 'downloading', 50, speed=100))
+    aggregator.on_event(event('b', 'downloading', 10, speed=300))
+    group = aggregator.group('batch')
+    assert (group['total'], group['completed'], group['percent']) == (2, 0, 30.0)
+    assert (group['downloaded_bytes'], group['speed']) == (60, 400)
+
+    aggregator.on_event(event('a', 'finished', 100))
+    aggregator.on_event(event('b', 'error', 10, error="HTTP Error 404"))
+    group = aggregator.group('batch')
+    assert (group['completed'], group['failed'], group['percent'], group['speed']) == (2, 1, 100.0, 0)
+    assert group['done']
+    assert aggregator.job('b')['error'] == "HTTP Error 404"
+    aggregator.close()
+
+
+def test_jobs_finished_before_tracking_are_counted():
+    aggregator = ProgressAggregator()
+    aggregator.on_event(event('a', 'cancelled', 0))
+    aggregator.track('batch', ['a', 'b'])
+    group = aggregator.group('batch')
+    assert (group['completed'], group['cancelled'], group['percent']) == (1, 1, 50.0)
+
+    # 重新跟踪同名分组时重新计算，不重复累加
+    aggregator.track('batch', ['b'])
+    assert aggregator.group('batch')['completed'] == 0
+    aggregator.untrack('batch')
+    assert aggregator.group('batch') is None
+    aggregator.close()
+
+
+def test_finished_jobs_are_pruned(monkeypatch):
+    monkeypatch.setattr(progress, 'MAX_FINISHED_JOBS', 2)
+    aggregator = ProgressAggregator()
+    aggregator.track('batch', ['grouped'])
+    aggregator.on_event(event('grouped', 'finished', 100))
+    aggregator.on_event(event('running', 'downloading', 10))
+    for job_id in ('a', 'b', 'c'):
+        aggregator.on_event(event(job_id, 'finished', 100))
+    # 分组中的任务和未结束的任务不计入上限，也不会被删除
+    assert aggregator.job('a') is None
+    assert aggregator.job('b') is not None
+    assert aggregator.job('c') is not None
+    assert aggregator.job('grouped') is not None
+    assert aggregator.job('running') is not None
+
+    # 按结束顺序删除：较早加入但刚刚结束的任务保留到下一个快照
+    aggregator.on_event(event('running', 'finished', 100))
+    assert aggregator.job('b') is None
+    snapshot, _ = aggregator._take_snapshot()
+    assert snapshot['jobs']['running']['state'] == 'finished'
+    aggregator.close()
+
+
+def test_subscribers_receive_snapshots():
+    aggregator = ProgressAggregator(interval=0.01)
+    received = threading.Event()
+    snapshots = []
+
+    def broken(snapshot):
+        raise ValueError("boom")
+
+    def callback(snapshot):
+        snapshots.append(snapshot)
+        received.set()
+
+    aggregator.subscribe(broken)
+    aggregator.subscribe(callback)
+    aggregator.on_event(event('a', 'downloading', 10))
+    assert received.wait(5)
+    aggregator.close()
+    assert snapshots[0]['jobs']['a']['downloaded_bytes'] == 10
+
+
+def test_registers_as_engine_listener():
+    class FakeEngine:
+        def __init__(self):
+            self.listeners = []
+
+        def add_listener(self, callback):
+            self.listeners.append(callback)
+
+    engine = FakeEngine()
+    aggregator = ProgressAggregator(engine)
+    assert engine.listeners == [aggregator.on_event]
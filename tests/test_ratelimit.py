@@ -0,0 +1,150 @@
+import pytest
+
+from ratelimit import (BURST_SECONDS, MIN_BURST, BandwidthLimiter, TokenBucket, fair_shares, format_rate,
+                       parse_rate, parse_schedule)
+
+M = 1024 ** 2
+
+
+@pytest.mark.parametrize('text, rate', [
+    ("500K", 500 * 1024),
+    ("2M", 2 * M),
+    ("1.5m", int(1.5 * M)),
+    ("2MB/s", 2 * M),
+    ("2MiB", 2 * M),
+    ("1048576", M),
+    ("", 0),
+    ("0", 0),
+    ("不限", 0),
+    (None, 0),
+    (300, 300),
+])
+def test_parse_rate(text, rate):
+    assert parse_rate(text) == rate
+
+
+@pytest.mark.parametrize('text', ["fast", "2T", "-1M"])
+def test_parse_rate_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_format_rate_round_trips():
+    assert format_rate(0) == "不限"
+    assert format_rate(2 * M) == "2M"
+    assert format_rate(512 * 1024) == "512K"
+    assert format_rate(100) == "100"
+    assert parse_rate(format_rate(int(1.5 * M))) == int(1.5 * M)
+
+
+def test_parse_schedule_sorts_entries():
+    assert parse_schedule("19:00=0, 09:00=2M") == [(9 * 60, 2 * M), (19 * 60, 0)]
+    assert parse_schedule("") == []
+
+
+@pytest.mark.parametrize('text', ["9=2M", "24:00=1M", "09:60=1M", "09:00", "09:00=fast"])
+def test_parse_schedule_rejects_garbage(text):
+    with pytest.raises(ValueError):
+        parse_schedule(text)
+
+
+def test_fair_shares_splits_evenly_without_demands():
+    assert fair_shares(300, {'a': None, 'b': None, 'c': None}) == {'a': 100, 'b': 100, 'c': 100}
+
+
+def test_fair_shares_gives_small_demands_what_they_need():
+    shares = fair_shares(300, {'slow': 30, 'a': None, 'b': None})
+    assert shares['slow'] == 30
+    assert shares['a'] == shares['b'] == 135
+
+
+def test_fair_shares_caps_large_demands_at_fair_share():
+    shares = fair_shares(300, {'a': 50, 'b': 500, 'c': 500})
+    assert shares == {'a': 50, 'b': 125, 'c': 125}
+
+
+def test_fair_shares_never_exceeds_capacity():
+    shares = fair_shares(1000, {'a': 10, 'b': 200, 'c': None, 'd': 900})
+    assert sum(shares.values()) == pytest.approx(1000)
+    assert shares['a'] == 10 and shares['b'] == 200
+
+
+def test_fair_shares_leaves_spare_capacity_when_all_demands_are_met():
+    assert fair_shares(1000, {'a': 10, 'b': 20}) == {'a': 10, 'b': 20}
+    assert fair_shares(1000, {}) == {}
+
+
+def test_unlimited_bucket_never_waits():
+    bucket = TokenBucket()
+    assert bucket.reserve(10 * M, bucket.updated) == 0
+
+
+def test_bucket_burst_and_debt():
+    rate = 1 * M
+    bucket = TokenBucket(rate)
+    assert bucket.burst == rate * BURST_SECONDS
+    start = bucket.updated
+    # 新建的桶是空的，透支的字节按速率等待
+    assert bucket.reserve(rate, start) == pytest.approx(1.0)
+    # 1 秒后欠款还清
+    assert bucket.reserve(0, start + 1.0) == pytest.approx(0)
+    # 空闲很久后最多积累 burst 个令牌
+    assert bucket.reserve(bucket.burst, start + 100) == 0
+    assert bucket.reserve(rate, start + 100) == pytest.approx(1.0)
+
+
+def test_bucket_burst_has_minimum():
+    assert TokenBucket(1024).burst == MIN_BURST
+
+
+def test_set_rate_keeps_tokens_within_new_burst():
+    bucket = TokenBucket(10 * M)
+    bucket.tokens = bucket.burst
+    bucket.set_rate(1 * M)
+    assert bucket.tokens <= bucket.burst == 1 * M * BURST_SECONDS
+
+
+def job_rates(limiter):
+    return limiter.limits()['jobs']
+
+
+def test_limiter_splits_global_rate_between_jobs():
+    limiter = BandwidthLimiter(global_rate=3 * M)
+    for job_id in ('a', 'b', 'c'):
+        limiter.start_job(job_id, f"https://{job_id}.example.com/x.mp3")
+    assert job_rates(limiter) == {'a': M, 'b': M, 'c': M}
+    limiter.finish_job('c')
+    assert job_rates(limiter) == {'a': 1.5 * M, 'b': 1.5 * M}
+
+
+def test_limiter_host_rate_applies_to_suffix():
+    limiter = BandwidthLimiter(host_rates={'xyzcdn.net': 2 * M})
+    limiter.start_job('a', "https://media.xyzcdn.net/1.m4a")
+    limiter.start_job('b', "https://other.xyzcdn.net/2.m4a")
+    limiter.start_job('c', "https://example.com/3.mp3")
+    assert job_rates(limiter) == {'a': M, 'b': M, 'c': 0}
+
+
+def test_limiter_job_limit_frees_bandwidth_for_others():
+    limiter = BandwidthLimiter(global_rate=4 * M)
+    limiter.start_job('capped', "https://a.example.com/x.mp3", rate=M)
+    limiter.start_job('free', "https://b.example.com/x.mp3")
+    assert job_rates(limiter) == {'capped': M, 'free': 3 * M}
+    limiter.set_job_rate('capped', 0)
+    assert job_rates(limiter) == {'capped': 2 * M, 'free': 2 * M}
+
+
+def test_limiter_global_rate_can_change_at_runtime():
+    limiter = BandwidthLimiter()
+    limiter.start_job('a', "https://a.example.com/x.mp3")
+    assert job_rates(limiter) == {'a': 0}
+    limiter.set_global_rate(M)
+    assert job_rates(limiter) == {'a': M}
+
+
+def test_throttle_without_limit_does_not_sleep(monkeypatch):
+    limiter = BandwidthLimiter()
+    limiter.start_job('a', "https://a.example.com/x.mp3")
+    monkeypatch.setattr('ratelimit.time.sleep', lambda seconds: pytest.fail("不应睡眠"))
+    limiter.throttle('a', 10 * M)
+    limiter.throttle('unknown', 10 * M)
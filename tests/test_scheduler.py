@@ -0,0 +1,162 @@
+import pytest
+
+import scheduler
+from scheduler import AdaptiveScheduler, HostLimiter, is_throttle_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler.time, 'monotonic', clock)
+    return clock
+
+
+def fill(sched, count):
+    """占满 count 个名额，每个任务用不同的主机，避免受主机上限影响"""
+    urls = [f"https://host{i}.example.com/a.mp3" for i in range(count)]
+    for url in urls:
+        assert sched.try_acquire(url)
+    return urls
+
+
+def next_window(sched, clock, nbytes):
+    clock.now += sched.window
+    return sched.record_bytes(nbytes)
+
+
+def test_try_acquire_respects_global_limit(clock):
+    sched = AdaptiveScheduler(initial=2)
+    fill(sched, 2)
+    assert not sched.try_acquire("https://other.example.com/a.mp3")
+    assert sched.in_flight == 2
+
+
+def test_try_acquire_respects_host_limit(clock):
+    sched = AdaptiveScheduler(initial=10, host_limits={'example.com': 2})
+    assert sched.try_acquire("https://cdn.example.com/1.mp3")
+    assert sched.try_acquire("https://cdn.example.com/2.mp3")
+    assert not sched.try_acquire("https://cdn.example.com/3.mp3")
+    assert sched.try_acquire("https://other.net/1.mp3")
+
+
+def test_additive_increase_when_saturated(clock):
+    sched = AdaptiveScheduler(initial=2)
+    fill(sched, 2)
+    assert next_window(sched, clock, 1000)
+    assert sched.limit == 3
+
+
+def test_no_increase_when_not_saturated(clock):
+    sched = AdaptiveScheduler(initial=4)
+    fill(sched, 2)
+    assert not next_window(sched, clock, 1000)
+    assert sched.limit == 4
+
+
+def test_increase_is_rolled_back_when_throughput_does_not_improve(clock):
+    sched = AdaptiveScheduler(initial=2)
+    fill(sched, 2)
+    next_window(sched, clock, 1000)
+    assert sched.limit == 3
+    assert next_window(sched, clock, 1000)
+    assert sched.limit == 2
+
+
+def test_increase_continues_while_throughput_grows(clock):
+    sched = AdaptiveScheduler(initial=2)
+    fill(sched, 2)
+    next_window(sched, clock, 1000)
+    assert sched.try_acquire("https://extra.example.com/a.mp3")
+    next_window(sched, clock, 2000)
+    assert sched.limit == 4
+
+
+def test_limit_never_exceeds_max_workers(clock):
+    sched = AdaptiveScheduler(initial=3, max_workers=3)
+    fill(sched, 3)
+    assert not next_window(sched, clock, 1000)
+    assert sched.limit == 3
+
+
+def test_throttle_halves_global_and_host_limit(clock):
+    sched = AdaptiveScheduler(initial=8, host_limits={'xyzcdn.net': 4})
+    url = "https://media.xyzcdn.net/a.m4a"
+    assert sched.try_acquire(url)
+    clock.now += sched.window
+    assert sched.release(url, error="HTTP Error 429: Too Many Requests")
+    assert sched.limit == 4
+    assert sched.host_cap('media.xyzcdn.net') == 2
+
+
+def test_high_error_rate_halves_limit(clock):
+    sched = AdaptiveScheduler(initial=8, error_threshold=0.2)
+    urls = fill(sched, 4)
+    for url in urls[:3]:
+        sched.release(url, error="连接被重置")
+    clock.now += sched.window
+    assert sched.release(urls[3])
+    assert sched.limit == 4
+
+
+def test_limit_never_drops_below_min_workers(clock):
+    sched = AdaptiveScheduler(initial=1, min_workers=1)
+    url = "https://a.example.com/a.mp3"
+    assert sched.try_acquire(url)
+    clock.now += sched.window
+    sched.release(url, error="429")
+    assert sched.limit == 1
+
+
+def test_throttled_host_recovers_one_step_per_clean_window(clock):
+    sched = AdaptiveScheduler(initial=8, host_limits={'xyzcdn.net': 4})
+    url = "https://media.xyzcdn.net/a.m4a"
+    assert sched.try_acquire(url)
+    clock.now += sched.window
+    sched.release(url, error="429")
+    assert sched.host_cap('media.xyzcdn.net') == 2
+
+    next_window(sched, clock, 0)
+    assert sched.host_cap('media.xyzcdn.net') == 3
+    next_window(sched, clock, 0)
+    assert sched.host_cap('media.xyzcdn.net') == 4
+    assert 'media.xyzcdn.net' not in sched._host_caps
+
+
+def test_no_adjustment_before_window_ends(clock):
+    sched = AdaptiveScheduler(initial=2)
+    fill(sched, 2)
+    clock.now += sched.window / 2
+    assert not sched.record_bytes(1000)
+    assert sched.limit == 2
+
+
+def test_is_throttle_error():
+    assert is_throttle_error("HTTP Error 429: Too Many Requests")
+    assert is_throttle_error(Exception("Too Many Requests"))
+    assert not is_throttle_error("HTTP Error 404: Not Found")
+    assert not is_throttle_error(None)
+
+
+def test_host_limiter_matches_domain_suffix():
+    limiter = HostLimiter({'xyzcdn.net': 4}, default_limit=6)
+    assert limiter.limit_for('media.xyzcdn.net') == 4
+    assert limiter.limit_for('xyzcdn.net') == 4
+    assert limiter.limit_for('notxyzcdn.net') == 6
+
+
+def test_host_limiter_release_frees_slot():
+    limiter = HostLimiter({'example.com': 1})
+    url = "https://example.com/a.mp3"
+    assert limiter.try_acquire(url)
+    assert not limiter.try_acquire(url)
+    limiter.release(url)
+    assert limiter.active('example.com') == 0
+    assert limiter.try_acquire(url)
@@ -0,0 +1,182 @@
+import json
+import os
+import re
+
+import pytest
+
+pytest.importorskip('requests')
+
+import segmented  # noqa: E402
+from segmented import SegmentedDownloader, SegmentedUnsupported, media_extension, target_path  # noqa: E402
+
+URL = "https://cdn.example.com/show/ep1.mp3?token=abc"
+SEGMENT = 1024
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None, url=URL):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.url = url
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise segmented.http_session.RequestError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), 100):
+            yield self.body[start:start + 100]
+
+    def close(self):
+        pass
+
+
+class FakeServer:
+    """按 Range 请求返回 data 的一部分，并记录所有请求的范围"""
+
+    def __init__(self, data, ranges=True):
+        self.data = data
+        self.ranges = ranges
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False):
+        header = (headers or {}).get('Range')
+        self.requests.append(header)
+        if not self.ranges or header is None:
+            return FakeResponse(200, self.data)
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', header).groups())
+        end = min(end, len(self.data) - 1)
+        return FakeResponse(206, self.data[start:end + 1],
+                            {'Content-Range': f"bytes {start}-{end}/{len(self.data)}"})
+
+
+@pytest.fixture
+def server(monkeypatch):
+    data = bytes(range(256)) * 20  # 5120 字节
+    server = FakeServer(data)
+    monkeypatch.setattr(segmented.http_session, 'get', server.get)
+    return server
+
+
+def make_downloader(tmp_path, connections=4, hook=None):
+    return SegmentedDownloader(URL, str(tmp_path / "ep1.mp3"), connections=connections,
+                               progress_hook=hook, min_segment_size=SEGMENT)
+
+
+def test_media_extension_ignores_query():
+    assert media_extension(URL) == 'mp3'
+    assert media_extension("https://example.com/a.M4A") == 'm4a'
+    assert media_extension("https://example.com/episode/123") is None
+
+
+def test_target_path_fills_extension():
+    assert target_path("/tmp/Show/Ep 100%%.%(ext)s", URL) == "/tmp/Show/Ep 100%.mp3"
+
+
+@pytest.mark.parametrize('outtmpl, url', [
+    ("/tmp/%(title)s.mp3", URL),
+    ("/tmp/a.%(ext)s", "https://example.com/episode/123"),
+])
+def test_target_path_rejects_unknown_names(outtmpl, url):
+    with pytest.raises(SegmentedUnsupported):
+        target_path(outtmpl, url)
+
+
+@pytest.mark.parametrize('total, connections, count', [
+    (10 * SEGMENT, 4, 4),
+    (10 * SEGMENT + 3, 4, 4),
+    (2 * SEGMENT, 4, 2),
+    (SEGMENT, 8, 1),
+    (SEGMENT - 1, 4, 1),
+])
+def test_plan_segments_covers_whole_file(tmp_path, total, connections, count):
+    downloader = make_downloader(tmp_path, connections)
+    downloader.total_bytes = total
+    segments = downloader._plan_segments()
+    assert len(segments) == count
+    assert segments[0]['start'] == 0
+    assert segments[-1]['end'] == total - 1
+    for previous, segment in zip(segments, segments[1:]):
+        assert segment['start'] == previous['end'] + 1
+    assert all(segment['pos'] == segment['start'] for segment in segments)
+
+
+def test_download_writes_file_and_cleans_up(tmp_path, server):
+    events = []
+    downloader = make_downloader(tmp_path, hook=events.append)
+    path = downloader.download()
+
+    assert path == str(tmp_path / "ep1.mp3")
+    with open(path, 'rb') as f:
+        assert f.read() == server.data
+    assert not os.path.exists(downloader.part_path)
+    assert not os.path.exists(downloader.state_path)
+    assert events[-1]['status'] == 'finished'
+    assert events[-2]['downloaded_bytes'] == len(server.data)
+    # 一次探测加上四个分段
+    assert server.requests[0] == 'bytes=0-0'
+    assert len(server.requests) == 5
+
+
+def test_resume_requests_only_missing_ranges(tmp_path, server):
+    downloader = make_downloader(tmp_path, connections=2)
+    total = len(server.data)
+    half = total // 2
+    # 模拟中断：第一段已完成 100 字节，第二段已完成
+    with open(downloader.part_path, 'wb') as f:
+        f.write(server.data[:100] + b'\0' * (half - 100) + server.data[half:])
+    with open(downloader.state_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': URL, 'total_bytes': total, 'segments': [
+            {'start': 0, 'end': half - 1, 'pos': 100},
+            {'start': half, 'end': total - 1, 'pos': total},
+        ]}, f)
+
+    downloader.download()
+
+    assert server.requests == ['bytes=0-0', f'bytes=100-{half - 1}']
+    with open(downloader.path, 'rb') as f:
+        assert f.read() == server.data
+
+
+def test_stale_state_is_ignored(tmp_path, server):
+    downloader = make_downloader(tmp_path, connections=2)
+    with open(downloader.part_path, 'wb') as f:
+        f.write(b'\0' * 10)
+    with open(downloader.state_path, 'w', encoding='utf-8') as f:
+        json.dump({'url': URL, 'total_bytes': 10, 'segments': [{'start': 0, 'end': 9, 'pos': 10}]}, f)
+
+    downloader.download()
+
+    with open(downloader.path, 'rb') as f:
+        assert f.read() == server.data
+    assert len(server.requests) == 3
+
+
+def test_server_without_range_support_is_unsupported(tmp_path, server):
+    server.ranges = False
+    downloader = make_downloader(tmp_path)
+    with pytest.raises(SegmentedUnsupported):
+        downloader.download()
+    assert os.listdir(tmp_path) == []
+
+
+def test_small_file_is_unsupported(tmp_path, server):
+    downloader = SegmentedDownloader(URL, str(tmp_path / "ep1.mp3"), min_segment_size=len(server.data) + 1)
+    with pytest.raises(SegmentedUnsupported):
+        downloader.download()
+    assert os.listdir(tmp_path) == []
+
+
+def test_range_ignored_mid_download_discards_partial_file(tmp_path, server, monkeypatch):
+    def get(url, headers=None, stream=False):
+        if headers and headers.get('Range') != 'bytes=0-0':
+            server.ranges = False
+        return server.get(url, headers, stream)
+
+    monkeypatch.setattr(segmented.http_session, 'get', get)
+    downloader = make_downloader(tmp_path)
+    with pytest.raises(SegmentedUnsupported):
+        downloader.download()
+    # 不能留下会被 yt-dlp 或下次分段下载当成进度的文件
+    assert os.listdir(tmp_path) == []
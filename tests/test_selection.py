@@ -0,0 +1,112 @@
+import pytest
+
+from selection import SelectionModel
+
+ITEMS = [
+    {'id': 'a', 'title': "Intro", 'date': '2024-01-01'},
+    {'id': 'b', 'title': "Interview", 'date': '2024-02-15'},
+    {'id': 'c', 'title': "Q&A", 'date': '2024-03-10'},
+    {'id': 'd', 'title': "Bonus", 'date': ''},
+    {'id': 'e', 'title': "Finale", 'date': '2024-04-30'},
+]
+ORDER = [item['id'] for item in ITEMS]
+
+
+@pytest.fixture
+def model():
+    return SelectionModel(ITEMS)
+
+
+def test_initial_state(model):
+    assert len(model) == 5
+    assert model.count == 0
+    assert not model.all_selected()
+    assert model.get('c')['title'] == "Q&A"
+    assert model.get('missing') is None
+
+
+def test_set_selected_and_toggle(model):
+    model.set_selected('a', True)
+    assert model.is_selected('a')
+    assert model.toggle('a') is False
+    assert not model.is_selected('a')
+    assert model.toggle('b') is True
+    assert model.count == 1
+
+
+def test_unknown_ids_are_ignored(model):
+    model.set_selected('missing', True)
+    assert model.count == 0
+
+
+def test_select_all_and_clear(model):
+    model.select_all()
+    assert model.all_selected()
+    assert model.count == 5
+    model.clear()
+    assert model.count == 0
+
+
+def test_empty_model_is_never_all_selected():
+    model = SelectionModel()
+    model.select_all()
+    assert not model.all_selected()
+
+
+def test_selected_items_follow_given_order(model):
+    for item_id in ('e', 'a', 'c'):
+        model.set_selected(item_id, True)
+    assert [item['id'] for item in model.selected_items(ORDER)] == ['a', 'c', 'e']
+    assert [item['id'] for item in model.selected_items(list(reversed(ORDER)))] == ['e', 'c', 'a']
+    assert model.selected_ids() == {'a', 'c', 'e'}
+
+
+def test_selected_ids_returns_a_copy(model):
+    model.set_selected('a', True)
+    model.selected_ids().add('b')
+    assert model.count == 1
+
+
+@pytest.mark.parametrize('first, last', [('b', 'd'), ('d', 'b')])
+def test_select_range_in_either_direction(model, first, last):
+    changed = model.select_range(ORDER, first, last)
+    assert changed == ['b', 'c', 'd']
+    assert model.selected_ids() == {'b', 'c', 'd'}
+
+
+def test_select_range_can_deselect(model):
+    model.select_all()
+    assert model.select_range(ORDER, 'a', 'b', selected=False) == ['a', 'b']
+    assert model.selected_ids() == {'c', 'd', 'e'}
+
+
+def test_select_range_with_unknown_anchor_changes_nothing(model):
+    assert model.select_range(ORDER, 'a', 'missing') == []
+    assert model.count == 0
+
+
+def test_select_where_replaces_or_extends(model):
+    model.set_selected('e', True)
+    assert model.select_where(lambda item: item['title'].startswith("In")) == 2
+    assert model.selected_ids() == {'a', 'b'}
+    assert model.select_where(lambda item: item['id'] == 'e', replace=False) == 1
+    assert model.selected_ids() == {'a', 'b', 'e'}
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    ('2024-02-01', '2024-03-31', {'b', 'c'}),
+    ('2024-03-10', '', {'c', 'e'}),
+    ('', '2024-01-01', {'a'}),
+    ('', '', {'a', 'b', 'c', 'e'}),  # 没有日期的项目不会被选中
+])
+def test_select_by_date(model, start, end, expected):
+    assert model.select_by_date(start, end, lambda item: item['date']) == len(expected)
+    assert model.selected_ids() == expected
+
+
+def test_reset_replaces_items_and_selection(model):
+    model.select_all()
+    model.reset([{'id': 'x'}])
+    assert len(model) == 1
+    assert model.count == 0
+    assert model.get('a') is None
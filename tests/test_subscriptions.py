@@ -0,0 +1,200 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip('requests')
+
+import subscriptions  # noqa: E402
+from subscriptions import (DOWNLOADED, FAILED, MAX_ATTEMPTS, QUEUED, RETRY_BACKOFF, SKIPPED,  # noqa: E402
+                           SubscriptionStore, fetch_feed_delta, sync_feed)
+
+FEED_URL = "https://example.com/feed.xml"
+
+
+def episode(n):
+    return {'guid': f"ep-{n}", 'url': f"https://cdn.example.com/{n}.mp3", 'title': f"Episode {n}",
+            'upload_date': f"2024010{n}"}
+
+
+class FakeEngine:
+    def __init__(self):
+        self.listeners = []
+        self.submitted = []
+        self.live = []  # engine.jobs() 返回的任务快照
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def jobs(self):
+        return list(self.live)
+
+    def submit_many(self, requests):
+        self.submitted += requests
+        return [f"job{len(self.submitted) - len(requests) + i}" for i in range(len(requests))]
+
+    def emit(self, status, meta, **extra):
+        event = dict({'status': status, 'job': {'meta': meta}}, **extra)
+        for callback in self.listeners:
+            callback(event)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SubscriptionStore(str(tmp_path / "subscriptions.db"))
+    store.subscribe(FEED_URL, str(tmp_path / "downloads"), "Example", known_items=[episode(1)])
+    return store
+
+
+@pytest.fixture
+def feed(store):
+    return store.feeds()[0]
+
+
+@pytest.fixture
+def delta(monkeypatch):
+    """替换 feed 的获取，返回值可以在测试中修改"""
+    result = {'title': "Example", 'items': []}
+    calls = []
+
+    def fake_delta(feed, known_ids):
+        calls.append(set(known_ids))
+        return result['title'], [item for item in result['items']
+                                 if item['guid'] not in known_ids and item['url'] not in known_ids]
+
+    monkeypatch.setattr(subscriptions, 'fetch_feed_delta', fake_delta)
+    result['calls'] = calls
+    return result
+
+
+def submitted_guids(engine):
+    return [meta['guid'] for _, _, _, meta in engine.submitted]
+
+
+def states(store):
+    with store._lock:
+        rows = store._conn.execute("SELECT guid, state FROM episodes ORDER BY guid").fetchall()
+    return {row['guid']: row['state'] for row in rows}
+
+
+def test_subscribe_marks_existing_episodes_known(store):
+    assert store.known_ids(FEED_URL) == {"ep-1", "https://cdn.example.com/1.mp3"}
+    assert states(store) == {"ep-1": SKIPPED}
+
+
+def test_sync_submits_only_new_episodes(store, feed, delta):
+    engine = FakeEngine()
+    delta['items'] = [episode(3), episode(2), episode(1)]
+    job_ids = sync_feed(store, feed, engine)
+
+    assert job_ids == ["job0", "job1"]
+    assert submitted_guids(engine) == ["ep-3", "ep-2"]
+    url, ydl_opts, kind, meta = engine.submitted[0]
+    assert kind == 'podcast'
+    assert meta['feed_url'] == FEED_URL
+    assert ydl_opts['outtmpl'].endswith("Example - Episode 3.%(ext)s")
+    assert states(store)["ep-3"] == QUEUED
+    assert store.feeds()[0]['last_guid'] == "ep-3"
+
+    # 已提交的单集下次同步时是已知的
+    engine.submitted = []
+    assert sync_feed(store, feed, engine) == []
+
+
+def test_attach_records_results(store):
+    engine = FakeEngine()
+    store.attach(engine)
+    meta = dict(episode(2), feed_url=FEED_URL)
+    engine.emit('finished', meta)
+    assert states(store)["ep-2"] == DOWNLOADED
+    engine.emit('error', dict(episode(3), feed_url=FEED_URL))
+    assert states(store)["ep-3"] == FAILED
+    engine.emit('cancelled', dict(episode(4), feed_url=FEED_URL), interrupted=False)
+    assert states(store)["ep-4"] == FAILED
+    # 没有订阅信息的任务不记录
+    engine.emit('finished', episode(5))
+    assert "ep-5" not in states(store)
+
+
+def test_interrupted_episodes_are_not_marked_failed(store):
+    engine = FakeEngine()
+    store.attach(engine)
+    store.mark_episodes(FEED_URL, [episode(2)], QUEUED)
+    engine.emit('cancelled', dict(episode(2), feed_url=FEED_URL), interrupted=True)
+    assert states(store)["ep-2"] == QUEUED
+    assert store.failed_episodes(FEED_URL, now=10 ** 10) == []
+
+
+def test_failed_episodes_are_retried_with_backoff(store, feed, delta, monkeypatch):
+    engine = FakeEngine()
+    store.mark_episodes(FEED_URL, [episode(2)], FAILED)
+    # 刚失败的单集要等退避时间过去
+    assert sync_feed(store, feed, engine) == []
+
+    clock = [subscriptions.time.time() + RETRY_BACKOFF + 1]
+    monkeypatch.setattr(subscriptions.time, 'time', lambda: clock[0])
+    delta['items'] = [episode(3)]
+    sync_feed(store, feed, engine)
+    assert submitted_guids(engine) == ["ep-3", "ep-2"]
+    # 重试的单集不影响 last_guid
+    assert store.feeds()[0]['last_guid'] == "ep-3"
+
+
+def test_backoff_doubles_and_gives_up(store):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        store.mark_episodes(FEED_URL, [episode(2)], FAILED)
+        with store._lock:
+            failed_at = store._conn.execute("SELECT updated_at FROM episodes WHERE guid = 'ep-2'").fetchone()[0]
+        wait = RETRY_BACKOFF * 2 ** (attempt - 1)
+        retry = store.failed_episodes(FEED_URL, now=failed_at + wait)
+        if attempt < MAX_ATTEMPTS:
+            assert store.failed_episodes(FEED_URL, now=failed_at + wait - 1) == []
+            assert [item['guid'] for item in retry] == ["ep-2"]
+            # 重新提交时记为 queued，失败次数保留
+            store.mark_episodes(FEED_URL, retry, QUEUED)
+        else:
+            assert retry == []
+
+
+def test_sync_skips_episodes_with_live_jobs(store, feed, delta, monkeypatch):
+    engine = FakeEngine()
+    store.mark_episodes(FEED_URL, [episode(2)], FAILED)
+    monkeypatch.setattr(subscriptions, 'RETRY_BACKOFF', 0)
+    # 上次退出时中止、刚由 resume_unfinished() 继续的任务
+    engine.live = [
+        {'url': episode(2)['url'], 'state': 'running', 'meta': dict(episode(2), feed_url=FEED_URL)},
+        {'url': episode(3)['url'], 'state': 'queued', 'meta': dict(episode(3), feed_url=FEED_URL)},
+        {'url': episode(4)['url'], 'state': 'finished', 'meta': dict(episode(4), feed_url=FEED_URL)},
+    ]
+    delta['items'] = [episode(4), episode(3)]
+    sync_feed(store, feed, engine)
+    assert submitted_guids(engine) == ["ep-4"]
+
+
+def test_xiaoyuzhou_delta_stops_at_known_episode(monkeypatch):
+    items = [
+        {'guid': '', 'url': "https://media.xyzcdn.net/3.m4a", 'title': "3"},
+        {'guid': 'ep-2', 'url': "https://media.xyzcdn.net/2.m4a", 'title': "2"},
+        {'guid': 'ep-1', 'url': "https://media.xyzcdn.net/1.m4a", 'title': "1"},
+    ]
+    monkeypatch.setattr(subscriptions.extractors, 'fetch_podcast', lambda url: ("XYZ", items))
+    feed = {'url': "https://www.xiaoyuzhoufm.com/episode/abc"}
+    title, new_items = fetch_feed_delta(feed, {"ep-2"})
+    assert title == "XYZ"
+    assert [item['title'] for item in new_items] == ["3"]
+    # guid 为空时按音频链接判断
+    _, new_items = fetch_feed_delta(feed, {"https://media.xyzcdn.net/3.m4a"})
+    assert new_items == []
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE episodes (feed_url TEXT NOT NULL, guid TEXT NOT NULL, url TEXT, title TEXT, "
+                 "state TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (feed_url, guid))")
+    conn.execute("INSERT INTO episodes VALUES (?, 'ep-2', 'https://cdn.example.com/2.mp3', '2', ?, 0)",
+                 (FEED_URL, FAILED))
+    conn.commit()
+    conn.close()
+
+    store = SubscriptionStore(path)
+    assert [item['guid'] for item in store.failed_episodes(FEED_URL)] == ["ep-2"]
@@ -0,0 +1,215 @@
+import json
+
+import pytest
+
+pytest.importorskip('requests')
+
+import xiaoyuzhou  # noqa: E402
+from xiaoyuzhou import (canonical_url, collect_keys, extract_next_data, parse_episode_data,  # noqa: E402
+                        parse_podcast_data)
+
+
+def page(data, attrs='id="__NEXT_DATA__" type="application/json"'):
+    return (f'<html><head><script src="/app.js"></script></head><body><div id="__next"></div>'
+            f'<script {attrs}>\n  {json.dumps(data, ensure_ascii=False)}</script>'
+            f'<script>window.x = {{"a": 1}}</script></body></html>')
+
+
+def episode(eid, title="第一集", url=None):
+    return {'eid': eid, 'title': title, 'duration': 1800, 'pubDate': "2024-05-01T08:00:00.000Z",
+            'enclosure': {'url': url or f"https://media.xyzcdn.net/{eid}.m4a"},
+            'image': {'picUrl': f"https://image.xyzcdn.net/{eid}.jpg"}}
+
+
+EPISODE_PAGE = {'props': {'pageProps': {'episode': dict(episode('e1'), podcast={'title': "播客名"})}}}
+
+
+def test_extract_next_data_variants():
+    assert extract_next_data(page(EPISODE_PAGE)) == EPISODE_PAGE
+    # 属性顺序、引号和大小写不同也能找到
+    assert extract_next_data(page(EPISODE_PAGE, "type='application/json' ID='__NEXT_DATA__'")) == EPISODE_PAGE
+    assert extract_next_data(page(EPISODE_PAGE, 'id=__NEXT_DATA__')) == EPISODE_PAGE
+    assert extract_next_data('<script id="__NEXT_DATA__">{broken</script>') is None
+    assert extract_next_data("<html><script>var a = 1</script></html>") is None
+
+
+def test_script_content_with_closing_tag_text():
+    data = {'props': {'pageProps': {'episode': dict(episode('e1'), title="</script> 结尾")}}}
+    html = page(data).replace("</script> 结尾", "<\\/script> 结尾")
+    assert extract_next_data(html)['props']['pageProps']['episode']['title'] == "</script> 结尾"
+
+
+def test_parse_episode_page():
+    podcast_title, items = parse_episode_data(EPISODE_PAGE)
+    assert podcast_title == "播客名"
+    assert items == [{'title': "第一集", 'url': "https://media.xyzcdn.net/e1.m4a", 'duration': 1800,
+                      'upload_date': "2024-05-01T08:00:00.000Z", 'guid': "e1",
+                      'artwork': "https://image.xyzcdn.net/e1.jpg"}]
+
+
+def test_parse_episode_page_with_unknown_layout():
+    data = {'props': {'pageProps': {'data': {'item': {
+        'title': "旧版页面", 'audioUrl': "https://media.xyzcdn.net/old.mp3", 'publishedAt': "2023-01-01",
+        'podcast': {'title': "旧播客"}}}}}}
+    podcast_title, items = parse_episode_data(data)
+    assert podcast_title == "旧播客"
+    assert items[0]['url'] == "https://media.xyzcdn.net/old.mp3"
+    assert items[0]['upload_date'] == "2023-01-01"
+
+    with pytest.raises(Exception, match="未找到音频链接"):
+        parse_episode_data({'props': {'pageProps': {}}})
+
+
+def test_parse_podcast_page():
+    data = {'props': {'pageProps': {'podcast': {'title': "播客名", 'episodes': [
+        episode('e2', "第二集"), {'eid': 'no-audio', 'title': "预告"}, episode('e1')]}}}}
+    podcast_title, items = parse_podcast_data(data)
+    assert podcast_title == "播客名"
+    assert [item['guid'] for item in items] == ['e2', 'e1']
+
+    # 单集页面没有单集列表，交给调用方按单集解析
+    assert parse_podcast_data(EPISODE_PAGE) == (None, None)
+    with pytest.raises(Exception, match="未找到播客列表"):
+        parse_podcast_data({'props': {'pageProps': {'podcast': {'title': "空", 'episodes': []}}}})
+
+
+def test_collect_keys_matches_first_in_document_order():
+    data = {'a': {'title': "first", 'x': [{'title': "nested"}]}, 'title': "second",
+            'podcast': "not a dict", 'b': {'podcast': {'title': "p"}}}
+    found = collect_keys(data, {'title': None, 'podcast': lambda value: isinstance(value, dict),
+                                'missing': None})
+    # 与递归查找相同：先看当前对象的键，再按顺序进入子节点
+    assert found == {'title': "second", 'podcast': {'title': "p"}}
+    del data['title']
+    assert collect_keys(data, {'title': None}) == {'title': "first"}
+
+
+@pytest.mark.parametrize('url, expected', [
+    ("https://www.xiaoyuzhoufm.com/episode/abc123?s=share", "https://www.xiaoyuzhoufm.com/episode/abc123"),
+    ("xiaoyuzhoufm.com/Podcast/P1#top", "https://www.xiaoyuzhoufm.com/podcast/P1"),
+    (" https://example.com/feed.xml ", "https://example.com/feed.xml"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+# --- 游标分页 ---
+
+class FakeResponse:
+    def __init__(self, data, status=200):
+        self.data = data
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP Error {self.status}")
+
+    def json(self):
+        return self.data
+
+
+def cursor_key(cursor):
+    # 游标是对象，按 JSON 文本比较
+    return json.dumps(cursor, sort_keys=True)
+
+
+class FakeApi:
+    """单集列表接口替身：pages 为 [(游标, 单集列表, 下一页游标)]"""
+
+    def __init__(self, pages, status=200):
+        self.pages = {cursor_key(cursor): (episodes, next_cursor) for cursor, episodes, next_cursor in pages}
+        self.status = status
+        self.requests = []
+
+    def request(self, method, url, json=None, headers=None):
+        assert (method, url) == ('POST', xiaoyuzhou.EPISODE_LIST_URL)
+        self.requests.append((json, headers))
+        episodes, next_cursor = self.pages[cursor_key(json.get('loadMoreKey'))]
+        return FakeResponse({'data': episodes, 'loadMoreKey': next_cursor}, self.status)
+
+    @property
+    def cursors(self):
+        return [body.get('loadMoreKey') for body, _ in self.requests]
+
+
+def three_pages():
+    return [
+        (None, [episode('e5'), episode('e4')], {'pubDate': "2024-04"}),
+        ({'pubDate': "2024-04"}, [episode('e3'), {'eid': 'broken'}, episode('e2')], {'pubDate': "2024-02"}),
+        ({'pubDate': "2024-02"}, [episode('e1')], None),
+    ]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = FakeApi(three_pages())
+    monkeypatch.setattr(xiaoyuzhou.http_session, 'request', api.request)
+    return api
+
+
+def guids(batches):
+    return [[item['guid'] for item in batch] for batch in batches]
+
+
+def test_pages_follow_cursor(api):
+    pages = list(xiaoyuzhou.iter_episode_pages('P1', token="token"))
+    assert guids(pages) == [['e5', 'e4'], ['e3', 'e2'], ['e1']]
+    assert api.cursors == [None, {'pubDate': "2024-04"}, {'pubDate': "2024-02"}]
+    body, headers = api.requests[0]
+    assert body == {'pid': 'P1', 'order': 'desc'}
+    assert headers['x-jike-access-token'] == "token"
+
+
+def test_empty_page_ends_pagination(monkeypatch):
+    api = FakeApi([(None, [episode('e2')], "next"), ("next", [], "again")])
+    monkeypatch.setattr(xiaoyuzhou.http_session, 'request', api.request)
+    assert guids(xiaoyuzhou.iter_episode_pages('P1')) == [['e2'], []]
+    assert api.cursors == [None, "next"]
+
+
+def test_api_errors_reach_the_caller(monkeypatch):
+    api = FakeApi(three_pages(), status=401)
+    monkeypatch.setattr(xiaoyuzhou.http_session, 'request', api.request)
+    with pytest.raises(RuntimeError, match="401"):
+        list(xiaoyuzhou.iter_episode_pages('P1'))
+
+
+def test_stopping_early_stops_prefetching(monkeypatch):
+    # 无限分页：调用方只取第一页，后台线程最多领先 prefetch 页
+    class EndlessApi(FakeApi):
+        def request(self, method, url, json=None, headers=None):
+            self.requests.append((json, headers))
+            cursor = (json.get('loadMoreKey') or 0) + 1
+            return FakeResponse({'data': [episode(f"e{cursor}")], 'loadMoreKey': cursor})
+
+    api = EndlessApi([])
+    monkeypatch.setattr(xiaoyuzhou.http_session, 'request', api.request)
+    pages = xiaoyuzhou.iter_episode_pages('P1', prefetch=1)
+    assert guids([next(pages)]) == [['e1']]
+    pages.close()
+    xiaoyuzhou.time.sleep(0.6)
+    assert len(api.requests) <= 3
+
+
+def test_cached_pages_are_not_requested_again(api, tmp_path, monkeypatch):
+    cache = xiaoyuzhou.PageCache(str(tmp_path))
+    list(xiaoyuzhou.iter_episode_pages('P1', cache=cache))
+    assert len(api.requests) == 3
+    list(xiaoyuzhou.iter_episode_pages('P1', cache=cache))
+    assert len(api.requests) == 3
+
+    # 第一页会随新单集变化，较早过期；之后的页面仍然使用缓存
+    now = xiaoyuzhou.time.time()
+    monkeypatch.setattr(xiaoyuzhou.time, 'time', lambda: now + xiaoyuzhou.FIRST_PAGE_TTL + 1)
+    list(xiaoyuzhou.iter_episode_pages('P1', cache=cache))
+    assert api.cursors[3:] == [None]
+
+
+def test_podcast_items_skip_seen_and_stop_at_known(api):
+    batches = list(xiaoyuzhou.iter_podcast_items('P1', seen={'e4'}))
+    assert guids(batches) == [['e5'], ['e3', 'e2'], ['e1']]
+
+    # 订阅同步：遇到已知单集时停止，不再请求更早的页面
+    api.requests.clear()
+    batches = list(xiaoyuzhou.iter_podcast_items('P1', known_ids={"https://media.xyzcdn.net/e3.m4a"}))
+    assert guids(batches) == [['e5', 'e4']]
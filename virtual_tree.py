@@ -0,0 +1,140 @@
+"""
+虚拟化的 Treeview：数据只保存在模型中，Treeview 里只有当前可见的几十行。
+
+滚动时按偏移量重新渲染可见窗口，几千个单集的列表也不会卡住界面；
+调整顺序（例如倒序）只是换一个键的排列，不需要重建全部行。
+行的 iid 就是模型中的稳定键，不会因为重新渲染或排序而改变。
+"""
+import tkinter as tk
+from tkinter import ttk
+
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+
+
+class VirtualTree:
+    def __init__(self, tree, scrollbar, row_values):
+        """row_values(key, position) 返回该行各列的值，position 从 0 开始"""
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.keys = []       # 显示顺序中的全部键
+        self.offset = 0      # 第一个可见行在 keys 中的位置
+        self._positions = {}  # 键 -> 在 keys 中的位置
+        self._rendered = []
+
+        self.scrollbar.configure(command=self.yview)
+        self.tree.bind("<Configure>", lambda event: self.refresh())
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+
+    # --- 模型 ---
+
+    def set_keys(self, keys):
+        """替换全部行（例如切换倒序），保持滚动位置"""
+        self.keys = list(keys)
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        self.refresh()
+
+    def append_keys(self, keys):
+        """在末尾追加行，只有追加的行落在可见窗口中时才重新渲染"""
+        start = len(self.keys)
+        for i, key in enumerate(keys, start):
+            self.keys.append(key)
+            self._positions[key] = i
+        if start < self.offset + self.page_size():
+            self.refresh()
+        else:
+            self._update_scrollbar()
+
+    def clear(self):
+        self.offset = 0
+        self.set_keys([])
+
+    def position(self, key):
+        return self._positions.get(key)
+
+    # --- 渲染 ---
+
+    def page_size(self):
+        """可见区域能显示的行数"""
+        height = self.tree.winfo_height()
+        if height <= 1:
+            # 尚未布局时按 Treeview 的 height 选项估算
+            return int(self.tree.cget("height")) or 10
+        row_height = ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT
+        return max(1, (height - HEADING_HEIGHT) // int(row_height))
+
+    def refresh(self):
+        """重新渲染可见窗口"""
+        page = self.page_size()
+        self.offset = max(0, min(self.offset, len(self.keys) - page))
+        window = self.keys[self.offset:self.offset + page]
+
+        if window != self._rendered:
+            if self._rendered:
+                self.tree.delete(*self._rendered)
+            for i, key in enumerate(window, self.offset):
+                self.tree.insert("", "end", iid=key, values=self.row_values(key, i))
+            self._rendered = window
+        else:
+            for i, key in enumerate(window, self.offset):
+                self.tree.item(key, values=self.row_values(key, i))
+        self._update_scrollbar()
+
+    def refresh_key(self, key):
+        """模型中某一行改变后调用，不可见时无需处理"""
+        if key in self._rendered:
+            self.tree.item(key, values=self.row_values(key, self._positions[key]))
+
+    def visible_keys(self):
+        return list(self._rendered)
+
+    def _update_scrollbar(self):
+        total = len(self.keys)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self.offset / total
+        last = min(1.0, (self.offset + self.page_size()) / total)
+        self.scrollbar.set(first, last)
+
+    # --- 滚动 ---
+
+    def scroll(self, rows):
+        old_offset = self.offset
+        self.offset = max(0, self.offset + rows)
+        self.refresh()
+        return self.offset != old_offset
+
+    def yview(self, *args):
+        """滚动条回调：moveto 比例 / scroll n units|pages"""
+        if not args:
+            return
+        if args[0] == tk.MOVETO:
+            self.offset = int(float(args[1]) * len(self.keys))
+            self.refresh()
+        elif args[0] == tk.SCROLL:
+            amount = int(args[1])
+            if args[2] == tk.PAGES:
+                amount *= self.page_size()
+            self.scroll(amount)
+
+    def see(self, key):
+        """滚动到使该行可见"""
+        position = self._positions.get(key)
+        if position is None:
+            return
+        page = self.page_size()
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + page:
+            self.offset = position - page + 1
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        # Windows 每格为 120，macOS 为较小的整数
+        delta = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        self.scroll(-3 * delta)
+        return "break"
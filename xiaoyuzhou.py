@@ -0,0 +1,331 @@
+"""
+小宇宙页面解析：从 Next.js 的 __NEXT_DATA__ 中取出单集和播客信息。
+
+- 用字符串查找定位 <script id="__NEXT_DATA__">，直接从原始 HTML 中解码 JSON，不构建 DOM；
+- 已知的页面结构（props.pageProps.episode / props.pageProps.podcast）按预先编译好的路径直接取值；
+- 结构变化、路径取不到时，才对整棵 JSON 树做一次遍历，一次收集所有需要的字段。
+
+播客主页只内嵌最近的一批单集。设置了环境变量 XIAOYUZHOU_ACCESS_TOKEN（登录后的 access token）时，
+通过单集列表接口按游标分页取回全部单集：下一页在处理当前页时预先请求，页面缓存在本地，
+重新获取同一播客时已经见过的页面不再请求。
+"""
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import http_session
+from paths import state_path
+
+_NEXT_DATA_PATTERN = re.compile(r'<script\b[^>]*\bid\s*=\s*["\']?__NEXT_DATA__\b[^>]*>', re.I)
+_decoder = json.JSONDecoder()
+
+DEFAULT_PODCAST_TITLE = "小宇宙播客"
+DEFAULT_EPISODE_TITLE = "未知标题"
+
+
+def extract_next_data(html):
+    """返回页面中 __NEXT_DATA__ 的 JSON 对象，没有时返回 None"""
+    match = _NEXT_DATA_PATTERN.search(html)
+    if not match:
+        return None
+    start = match.end()
+    # 跳过空白后直接在原字符串上解码，不复制脚本内容
+    while start < len(html) and html[start].isspace():
+        start += 1
+    try:
+        data, _ = _decoder.raw_decode(html, start)
+    except ValueError:
+        return None
+    return data
+
+
+def compile_path(path):
+    """把 "a.b.0.c" 转换为键的元组，数字部分用作列表下标"""
+    return tuple(int(part) if part.isdigit() else part for part in path.split('.'))
+
+
+def get_path(obj, path):
+    """按编译好的路径取值，任何一级不存在时返回 None"""
+    for key in path:
+        try:
+            obj = obj[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return obj
+
+
+def first_of(obj, paths):
+    """依次尝试多个路径，返回第一个非空值"""
+    for path in paths:
+        value = get_path(obj, path)
+        if value not in (None, '', [], {}):
+            return value
+    return None
+
+
+def collect_keys(data, wanted):
+    """
+    一次前序遍历收集多个键第一次出现的值（与逐个递归查找的结果相同）。
+
+    wanted 为 {键: 判断函数或 None}，判断函数返回 False 的值会被忽略；全部找到后立即停止。
+    """
+    found = {}
+    stack = [data]
+    while stack and len(found) < len(wanted):
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            for key, accept in wanted.items():
+                if key not in found and key in obj and (accept is None or accept(obj[key])):
+                    found[key] = obj[key]
+            stack.extend(reversed(list(obj.values())))
+        elif isinstance(obj, list):
+            stack.extend(reversed(obj))
+    return found
+
+
+# --- 已知的页面结构 ---
+
+EPISODE_ROOT = compile_path("props.pageProps.episode")
+PODCAST_ROOT = compile_path("props.pageProps.podcast")
+
+# 单集对象中各字段的路径，按优先级排列
+EPISODE_FIELDS = {
+    'url': [compile_path(p) for p in ("enclosure.url", "media.source.url", "audioUrl", "audio.url")],
+    'title': [compile_path("title")],
+    'duration': [compile_path("duration")],
+    'upload_date': [compile_path(p) for p in ("pubDate", "publishedAt", "publishDate", "date")],
+    'guid': [compile_path("eid")],
+    'artwork': [compile_path(p) for p in ("image.largePicUrl", "image.middlePicUrl", "image.picUrl",
+                                          "podcast.image.largePicUrl", "podcast.image.picUrl")],
+}
+PODCAST_TITLE_PATHS = [compile_path("title")]
+EPISODE_PODCAST_TITLE_PATHS = [compile_path(p) for p in ("podcast.title", "podcastTitle")]
+
+
+def episode_item(episode):
+    """把单集对象转换为曲目字典，没有音频链接时返回 None"""
+    if not isinstance(episode, dict):
+        return None
+    url = first_of(episode, EPISODE_FIELDS['url'])
+    if not url:
+        return None
+    item = {
+        'title': first_of(episode, EPISODE_FIELDS['title']) or DEFAULT_EPISODE_TITLE,
+        'url': url,
+        'duration': first_of(episode, EPISODE_FIELDS['duration']) or 0,
+        'upload_date': first_of(episode, EPISODE_FIELDS['upload_date']) or "",
+    }
+    for key in ('guid', 'artwork'):
+        value = first_of(episode, EPISODE_FIELDS[key])
+        if value:
+            item[key] = value
+    return item
+
+
+def parse_episode_data(data):
+    """返回 (播客标题, [曲目])，找不到音频链接时抛出异常"""
+    episode = get_path(data, EPISODE_ROOT)
+    item = episode_item(episode)
+    if item is not None:
+        podcast_title = first_of(episode, EPISODE_PODCAST_TITLE_PATHS) or DEFAULT_PODCAST_TITLE
+        return podcast_title, [item]
+
+    # 页面结构未知：一次遍历收集所有候选字段
+    found = collect_keys(data, {
+        'audioUrl': None, 'url': None, 'title': None, 'duration': None,
+        'publishedAt': None, 'publishDate': None, 'podcastTitle': None,
+        'podcast': lambda value: isinstance(value, dict),
+    })
+    audio_url = found.get('audioUrl') or found.get('url')
+    if not audio_url:
+        raise Exception("未找到音频链接")
+    podcast_title = found.get('podcastTitle') or found.get('podcast', {}).get('title') or DEFAULT_PODCAST_TITLE
+    return podcast_title, [{
+        'title': found.get('title', DEFAULT_EPISODE_TITLE),
+        'url': audio_url,
+        'duration': found.get('duration', 0),
+        'upload_date': found.get('publishedAt', found.get('publishDate', "")),
+    }]
+
+
+def podcast_episodes(data):
+    """返回 (播客标题, 单集对象列表)，页面中没有单集列表时单集列表为 None"""
+    podcast = get_path(data, PODCAST_ROOT)
+    if isinstance(podcast, dict) and isinstance(podcast.get('episodes'), list):
+        return first_of(podcast, PODCAST_TITLE_PATHS) or DEFAULT_PODCAST_TITLE, podcast['episodes']
+
+    found = collect_keys(data, {'episodes': lambda value: isinstance(value, list), 'title': None})
+    return found.get('title', DEFAULT_PODCAST_TITLE), found.get('episodes')
+
+
+def parse_podcast_data(data):
+    """返回 (播客标题, [曲目])；页面中没有单集列表时返回 (None, None)，由调用方按单集页面解析"""
+    podcast_title, episodes = podcast_episodes(data)
+    if episodes is None:
+        return None, None
+    items = [item for item in map(episode_item, episodes) if item is not None]
+    if not items:
+        raise Exception("未找到播客列表")
+    return podcast_title, items
+
+
+def page_text(response):
+    """小宇宙页面都是 UTF-8；不使用 response.text，避免没有声明编码时对整页做字符集探测"""
+    return response.content.decode('utf-8', errors='replace')
+
+
+# --- 单集列表接口（游标分页） ---
+
+EPISODE_LIST_URL = "https://api.xiaoyuzhoufm.com/v1/episode/list"
+ACCESS_TOKEN_ENV = "XIAOYUZHOU_ACCESS_TOKEN"
+PREFETCH_PAGES = 2
+FIRST_PAGE_TTL = 15 * 60          # 第一页会随新单集变化
+PAGE_TTL = 7 * 24 * 3600          # 之后的页面按发布时间游标定位，内容基本不变
+
+_PODCAST_ID_PATTERN = re.compile(r'xiaoyuzhoufm\.com/podcast/([0-9a-zA-Z]+)')
+_PAGE_URL_PATTERN = re.compile(r'^(?:https?://)?(?:www\.)?xiaoyuzhoufm\.com/(episode|podcast)/([0-9a-zA-Z]+)', re.I)
+
+
+def podcast_id(url):
+    match = _PODCAST_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def canonical_url(url):
+    """去掉分享链接中的查询参数等，同一单集或播客的不同写法得到同一个地址；其他链接原样返回"""
+    url = url.strip()
+    match = _PAGE_URL_PATTERN.match(url)
+    if not match:
+        return url
+    return f"https://www.xiaoyuzhoufm.com/{match.group(1).lower()}/{match.group(2)}"
+
+
+def access_token():
+    """单集列表接口需要登录后的 access token，通过环境变量提供"""
+    return os.environ.get(ACCESS_TOKEN_ENV) or None
+
+
+class PageCache:
+    """按 (播客 ID, 游标) 缓存接口返回的页面，重新获取同一播客时已经见过的页面不再请求"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or state_path("xiaoyuzhou_pages")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, pid, cursor):
+        key = json.dumps([pid, cursor], sort_keys=True, ensure_ascii=False)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, pid, cursor):
+        ttl = FIRST_PAGE_TTL if cursor is None else PAGE_TTL
+        try:
+            with open(self._path(pid, cursor), 'r', encoding='utf-8') as f:
+                page = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - page.get('fetched_at', 0) > ttl:
+            return None
+        return page
+
+    def put(self, pid, cursor, page):
+        page = dict(page, fetched_at=time.time())
+        path = self._path(pid, cursor)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(page, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def fetch_episode_page(pid, cursor=None, token=None, cache=None):
+    """请求一页单集，返回 {'episodes': [单集对象], 'cursor': 下一页游标或 None}"""
+    if cache is not None:
+        page = cache.get(pid, cursor)
+        if page is not None:
+            return page
+
+    body = {'pid': pid, 'order': 'desc'}
+    if cursor is not None:
+        body['loadMoreKey'] = cursor
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['x-jike-access-token'] = token
+    resp = http_session.request('POST', EPISODE_LIST_URL, json=body, headers=headers)
+    resp.raise_for_status()
+    data = resp.json()
+    page = {'episodes': data.get('data') or [], 'cursor': data.get('loadMoreKey') or None}
+
+    if cache is not None:
+        cache.put(pid, cursor, page)
+    return page
+
+
+def iter_episode_pages(pid, token=None, cache=None, prefetch=PREFETCH_PAGES):
+    """
+    依次产生每一页的曲目列表。
+
+    后台线程拿到一页的游标后立即请求下一页，最多领先 prefetch 页，
+    调用方处理（显示、过滤）当前页的同时下一页已经在传输；调用方提前停止迭代时后台线程随之结束。
+    """
+    pages = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def put(value):
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        cursor = None
+        try:
+            while not stop.is_set():
+                page = fetch_episode_page(pid, cursor, token, cache)
+                if not put(page['episodes']):
+                    return
+                cursor = page['cursor']
+                if not cursor or not page['episodes']:
+                    break
+            put(None)
+        except Exception as e:
+            put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            page = pages.get()
+            if page is None:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield [item for item in map(episode_item, page) if item is not None]
+    finally:
+        stop.set()
+
+
+def iter_podcast_items(pid, token=None, cache=None, seen=(), known_ids=None):
+    """
+    通过接口分页产生全部曲目（按页产生列表），跳过 seen 中已有的单集（guid，没有时为音频链接）；
+    遇到 known_ids 中的单集时停止（订阅同步只需要新单集）。
+    """
+    seen = set(seen)
+    for items in iter_episode_pages(pid, token, cache):
+        batch = []
+        for item in items:
+            key = item.get('guid') or item['url']
+            if known_ids and (key in known_ids or item['url'] in known_ids):
+                if batch:
+                    yield batch
+                return
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(item)
+        if batch:
+            yield batch